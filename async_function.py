@@ -0,0 +1,501 @@
+import asyncio
+from datetime import date
+
+from neo4j import AsyncGraphDatabase, exceptions
+
+from function import (
+    ADD_REVERSE_MARRIED_QUERY, CHILD_OF_BATCH_QUERY, CHILD_OF_BY_ID_BATCH_QUERY, CHILDREN_QUERY,
+    COUNT_PEOPLE_OVER_AGE_QUERY, COUNT_PEOPLE_QUERY, DESCENDANT_COUNT_QUERY, EDGES_PAGE_QUERY, EXAMPLE_CHILDREN,
+    EXAMPLE_MARRIAGES, EXAMPLE_PEOPLE, EXPORT_PAGE_QUERY, FAMILY_TREE_QUERY, FIND_PERSON_IDS_QUERY, GENERATION_QUERY,
+    GENERATION_ROUND_QUERY, GET_PERSON_QUERY, INTEGRITY_PAGE_QUERY, MARRIED_BATCH_QUERY, MARRIED_BY_ID_BATCH_QUERY,
+    MISSING_DERIVED_QUERY, MOST_CHILDREN_QUERY, MOST_DESCENDANTS_QUERY, NEIGHBORHOOD_QUERY, PARENTS_QUERY,
+    PEOPLE_BATCH_QUERY, PEOPLE_OVER_AGE_QUERY, PERSON_PROPERTIES, POPULATION_COLUMNS_QUERY,
+    REMOVE_DUPLICATE_EDGES_QUERY, RESET_DERIVED_QUERY, SCHEMA_FINGERPRINT, SCHEMA_STATEMENTS, SCHEMA_VERSION_QUERY,
+    SEARCH_PEOPLE_QUERY, SET_SCHEMA_VERSION_QUERY, SIBLINGS_QUERY, SPOUSES_QUERY, SUBTREE_EXPORT_PAGE_QUERY,
+    TRAVERSAL_CHUNK_SIZE, assign_person_ids_statement, birthdate_cutoff, child_of_by_id_statement, child_of_statement,
+    create_person_statement, delete_everything_statement, delete_person_by_id_statement, delete_person_statement,
+    key_pairs, lucene_query, married_by_id_statement, married_statement, most_children, name_keys,
+    neighborhood_edges, neighborhood_rows, people_page_queries, person_edges, person_rows, population_columns,
+    relationship_result, update_person_by_id_statement, update_person_statement,
+)
+from kinship import ancestors_from_generations, find_relationship
+from traversal import chunks, walk_generations_async
+
+
+# Async transaction functions; the statements and their result handling come from function.py.
+
+async def _run_statements(tx, statements):
+    for statement in statements:
+        await (await tx.run(statement)).consume()
+
+async def _run_query(tx, query, parameters):
+    await (await tx.run(query, parameters)).consume()
+
+async def _fetch_query(tx, query, parameters):
+    return [record.data() async for record in await tx.run(query, parameters)]
+
+async def _execute(tx, query, parameters, read):
+    return read(await _fetch_query(tx, query, parameters))
+
+
+class AsyncFamilyTreeApp:
+    """asyncio counterpart of FamilyTreeApp on the driver's async API.
+
+    Offers the same methods as coroutines (iter_* as async generators) and
+    runs the same Cypher. gather() runs independent reads concurrently with
+    at most max_concurrency of them in flight, so a dashboard waits about as
+    long as its slowest query instead of the sum of all of them.
+    """
+
+    def __init__(self, uri, user, password, max_concurrency=8):
+        self.driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    @classmethod
+    async def connect(cls, uri, user, password, max_concurrency=8):
+        app = cls(uri, user, password, max_concurrency)
+        await app.setup_schema()
+        return app
+
+    async def close(self):
+        try:
+            await self.driver.close()
+        except Exception as e:
+            print(f"Failed to close the database connection: {e}")
+
+    async def gather(self, *coroutines):
+        """Awaits the coroutines concurrently, bounded by max_concurrency, and returns their results in order.
+
+        The app's own coroutines never take a slot, so they can be gathered without deadlocking.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(coroutine):
+            async with self._semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(bounded(coroutine) for coroutine in coroutines))
+
+    async def setup_schema(self, force=False):
+        try:
+            async with self.driver.session() as session:
+                if not force:
+                    record = await (await session.run(SCHEMA_VERSION_QUERY)).single()
+                    if record and record['fingerprint'] == SCHEMA_FINGERPRINT:
+                        return False
+                await session.execute_write(_run_statements, SCHEMA_STATEMENTS)
+            # Ids and derived properties for people stored before they existed, as in FamilyTreeApp.setup_schema.
+            await self.assign_person_ids()
+            async with self.driver.session() as session:
+                missing = (await (await session.run(MISSING_DERIVED_QUERY)).single())['missing']
+            if missing:
+                await self.rebuild_derived_properties()
+            async with self.driver.session() as session:
+                await session.execute_write(_run_query, SET_SCHEMA_VERSION_QUERY, {"fingerprint": SCHEMA_FINGERPRINT})
+            return True
+        except exceptions.AuthError as e:
+            print(f"Authentication failed: {e}")
+        except exceptions.ServiceUnavailable as e:
+            print(f"Unable to connect to database: {e}")
+        except Exception as e:
+            print(f"Error setting up schema: {e}")
+
+    async def assign_person_ids(self, batch_size=10000):
+        assigned = 0
+        while True:
+            async with self.driver.session() as session:
+                count = await session.execute_write(_execute, *assign_person_ids_statement(batch_size))
+            assigned += count
+            if count < batch_size:
+                return assigned
+
+    async def rebuild_derived_properties(self, batch_size=10000, max_rounds=1000):
+        async with self.driver.session() as session:
+            await (await session.run(RESET_DERIVED_QUERY, batch_size=batch_size)).consume()
+            for rounds in range(1, max_rounds + 1):
+                if not (await (await session.run(GENERATION_ROUND_QUERY, batch_size=batch_size)).single())['changed']:
+                    break
+            else:
+                raise ValueError(f"Generations did not settle after {max_rounds} rounds, check for CHILD_OF cycles (integrity.py)")
+            await (await session.run(DESCENDANT_COUNT_QUERY, batch_size=batch_size)).consume()
+        return rounds
+
+    async def insert_example_data(self):
+        try:
+            await self.write_people_batch(EXAMPLE_PEOPLE)
+            await self.write_married_batch(EXAMPLE_MARRIAGES)
+            await self.write_child_of_batch(EXAMPLE_CHILDREN)
+        except Exception as e:
+            print(f"Failed to insert example data: {e}")
+
+    async def get_all_people(self):
+        async for person in self.iter_people():
+            print(f"{person['first_name']} {person['last_name']} - "
+                  f"{person['birthdate']} - {person['occupation']} - "
+                  f"{person['deathdate']} - {person['description']}")
+
+    async def iter_people(self, properties=PERSON_PROPERTIES, page_size=500):
+        first_page_query, next_page_query = people_page_queries(properties)
+        try:
+            last = None
+            while True:
+                async with self.driver.session() as session:
+                    if last is None:
+                        result = await session.run(first_page_query, page_size=page_size)
+                    else:
+                        result = await session.run(next_page_query, last_name=last[0], first_name=last[1], person_id=last[2],
+                                                 page_size=page_size)
+                    page = [record['person'] async for record in result]
+
+                for person in page:
+                    yield {name: person[name] for name in properties}
+                if len(page) < page_size:
+                    return
+                last = (page[-1]['last_name'], page[-1]['first_name'], page[-1]['person_id'])
+
+        except Exception as e:
+            print(f"Error retrieving people: {e}")
+
+    async def _iter_pages(self, query, page_size, **parameters):
+        # Keyset pages on person_id, like the iter_*_rows methods of FamilyTreeApp.
+        after = -1
+        while True:
+            async with self.driver.session() as session:
+                result = await session.run(query, after=after, page_size=page_size, **parameters)
+                page = [record.data() async for record in result]
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            after = page[-1]['person_id']
+
+    async def iter_edges(self, page_size=500):
+        try:
+            async for row in self._iter_pages(EDGES_PAGE_QUERY, page_size):
+                for edge in person_edges(row['person_id'], row['edges']):
+                    yield edge
+        except Exception as e:
+            print(f"Error retrieving relationships: {e}")
+
+    def iter_integrity_rows(self, page_size=5000):
+        return self._iter_pages(INTEGRITY_PAGE_QUERY, page_size)
+
+    def iter_export_rows(self, root_id=None, page_size=5000):
+        query = EXPORT_PAGE_QUERY if root_id is None else SUBTREE_EXPORT_PAGE_QUERY
+        return self._iter_pages(query, page_size, root_id=root_id)
+
+    async def remove_duplicate_edges(self, person_ids):
+        async with self.driver.session() as session:
+            removed = await session.execute_write(_fetch_query, REMOVE_DUPLICATE_EDGES_QUERY, {"person_ids": list(person_ids)})
+        return removed[0]['removed']
+
+    async def add_reverse_married_edges(self, pairs):
+        async with self.driver.session() as session:
+            added = await session.execute_write(_fetch_query, ADD_REVERSE_MARRIED_QUERY, {"pairs": [list(pair) for pair in pairs]})
+        return added[0]['added']
+
+    async def create_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+        try:
+            async with self.driver.session() as session:
+                return await session.execute_write(_execute, *create_person_statement(
+                    first_name, last_name, birthdate, occupation, deathdate, description))
+        except Exception as e:
+            print(f"Error creating person {first_name} {last_name}: {e}")
+
+    async def update_person(self, first_name, last_name, birthdate=None, occupation=None, deathdate=None, description=None):
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(_execute, *update_person_statement(
+                    first_name, last_name, birthdate, occupation, deathdate, description))
+        except Exception as e:
+            print(f"Error updating person {first_name} {last_name}: {e}")
+
+    async def delete_person(self, first_name, last_name):
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(_execute, *delete_person_statement(first_name, last_name))
+        except Exception as e:
+            print(f"Error deleting person {first_name} {last_name}: {e}")
+
+    async def deleteEverything(self):
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(_execute, *delete_everything_statement())
+        except Exception as e:
+            print(f"Error deleting everything: {e}")
+
+    async def add_married_relationship(self, person1_first_name, person1_last_name, person2_first_name, person2_last_name):
+        try:
+            async with self.driver.session() as session:
+                record = await session.execute_write(_execute, *married_statement(
+                    person1_first_name, person1_last_name, person2_first_name, person2_last_name))
+            return record['status']
+        except Exception as e:
+            print(f"Error adding married relationship: {e}")
+
+    async def add_child_of_relationship(self, child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
+        try:
+            async with self.driver.session() as session:
+                record = await session.execute_write(_execute, *child_of_statement(
+                    child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name))
+            return record['status']
+        except Exception as e:
+            print(f"Error adding child-of relationship: {e}")
+
+    async def find_person_ids(self, first_name, last_name):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(FIND_PERSON_IDS_QUERY, first_name=first_name, last_name=last_name)
+                return [record['person_id'] async for record in result]
+        except Exception as e:
+            print(f"Error looking up {first_name} {last_name}: {e}")
+            return []
+
+    async def get_person(self, person_id):
+        try:
+            async with self.driver.session() as session:
+                record = await (await session.run(GET_PERSON_QUERY, person_id=person_id)).single()
+                return dict(record['person']) if record else None
+        except Exception as e:
+            print(f"Error getting person {person_id}: {e}")
+            return None
+
+    async def update_person_by_id(self, person_id, birthdate=None, occupation=None, deathdate=None, description=None):
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(_execute, *update_person_by_id_statement(
+                    person_id, birthdate, occupation, deathdate, description))
+        except Exception as e:
+            print(f"Error updating person {person_id}: {e}")
+
+    async def delete_person_by_id(self, person_id):
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(_execute, *delete_person_by_id_statement(person_id))
+        except Exception as e:
+            print(f"Error deleting person {person_id}: {e}")
+
+    async def add_married_relationship_by_id(self, person1_id, person2_id):
+        try:
+            async with self.driver.session() as session:
+                record = await session.execute_write(_execute, *married_by_id_statement(person1_id, person2_id))
+            return record['status']
+        except Exception as e:
+            print(f"Error adding married relationship: {e}")
+
+    async def add_child_of_relationship_by_id(self, child_id, parent1_id, parent2_id):
+        try:
+            async with self.driver.session() as session:
+                record = await session.execute_write(_execute, *child_of_by_id_statement(child_id, parent1_id, parent2_id))
+            return record['status']
+        except Exception as e:
+            print(f"Error adding child-of relationship: {e}")
+
+    async def write_people_batch(self, people):
+        rows = person_rows(people)
+        async with self.driver.session() as session:
+            results = await session.execute_write(_fetch_query, PEOPLE_BATCH_QUERY, {"rows": rows, "count": len(rows)})
+        return [result["person_id"] for result in results]
+
+    async def write_married_batch(self, marriages):
+        rows = list(marriages)
+        query = MARRIED_BY_ID_BATCH_QUERY if rows and "person1_id" in rows[0] else MARRIED_BATCH_QUERY
+        async with self.driver.session() as session:
+            results = await session.execute_write(_fetch_query, query, {"rows": rows})
+        return [result["status"] for result in results]
+
+    async def write_child_of_batch(self, children, update_derived=True):
+        rows = list(children)
+        query = CHILD_OF_BY_ID_BATCH_QUERY if rows and "child_id" in rows[0] else CHILD_OF_BATCH_QUERY
+        async with self.driver.session() as session:
+            results = await session.execute_write(_fetch_query, query, {"rows": rows})
+        statuses = [result["status"] for result in results]
+        if update_derived and "created" in statuses:
+            await self.rebuild_derived_properties()
+        return statuses
+
+    async def get_family_tree(self):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(FAMILY_TREE_QUERY)
+                return [record async for record in result]
+        except Exception as e:
+            print(f"Error fetching family tree: {e}")
+            return []
+
+    async def search_people(self, query_string, **options):
+        results = []
+        cursor = None
+        while True:
+            page, cursor = await self.search_people_page(query_string, cursor=cursor, **options)
+            results.extend(page)
+            if cursor is None:
+                return results
+
+    async def search_people_page(self, query_string, limit=50, cursor=None, prefix=True, fuzzy=False,
+                                 born_after=None, born_before=None, died_after=None, died_before=None):
+        try:
+            lucene = lucene_query(query_string, prefix=prefix, fuzzy=fuzzy)
+            if not lucene:
+                return [], None
+            after_score, after_id = cursor if cursor else (None, None)
+            async with self.driver.session() as session:
+                result = await session.run(SEARCH_PEOPLE_QUERY, lucene=lucene, born_after=born_after, born_before=born_before,
+                                           died_after=died_after, died_before=died_before,
+                                           after_score=after_score, after_id=after_id, limit=limit)
+                page = [record async for record in result]
+            next_cursor = (page[-1]['score'], page[-1]['id']) if len(page) == limit else None
+            return page, next_cursor
+        except Exception as e:
+            print(f"Error searching people: {e}")
+            return [], None
+
+    async def list_and_count_people_over_age(self, age):
+        try:
+            age = int(age)
+            return await self.count_people_over_age(age), self.iter_people_over_age(age)
+        except Exception as e:
+            print(f"Error listing and counting people over age {age}: {e}")
+            return 0, []
+
+    async def count_people_over_age(self, age):
+        today = date.today()
+        async with self.driver.session() as session:
+            result = await session.run(COUNT_PEOPLE_OVER_AGE_QUERY, cutoff=birthdate_cutoff(today, age), today=today, age=age)
+            record = await result.single()
+            return record['num_people'] if record else 0
+
+    async def iter_people_over_age(self, age):
+        today = date.today()
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(PEOPLE_OVER_AGE_QUERY, cutoff=birthdate_cutoff(today, age), today=today, age=age)
+                async for record in result:
+                    yield f"{record['first_name']} {record['last_name']} {record['age']} years old"
+        except Exception as e:
+            print(f"Error listing people over age {age}: {e}")
+
+    async def get_persons_with_most_children(self):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(MOST_CHILDREN_QUERY)
+                return most_children([record async for record in result])
+        except Exception as e:
+            print(f"Error getting persons with most children: {e}")
+            return []
+
+    async def get_persons_with_most_descendants(self, limit=10):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(MOST_DESCENDANTS_QUERY, limit=limit)
+                return [(record['person'], record['num_descendants']) async for record in result]
+        except Exception as e:
+            print(f"Error getting persons with most descendants: {e}")
+            return []
+
+    async def get_people_of_generation(self, generation):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(GENERATION_QUERY, generation=generation)
+                return [record['person'] async for record in result]
+        except Exception as e:
+            print(f"Error getting people of generation {generation}: {e}")
+            return []
+
+    async def get_population_columns(self):
+        try:
+            async with self.driver.session() as session:
+                record = await (await session.run(POPULATION_COLUMNS_QUERY)).single()
+            return population_columns(record)
+        except Exception as e:
+            print(f"Error fetching population statistics: {e}")
+            return None
+
+    async def get_siblings(self, first_name, last_name):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(SIBLINGS_QUERY, first_name=first_name, last_name=last_name)
+                record = await result.single()
+                return list(record['siblings']) if record else []
+        except Exception as e:
+            print(f"Error getting siblings for {first_name} {last_name}: {e}")
+            return []
+
+    async def count_people(self):
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(COUNT_PEOPLE_QUERY)
+                record = await result.single()
+                return record['num_people'] if record else 0
+        except Exception as e:
+            print(f"Error counting people: {e}")
+            return 0
+
+    def iter_ancestors(self, first_name, last_name, max_generations=None):
+        return self._iter_generations(first_name, last_name, max_generations, PARENTS_QUERY, "ancestors")
+
+    def iter_descendants(self, first_name, last_name, max_generations=None):
+        return self._iter_generations(first_name, last_name, max_generations, CHILDREN_QUERY, "descendants")
+
+    async def _iter_generations(self, first_name, last_name, max_generations, query, kind):
+        try:
+            async for generation, found in walk_generations_async([(first_name, last_name)], self._expander(query),
+                                                                 max_generations):
+                yield generation, [key for key, _ in found]
+
+        except Exception as e:
+            print(f"Error getting {kind} of {first_name} {last_name}: {e}")
+
+    def _expander(self, query):
+        async def expand(frontier):
+            records = []
+            async with self.driver.session() as session:
+                for keys in chunks(frontier, TRAVERSAL_CHUNK_SIZE):
+                    result = await session.run(query, keys=keys)
+                    records.extend([record async for record in result])
+            return key_pairs(records)
+        return expand
+
+    async def _ancestors(self, key):
+        generations = [step async for step in walk_generations_async([key], self._expander(PARENTS_QUERY))]
+        return ancestors_from_generations(key, generations)
+
+    async def _spouses(self, key):
+        async with self.driver.session() as session:
+            result = await session.run(SPOUSES_QUERY, first_name=key[0], last_name=key[1])
+            return name_keys([record async for record in result])
+
+    async def get_neighborhood(self, first_name, last_name, generations_up=2, generations_down=2):
+        nodes = {(first_name, last_name): 0}
+        async for generation, people in self.iter_ancestors(first_name, last_name, generations_up):
+            for key in people:
+                nodes.setdefault(key, -generation)
+        async for generation, people in self.iter_descendants(first_name, last_name, generations_down):
+            for key in people:
+                nodes.setdefault(key, generation)
+
+        found = []
+        try:
+            async with self.driver.session() as session:
+                for keys in chunks(list(nodes), TRAVERSAL_CHUNK_SIZE):
+                    result = await session.run(NEIGHBORHOOD_QUERY, keys=keys)
+                    found.extend(neighborhood_rows([record async for record in result]))
+        except Exception as e:
+            print(f"Error getting relationships around {first_name} {last_name}: {e}")
+
+        return neighborhood_edges(nodes, found)
+
+    async def get_relationship(self, first_name1, last_name1, first_name2, last_name2):
+        a, b = (first_name1, last_name1), (first_name2, last_name2)
+        try:
+            # find_relationship only looks at the two people and their spouses, so those are fetched up front.
+            # Plain asyncio.gather: the caller may hold every slot of self.gather already.
+            spouses = dict(zip((a, b), await asyncio.gather(self._spouses(a), self._spouses(b))))
+            keys = list(dict.fromkeys([a, b, *spouses[a], *spouses[b]]))
+            ancestors = dict(zip(keys, await asyncio.gather(*(self._ancestors(key) for key in keys))))
+            return relationship_result(find_relationship(a, b, ancestors.__getitem__, spouses.__getitem__))
+        except Exception as e:
+            print(f"Error getting relationship between {first_name1} {last_name1} and {first_name2} {last_name2}: {e}")
+            return None
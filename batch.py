@@ -0,0 +1,263 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+# Operations of menu options 1-14. Writes are collected and committed together,
+# reads first commit what is pending so they see every command before them.
+WRITE_OPERATIONS = ("insert_example_data", "create_person", "update_person", "delete_person", "delete_everything",
+                    "add_married", "add_child_of")
+READ_OPERATIONS = ("get_all_people", "get_family_tree", "search_people", "people_over_age", "most_children",
+                   "siblings", "count_people")
+
+
+class CommandError(ValueError):
+    pass
+
+
+def _date(command, key):
+    value = command.get(key)
+    try:
+        return date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        raise CommandError(f"{key} must be a date (YYYY-MM-DD), got {value!r}")
+
+
+def _required(command, *keys):
+    missing = [key for key in keys if command.get(key) in (None, "")]
+    if missing:
+        raise CommandError(f"missing {', '.join(missing)}")
+    return [command[key] for key in keys]
+
+
+def _person_args(command):
+    first_name, last_name = _required(command, "first_name", "last_name")
+    return (first_name, last_name, _date(command, "birthdate"), command.get("occupation"),
+            _date(command, "deathdate"), command.get("description"))
+
+
+def _by_id(command, *roles):
+    # Relationship and person commands take either ids (person_id, child_id, ...) or names.
+    if all(f"{role}_id" in command for role in roles):
+        return True, _required(command, *(f"{role}_id" for role in roles))
+    names = []
+    for role in roles:
+        prefix = "" if role == "person" else f"{role}_"
+        names += _required(command, f"{prefix}first_name", f"{prefix}last_name")
+    return False, names
+
+
+def _write_call(command):
+    """Returns (method name, arguments) of the app or UnitOfWork method that carries out a write command."""
+    op = command["op"]
+    if op == "insert_example_data":
+        return "insert_example_data", ()
+    if op == "create_person":
+        return "create_person", _person_args(command)
+    if op == "update_person":
+        by_id, key = _by_id(command, "person")
+        values = (_date(command, "birthdate"), command.get("occupation"), _date(command, "deathdate"), command.get("description"))
+        return ("update_person_by_id" if by_id else "update_person"), (*key, *values)
+    if op == "delete_person":
+        by_id, key = _by_id(command, "person")
+        return ("delete_person_by_id" if by_id else "delete_person"), tuple(key)
+    if op == "delete_everything":
+        if command.get("confirm") is not True:
+            raise CommandError('delete_everything needs "confirm": true')
+        return "deleteEverything", ()
+    if op == "add_married":
+        by_id, key = _by_id(command, "person1", "person2")
+        return ("add_married_relationship_by_id" if by_id else "add_married_relationship"), tuple(key)
+    by_id, key = _by_id(command, "child", "parent1", "parent2")
+    return ("add_child_of_relationship_by_id" if by_id else "add_child_of_relationship"), tuple(key)
+
+
+def _write_result(result):
+    # create_person returns the new id, relationship writes their status (in a record inside a transaction).
+    if isinstance(result, dict):
+        result = result.get("status")
+    if isinstance(result, str):
+        return {"status": result}
+    if isinstance(result, int):
+        return {"person_id": result}
+    return None
+
+
+def _rows(rows):
+    # Driver records are tuples and would be serialized as bare arrays; write them as objects like the memory backend.
+    return [row.data() if hasattr(row, "data") else dict(row) for row in rows]
+
+
+def _read(app, command):
+    op = command["op"]
+    if op == "get_all_people":
+        return list(app.iter_people())
+    if op == "get_family_tree":
+        return _rows(app.get_family_tree())
+    if op == "search_people":
+        (query,) = _required(command, "query")
+        return _rows(app.search_people_page(query, limit=command.get("limit", 50))[0])
+    if op == "people_over_age":
+        (age,) = _required(command, "age")
+        count, people = app.list_and_count_people_over_age(int(age))
+        return {"count": count, "people": list(people)}
+    if op == "most_children":
+        return [{"person": person, "children": children} for person, children in app.get_persons_with_most_children()]
+    if op == "siblings":
+        return app.get_siblings(*_required(command, "first_name", "last_name"))
+    return app.count_people()
+
+
+class BatchRunner:
+    """Executes JSON-Lines commands against an app and writes one JSON-Lines result per command.
+
+    A command is an object with "op" (see WRITE_OPERATIONS and READ_OPERATIONS)
+    and the arguments of that operation. Consecutive writes, up to batch_size,
+    are committed in one transaction (app.unit_of_work()); if that fails, the
+    writes of the transaction are retried one by one so each gets its own
+    result. Results follow the order of the commands and are {"line", "op",
+    "ok", "result"} or {"line", "op", "ok", "error"}.
+    """
+
+    def __init__(self, app, output, batch_size=500):
+        self.app = app
+        self.output = output
+        self.batch_size = batch_size
+        self.pending = []
+        self.counts = {"commands": 0, "failed": 0}
+
+    def emit(self, line, op, result=None, error=None):
+        record = {"line": line, "op": op, "ok": error is None}
+        if error is None:
+            record["result"] = result
+        else:
+            record["error"] = str(error)
+            self.counts["failed"] += 1
+        self.counts["commands"] += 1
+        self.output.write(json.dumps(record, default=str) + "\n")
+
+    def run(self, lines):
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            command = op = None
+            try:
+                command = json.loads(line)
+                op = command.get("op") if isinstance(command, dict) else None
+                if op in WRITE_OPERATIONS:
+                    self.pending.append((number, op, _write_call(command)))
+                    if len(self.pending) >= self.batch_size:
+                        self.flush()
+                    continue
+                if op not in READ_OPERATIONS:
+                    raise CommandError(f"unknown op {op!r}")
+                self.flush()
+                self.emit(number, op, _read(self.app, command))
+            except Exception as e:
+                # Queued writes come from earlier lines, so their results go first.
+                self.flush()
+                self.emit(number, op, error=e)
+        self.flush()
+        self.output.flush()
+        return self.counts
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        # Apps without transactions (the in-memory backend) and operations a UnitOfWork
+        # cannot hold (insert_example_data) are called directly.
+        unit = self.app.unit_of_work() if hasattr(self.app, "unit_of_work") else None
+        group = []
+        for entry in pending:
+            if unit is None or not hasattr(unit, entry[2][0]):
+                self._commit(group)
+                group = []
+                self._call(entry)
+            else:
+                group.append(entry)
+        self._commit(group)
+
+    def _commit(self, group):
+        if not group:
+            return
+        unit = self.app.unit_of_work()
+        for _, _, (method, args) in group:
+            getattr(unit, method)(*args)
+        try:
+            results = unit.commit()
+        except Exception as e:
+            if len(group) == 1:
+                self.emit(group[0][0], group[0][1], error=e)
+                return
+            for entry in group:
+                self._commit([entry])
+            return
+        for (number, op, _), result in zip(group, results):
+            self.emit(number, op, _write_result(result))
+
+    def _call(self, entry):
+        number, op, (method, args) = entry
+        try:
+            result = getattr(self.app, method)(*args)
+            if result is None and op in ("add_married", "add_child_of"):
+                # The app printed why (to stderr) instead of raising.
+                raise CommandError("relationship not written")
+            self.emit(number, op, _write_result(result))
+        except Exception as e:
+            self.emit(number, op, error=e)
+
+
+def run_batch(app, lines, output=None, batch_size=500):
+    """Runs the commands; results go to output (stdout), the app's own messages to stderr."""
+    output = output or sys.stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        counts = BatchRunner(app, output, batch_size).run(lines)
+    elapsed = time.perf_counter() - start
+    rate = counts["commands"] / elapsed if elapsed else 0
+    print(f"{counts['commands']} commands, {counts['failed']} failed in {elapsed:.1f}s ({rate:.0f} commands/s)",
+          file=sys.stderr)
+    return counts
+
+
+def run_script(app, script, batch_size=500):
+    """Runs the commands of a file, or of stdin for '-'."""
+    if script == "-":
+        return run_batch(app, sys.stdin, batch_size=batch_size)
+    with open(script, encoding="utf-8") as file:
+        return run_batch(app, file, batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JSON-Lines family tree commands from a file or stdin.")
+    parser.add_argument("script", nargs="?", default="-", help="command file, - for stdin (default)")
+    parser.add_argument("--batch-size", type=int, default=500, help="writes per transaction")
+    args = parser.parse_args()
+
+    load_dotenv()
+    with contextlib.redirect_stdout(sys.stderr):
+        if os.getenv("BACKEND_DB") == "memory":
+            from memory_backend import InMemoryFamilyTreeApp
+            app = InMemoryFamilyTreeApp()
+        else:
+            from function import FamilyTreeApp
+            app = FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+            if not app.connected:
+                sys.exit(1)
+    try:
+        counts = run_script(app, args.script, args.batch_size)
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            app.close()
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
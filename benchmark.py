@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+
+from importer import CHILD_OF, MARRIED, PEOPLE
+from synthetic import load_synthetic_tree
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    summary = {"runs": len(latencies), "throughput_per_s": len(latencies) / elapsed if elapsed else None}
+    for percent in PERCENTILES:
+        value = percentile(latencies, percent)
+        summary[f"p{percent}_ms"] = value * 1000 if value is not None else None
+    return summary
+
+
+def time_operation(operation, arguments, iterations):
+    """Calls operation once per argument tuple (cycling) and returns the latency summary."""
+    latencies = []
+    start = time.perf_counter()
+    for index in range(iterations):
+        call_start = time.perf_counter()
+        operation(*arguments[index % len(arguments)])
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _drain(iterable):
+    for _ in iterable:
+        pass
+
+
+def read_operations(app, sample, rng):
+    """Returns {name: (callable, [argument tuples], iterations factor)} for the read methods."""
+    pairs = [(a[0], a[1], b[0], b[1]) for a, b in zip(sample, rng.sample(sample, len(sample)))]
+    people = [tuple(key) for key in sample]
+    names = [(key[0].split()[0],) for key in sample]
+    return {
+        "count_people": (app.count_people, [()], 1),
+        "get_siblings": (app.get_siblings, people, 1),
+        "get_persons_with_most_children": (app.get_persons_with_most_children, [()], 0.1),
+        "search_people_page": (lambda query: app.search_people_page(query, limit=20), names, 1),
+        "count_people_over_age": (app.count_people_over_age, [(age,) for age in (18, 40, 65, 90)], 0.2),
+        "iter_people_over_age": (lambda age: _drain(app.iter_people_over_age(age)), [(90,)], 0.05),
+        "iter_people": (lambda: _drain(app.iter_people()), [()], 0.02),
+        "get_family_tree": (app.get_family_tree, [()], 0.02),
+        "iter_ancestors": (lambda first, last: _drain(app.iter_ancestors(first, last)), people, 1),
+        "iter_descendants": (lambda first, last: _drain(app.iter_descendants(first, last, 3)), people, 1),
+        "get_relationship": (app.get_relationship, pairs, 0.5),
+        "get_neighborhood": (app.get_neighborhood, people, 0.5),
+    }
+
+
+def write_operations(app, iterations, run_id):
+    """Creates, links, updates and deletes benchmark-only people; yields (name, summary)."""
+    people = [(f"Bench{run_id}", f"Person{index}") for index in range(iterations)]
+    spouses = [(f"Bench{run_id}", f"Spouse{index}") for index in range(iterations)]
+    children = [(f"Bench{run_id}", f"Child{index}") for index in range(iterations)]
+    birthdate = date(1990, 1, 1)
+
+    yield "create_person", time_operation(
+        lambda first, last: app.create_person(first, last, birthdate, "Tester"), people + spouses + children,
+        3 * iterations)
+    yield "add_married_relationship", time_operation(
+        app.add_married_relationship, [person + spouse for person, spouse in zip(people, spouses)], iterations)
+    yield "add_child_of_relationship", time_operation(
+        app.add_child_of_relationship,
+        [child + person + spouse for child, person, spouse in zip(children, people, spouses)], iterations)
+    yield "update_person", time_operation(
+        lambda first, last: app.update_person(first, last, birthdate, "Benchmarker"), people, iterations)
+    yield "delete_person", time_operation(app.delete_person, children + spouses + people, 3 * iterations)
+
+
+def run_benchmark(app, sizes, iterations=200, seed=0, batch_size=5000, report=print):
+    """Loads a synthetic tree of each size into an emptied app and times every method.
+
+    Returns a JSON-serialisable dict; the database is wiped before every size.
+    """
+    rng = random.Random(seed)
+    results = {"started": datetime.now().isoformat(timespec="seconds"), "seed": seed,
+               "iterations": iterations, "python": platform.python_version(),
+               "backend": type(app).__name__, "sizes": []}
+
+    for size in sizes:
+        app.deleteEverything()
+        app.setup_schema()
+        start = time.perf_counter()
+        counts, sample = load_synthetic_tree(app, batch_size=batch_size, seed=seed, founders=max(10, size // 20),
+                                             generations=50, max_people=size)
+        load_seconds = time.perf_counter() - start
+        rows = sum(counts.values())
+        report(f"{size} people: loaded {rows} rows in {load_seconds:.2f}s ({rows / load_seconds:.0f} rows/s)")
+
+        operations = {}
+        for name, (operation, arguments, factor) in read_operations(app, sample, rng).items():
+            operations[name] = time_operation(operation, arguments, max(1, int(iterations * factor)))
+            report(f"  {name}: p50 {operations[name]['p50_ms']:.2f} ms, p99 {operations[name]['p99_ms']:.2f} ms")
+        for name, summary in write_operations(app, max(1, iterations // 4), size):
+            operations[name] = summary
+            report(f"  {name}: p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms")
+
+        results["sizes"].append({
+            "people": counts[PEOPLE], "marriages": counts[MARRIED], "child_of": counts[CHILD_OF],
+            "load_seconds": load_seconds, "load_rows_per_s": rows / load_seconds if load_seconds else None,
+            "operations": operations,
+        })
+    return results
+
+
+def _create_app(backend):
+    if backend == "memory":
+        from memory_backend import InMemoryFamilyTreeApp
+        return InMemoryFamilyTreeApp()
+    from function import FamilyTreeApp
+    load_dotenv()
+    return FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every FamilyTreeApp method on synthetic family trees.")
+    parser.add_argument("--backend", choices=("memory", "neo4j"), default="memory",
+                        help="neo4j uses the database from .env and DELETES all of its data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    app = _create_app(args.backend)
+    try:
+        results = run_benchmark(app, args.sizes, iterations=args.iterations, seed=args.seed, batch_size=args.batch_size)
+    finally:
+        app.close()
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+from importer import CHILD_OF, MARRIED, BulkImporter, parse_date
+
+ALIVE = date(1, 1, 1)
+GEDCOM = "gedcom"
+JSONL = "jsonl"
+MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+# GEDCOM lines may have at most 255 characters; longer values continue in CONC lines.
+GEDCOM_CHUNK = 200
+GEDCOM_LINE = re.compile(r"\s*(\d+)\s+(?:(@[^@]+@)\s+)?(\S+)(?: (.*))?")
+
+
+def detect_format(path):
+    """GEDCOM for .ged (optionally .gz), JSON Lines otherwise."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return GEDCOM if name.endswith(".ged") else JSONL
+
+
+def open_output(path, compress=None):
+    """Opens path for writing text; gzip-compressed when compress is True or, if None, when path ends with .gz."""
+    if path == "-":
+        return open(sys.stdout.fileno(), "w", encoding="utf-8", closefd=False)
+    if compress is None:
+        compress = path.lower().endswith(".gz")
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def open_input(path):
+    """Opens a plain or gzip-compressed text file (recognized by its content)."""
+    with open(path, "rb") as file:
+        compressed = file.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8-sig")
+    return open(path, encoding="utf-8-sig")
+
+
+class _CountingWriter:
+    """Counts the characters written, i.e. the uncompressed size."""
+
+    def __init__(self, file):
+        self.file = file
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+        self.file.write(text)
+
+
+# GEDCOM 5.5.1 output. People are INDI records @I<person_id>@. A family (FAM) is a pair of
+# people who are married or have children together, or a single parent of children without
+# a second parent; it is @F<smaller id>_<larger id>@ or @F<parent id>@, so every person can
+# name their families without knowing the rest of the tree. There is no sex in the data:
+# individuals get SEX U and the partner with the smaller id is HUSB, the other WIFE.
+
+def _family(person_id, partner_id=None):
+    if partner_id is None:
+        return f"@F{person_id}@"
+    return f"@F{min(person_id, partner_id)}_{max(person_id, partner_id)}@"
+
+
+def _gedcom_date(value):
+    return f"{value.day} {MONTHS[value.month - 1]} {value.year}"
+
+
+def _gedcom_text(level, tag, value):
+    # '@' is doubled, line breaks become CONT lines and long lines CONC lines.
+    lines = []
+    for number, line in enumerate(str(value).splitlines() or [""]):
+        chunks = [line[start:start + GEDCOM_CHUNK].replace("@", "@@")
+                  for start in range(0, len(line), GEDCOM_CHUNK)] or [""]
+        head = f"{level} {tag}" if number == 0 else f"{level + 1} CONT"
+        lines.append(f"{head} {chunks[0]}".rstrip() + "\n")
+        lines.extend(f"{level + 1} CONC {chunk}\n" for chunk in chunks[1:])
+    return "".join(lines)
+
+
+def _partners(row):
+    """Maps each partner id of a person (None for children without a second parent) to the shared children."""
+    partners = {spouse_id: [] for spouse_id in row["spouses"]}
+    for child_id, other_id in row["children"]:
+        partners.setdefault(other_id, []).append(child_id)
+    return partners
+
+
+def gedcom_individual(row, partners):
+    person_id = row["person_id"]
+    lines = [f"0 @I{person_id}@ INDI\n",
+             _gedcom_text(1, "NAME", f"{row['first_name']} /{row['last_name']}/"),
+             _gedcom_text(2, "GIVN", row["first_name"]),
+             _gedcom_text(2, "SURN", row["last_name"]),
+             "1 SEX U\n"]
+    if row["birthdate"]:
+        lines.append(f"1 BIRT\n2 DATE {_gedcom_date(row['birthdate'])}\n")
+    if row["deathdate"] and row["deathdate"] != ALIVE:
+        lines.append(f"1 DEAT\n2 DATE {_gedcom_date(row['deathdate'])}\n")
+    if row["occupation"]:
+        lines.append(_gedcom_text(1, "OCCU", row["occupation"]))
+    if row["description"]:
+        lines.append(_gedcom_text(1, "NOTE", row["description"]))
+    parents = sorted(set(row["parents"]))
+    if parents:
+        # More than two parents is a data error (see integrity.py); the first two are used.
+        lines.append(f"1 FAMC {_family(*parents[:2])}\n")
+    for partner_id in sorted(partners, key=lambda key: (key is None, key)):
+        lines.append(f"1 FAMS {_family(person_id, partner_id)}\n")
+    return "".join(lines)
+
+
+def gedcom_families(row, partners):
+    """The FAM records this person writes: those where they are the partner with the smaller id."""
+    person_id = row["person_id"]
+    spouses = set(row["spouses"])
+    records = []
+    for partner_id in sorted(partners, key=lambda key: (key is None, key)):
+        if partner_id is not None and partner_id < person_id:
+            continue
+        lines = [f"0 {_family(person_id, partner_id)} FAM\n1 HUSB @I{person_id}@\n"]
+        if partner_id is not None:
+            lines.append(f"1 WIFE @I{partner_id}@\n")
+        if partner_id in spouses:
+            lines.append("1 MARR Y\n")
+        lines.extend(f"1 CHIL @I{child_id}@\n" for child_id in sorted(partners[partner_id]))
+        records.append("".join(lines))
+    return records
+
+
+def gedcom_header(today=None):
+    today = today or date.today()
+    return ("0 HEAD\n1 SOUR M165_FAMILY_TREE\n2 NAME M165 Family Tree\n"
+            f"1 DATE {_gedcom_date(today)}\n1 SUBM @SUBM@\n"
+            "1 GEDC\n2 VERS 5.5.1\n2 FORM LINEAGE-LINKED\n1 CHAR UTF-8\n"
+            "0 @SUBM@ SUBM\n1 NAME M165 Family Tree\n")
+
+
+def jsonl_person(row):
+    deathdate = row["deathdate"] if row["deathdate"] != ALIVE else None
+    return json.dumps({
+        "person_id": row["person_id"],
+        "first_name": row["first_name"],
+        "last_name": row["last_name"],
+        "birthdate": row["birthdate"].isoformat() if row["birthdate"] else None,
+        "occupation": row["occupation"],
+        "deathdate": deathdate.isoformat() if deathdate else None,
+        "description": row["description"],
+        "parents": sorted(set(row["parents"])),
+        "spouses": sorted(set(row["spouses"])),
+    }, ensure_ascii=False) + "\n"
+
+
+class Exporter:
+    """Streams the tree, or the subtree of one person, to GEDCOM 5.5.1 or JSON Lines.
+
+    People come from app.iter_export_rows in person_id pages and are written as
+    they arrive, so memory does not grow with the tree. GEDCOM needs the
+    individuals before the families; the FAM records are spooled to a
+    temporary file and appended at the end. Every report_every people the
+    throughput is reported.
+    """
+
+    def __init__(self, app, page_size=5000, report=print, report_every=100000):
+        self.app = app
+        self.page_size = page_size
+        self.report = report
+        self.report_every = report_every
+
+    def export(self, path, format=None, root_id=None, compress=None):
+        """Writes the export to path (- for stdout). Returns people, families, characters and seconds."""
+        format = format or detect_format(path)
+        start = time.perf_counter()
+        with open_output(path, compress) as file:
+            output = _CountingWriter(file)
+            if format == GEDCOM:
+                people, families = self._write_gedcom(output, root_id, start)
+            else:
+                people, families = self._write_jsonl(output, root_id, start), 0
+        elapsed = time.perf_counter() - start
+        stats = {"people": people, "families": families, "characters": output.written, "seconds": elapsed}
+        size = f", {os.path.getsize(path) / 1e6:.1f} MB on disk" if path != "-" else ""
+        self.report(f"Exported {people} people and {families} families in {elapsed:.1f}s "
+                    f"({people / elapsed if elapsed else 0:.0f} people/s, {output.written / 1e6:.1f} MB{size})")
+        return stats
+
+    def _rows(self, root_id, output, start):
+        for count, row in enumerate(self.app.iter_export_rows(root_id=root_id, page_size=self.page_size), 1):
+            yield row
+            if count % self.report_every == 0:
+                elapsed = time.perf_counter() - start
+                self.report(f"{count} people exported ({count / elapsed:.0f} people/s, "
+                            f"{output.written / 1e6 / elapsed:.1f} MB/s)")
+
+    def _write_jsonl(self, output, root_id, start):
+        people = 0
+        for row in self._rows(root_id, output, start):
+            output.write(jsonl_person(row))
+            people += 1
+        return people
+
+    def _write_gedcom(self, output, root_id, start):
+        people = families = 0
+        output.write(gedcom_header())
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+            for row in self._rows(root_id, output, start):
+                partners = _partners(row)
+                output.write(gedcom_individual(row, partners))
+                records = gedcom_families(row, partners)
+                families += len(records)
+                spool.writelines(records)
+                people += 1
+            spool.seek(0)
+            shutil.copyfileobj(spool, output)
+        output.write("0 TRLR\n")
+        return people, families
+
+
+# Import of the two formats; people get new ids, so relationships are written in a second
+# pass over the file through a map from the exported ids (or GEDCOM xrefs) to the new ones.
+
+def _parse_gedcom_date(value):
+    # Only exact dates ("15 JUL 1950") fit the date properties; others are left out.
+    parts = (value or "").split()
+    if len(parts) != 3 or parts[1].upper() not in MONTHS:
+        return None
+    try:
+        return date(int(parts[2]), MONTHS.index(parts[1].upper()) + 1, int(parts[0]))
+    except ValueError:
+        return None
+
+
+def gedcom_records(lines):
+    """Yields (xref, tag, [(level, tag, value), ...]) for every level-0 record of a GEDCOM file."""
+    record = None
+    for line in lines:
+        match = GEDCOM_LINE.match(line.rstrip("\r\n"))
+        if not match:
+            continue
+        level, xref, tag, value = int(match[1]), match[2], match[3], (match[4] or "").replace("@@", "@")
+        if level == 0:
+            if record:
+                yield record
+            record = (xref, tag, [])
+        elif record:
+            record[2].append((level, tag, value))
+    if record:
+        yield record
+
+
+def gedcom_person(lines):
+    person = {"first_name": None, "last_name": None, "birthdate": None, "occupation": None,
+              "deathdate": None, "description": None}
+    fields = {"OCCU": "occupation", "NOTE": "description"}
+    event = name = None
+    for level, tag, value in lines:
+        if level == 1:
+            event = tag
+            if tag == "NAME":
+                name = value
+            elif tag in fields:
+                person[fields[tag]] = value
+        elif level == 2 and event in fields and tag in ("CONT", "CONC"):
+            separator = "\n" if tag == "CONT" else ""
+            person[fields[event]] = (person[fields[event]] or "") + separator + value
+        elif level == 2 and event == "NAME" and tag in ("GIVN", "SURN"):
+            person["first_name" if tag == "GIVN" else "last_name"] = value
+        elif level == 2 and event in ("BIRT", "DEAT") and tag == "DATE":
+            person["birthdate" if event == "BIRT" else "deathdate"] = _parse_gedcom_date(value)
+    if name and (person["first_name"] is None or person["last_name"] is None):
+        given, _, rest = name.partition("/")
+        person["first_name"] = person["first_name"] or given.strip()
+        person["last_name"] = person["last_name"] or rest.split("/")[0].strip()
+    return person
+
+
+def _read_jsonl(path):
+    with open_input(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_people(path, format):
+    """Yields (exported key, person) in file order."""
+    if format == JSONL:
+        for record in _read_jsonl(path):
+            yield record["person_id"], {
+                "first_name": record["first_name"],
+                "last_name": record["last_name"],
+                "birthdate": parse_date(record.get("birthdate")),
+                "occupation": record.get("occupation"),
+                "deathdate": parse_date(record.get("deathdate")),
+                "description": record.get("description"),
+            }
+        return
+    with open_input(path) as file:
+        for xref, tag, lines in gedcom_records(file):
+            if tag == "INDI":
+                yield xref, gedcom_person(lines)
+
+
+def _read_relationships(path, format):
+    """Yields (MARRIED, [key, key]) and (CHILD_OF, [child key, parent key, parent key]) by exported keys."""
+    if format == JSONL:
+        for record in _read_jsonl(path):
+            person_id = record["person_id"]
+            yield from ((MARRIED, [person_id, spouse_id]) for spouse_id in record["spouses"] if person_id < spouse_id)
+            if len(record["parents"]) == 2:
+                yield CHILD_OF, [person_id, *record["parents"]]
+        return
+    with open_input(path) as file:
+        for _, tag, lines in gedcom_records(file):
+            if tag != "FAM":
+                continue
+            partners = [value for level, key, value in lines if level == 1 and key in ("HUSB", "WIFE")]
+            if len(partners) != 2:
+                continue
+            if any(level == 1 and key == "MARR" for level, key, _ in lines):
+                yield MARRIED, partners
+            yield from ((CHILD_OF, [value, *partners]) for level, key, value in lines if level == 1 and key == "CHIL")
+
+
+def import_export(app, path, format=None, batch_size=1000, report=print):
+    """Loads a file written by Exporter (or another GEDCOM file) into app. Returns the new id per exported key.
+
+    Relationships to people who are not in the file (e.g. the parents of the root of
+    a subtree export) and children with a single parent are skipped.
+    """
+    format = format or detect_format(path)
+    new_ids = {}
+    start = time.perf_counter()
+    batch = []
+
+    def write_people():
+        person_ids = app.write_people_batch([person for _, person in batch])
+        new_ids.update(zip((key for key, _ in batch), person_ids))
+        batch.clear()
+        elapsed = time.perf_counter() - start
+        report(f"people: {len(new_ids)} records committed ({len(new_ids) / elapsed if elapsed else 0:.0f} records/s)")
+
+    for key, person in _read_people(path, format):
+        batch.append((key, person))
+        if len(batch) >= batch_size:
+            write_people()
+    if batch:
+        write_people()
+
+    skipped = 0
+
+    def rows(kind, columns):
+        nonlocal skipped
+        for relationship, keys in _read_relationships(path, format):
+            if relationship != kind:
+                continue
+            if not all(key in new_ids for key in keys):
+                skipped += 1
+                continue
+            yield dict(zip(columns, (new_ids[key] for key in keys)))
+
+    importer = BulkImporter(app, batch_size=batch_size, report=report)
+    importer.import_records(MARRIED, rows(MARRIED, ("person1_id", "person2_id")))
+    importer.import_records(CHILD_OF, rows(CHILD_OF, ("child_id", "parent1_id", "parent2_id")))
+    if skipped:
+        report(f"{skipped} relationships to people outside the file skipped")
+    return new_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the family tree to GEDCOM 5.5.1 or JSON Lines, or import such a file.")
+    parser.add_argument("path", help="file to write (.ged or .jsonl, .gz compresses; - for stdout) or, with --import, to read")
+    parser.add_argument("--import", dest="load", action="store_true", help="import path instead of exporting")
+    parser.add_argument("--format", choices=(GEDCOM, JSONL), help="default: from the file name")
+    parser.add_argument("--root-id", type=int, help="export only this person, their descendants and their partners")
+    parser.add_argument("--gzip", action="store_true", default=None, help="compress even without .gz in the name")
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="records per transaction when importing")
+    args = parser.parse_args()
+
+    from function import FamilyTreeApp
+    load_dotenv()
+    # Progress goes to stderr, so an export to stdout stays clean.
+    report = lambda message: print(message, file=sys.stderr)
+    app = FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+    try:
+        if args.load:
+            import_export(app, args.path, args.format, args.batch_size, report)
+        else:
+            Exporter(app, args.page_size, report).export(args.path, args.format, args.root_id, args.gzip)
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
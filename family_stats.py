@@ -0,0 +1,136 @@
+from datetime import date
+
+import numpy as np
+
+from snapshot import EPOCH_ORDINAL, NO_DAY
+
+# deathdate 0001-01-01 marks living people, as epoch days.
+ALIVE_DAY = date(1, 1, 1).toordinal() - EPOCH_ORDINAL
+
+
+def _day_column(values):
+    # None becomes NaN in a float array, which is then mapped to NO_DAY.
+    days = np.array(values, dtype=np.float64)
+    return np.where(np.isnan(days), NO_DAY, days).astype(np.int32)
+
+
+def _calendar(days):
+    dates = np.asarray(days, dtype=np.int64).astype("datetime64[D]")
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = dates.astype("datetime64[M]")
+    month_days = (months.astype(np.int64) % 12 + 1) * 100 + (dates - months).astype(np.int64) + 1
+    return years, month_days
+
+
+def whole_years(start_days, end_days):
+    """Calendar-correct age in completed years between two arrays of epoch days."""
+    start_years, start_month_days = _calendar(start_days)
+    end_years, end_month_days = _calendar(end_days)
+    return end_years - start_years - (end_month_days < start_month_days)
+
+
+class PopulationStats:
+    """Vectorized statistics over everyone in the tree.
+
+    Holds birth and death dates as int32 epoch days (NO_DAY when unknown or
+    alive), child counts and occupation codes as NumPy arrays; names are only
+    looked up for the rows that are returned. Build it with from_app (one bulk
+    query) or from_snapshot (no database at all).
+    """
+
+    def __init__(self, birth_days, death_days, child_counts, occupation_codes, occupations, name_of):
+        self.birth_days = np.asarray(birth_days, dtype=np.int32)
+        self.death_days = np.asarray(death_days, dtype=np.int32)
+        self.child_counts = np.asarray(child_counts, dtype=np.int32)
+        self.occupation_codes = np.asarray(occupation_codes, dtype=np.int32)
+        self.occupations = occupations
+        self.name_of = name_of
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Builds the arrays from the lists returned by app.get_population_columns()."""
+        death_days = _day_column(columns["death_days"])
+        death_days[death_days == ALIVE_DAY] = NO_DAY
+        occupations = np.array(columns["occupations"], dtype=object)
+        missing = occupations == None  # noqa: E711 (elementwise)
+        occupations[missing] = ""
+        names, codes = np.unique(occupations.astype(str), return_inverse=True)
+        codes[missing] = -1
+        return cls(_day_column(columns["birth_days"]), death_days, columns["child_counts"], codes,
+                   names.tolist(), columns["names"].__getitem__)
+
+    @classmethod
+    def from_app(cls, app):
+        columns = app.get_population_columns()
+        return cls.from_columns(columns) if columns is not None else None
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.birth_days, snapshot.death_days, snapshot.child_counts(), snapshot.occupation_codes,
+                   snapshot.dictionary("occupations"), snapshot.name)
+
+    def __len__(self):
+        return len(self.birth_days)
+
+    def ages(self, today=None):
+        """Age of every person at death, or today for the living; -1 where the birthdate is unknown."""
+        today_day = (today or date.today()).toordinal() - EPOCH_ORDINAL
+        known = self.birth_days != NO_DAY
+        end_days = np.where(self.death_days != NO_DAY, self.death_days, today_day)
+        return np.where(known, whole_years(np.where(known, self.birth_days, 0), end_days), -1)
+
+    def count_over_age(self, age, today=None):
+        return int(np.count_nonzero(self.ages(today) > age))
+
+    def age_histogram(self, bin_width=10, living_only=False, today=None):
+        """Returns [(lower, upper, count)] over the known ages, bins of bin_width years."""
+        ages = self.ages(today)
+        mask = ages >= 0
+        if living_only:
+            mask &= self.death_days == NO_DAY
+        ages = ages[mask]
+        if not len(ages):
+            return []
+        edges = np.arange(0, ages.max() + bin_width + 1, bin_width)
+        counts, _ = np.histogram(ages, bins=edges)
+        return [(int(lower), int(lower + bin_width), int(count)) for lower, count in zip(edges[:-1], counts)]
+
+    def lifespan_percentiles_by_decade(self, percentiles=(10, 50, 90)):
+        """Returns {birth decade: {'count': n, percentile: years, ...}} for the deceased."""
+        deceased = (self.birth_days != NO_DAY) & (self.death_days != NO_DAY)
+        births, deaths = self.birth_days[deceased], self.death_days[deceased]
+        if not len(births):
+            return {}
+        lifespans = whole_years(births, deaths)
+        decades = _calendar(births)[0] // 10 * 10
+        order = np.argsort(decades, kind="stable")
+        decades, lifespans = decades[order], lifespans[order]
+        unique, starts = np.unique(decades, return_index=True)
+        result = {}
+        for decade, group in zip(unique, np.split(lifespans, starts[1:])):
+            values = np.percentile(group, percentiles)
+            result[int(decade)] = {"count": len(group), **{p: float(v) for p, v in zip(percentiles, values)}}
+        return result
+
+    def children_distribution(self):
+        """Returns {number of children: number of people} including people without children."""
+        counts = np.bincount(self.child_counts) if len(self.child_counts) else np.array([], dtype=np.int64)
+        return {children: int(people) for children, people in enumerate(counts) if people}
+
+    def top_parents(self, k=1):
+        """Returns [(name, number of children)] for the k parents with most children, plus everyone tied with the k-th."""
+        counts = self.child_counts
+        if k <= 0 or not len(counts) or counts.max() == 0:
+            return []
+        threshold = max(int(np.partition(counts, -min(k, len(counts)))[-min(k, len(counts))]), 1)
+        indices = np.flatnonzero(counts >= threshold)
+        indices = indices[np.argsort(-counts[indices], kind="stable")]
+        return [(self.name_of(int(index)), int(counts[index])) for index in indices]
+
+    def occupation_frequencies(self, limit=None):
+        """Returns [(occupation, count)] ordered by count, people without occupation left out."""
+        codes = self.occupation_codes[self.occupation_codes >= 0]
+        counts = np.bincount(codes, minlength=len(self.occupations))
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0][:limit]
+        return [(self.occupations[code], int(counts[code])) for code in order]
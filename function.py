@@ -1,16 +1,897 @@
-from neo4j import GraphDatabase
-import networkx as nx
-from datetime import date, datetime
-import matplotlib.pyplot as plt
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import date
 
 from neo4j import GraphDatabase, exceptions
 
+from instrumentation import MetricsRegistry, measured, run_query
+from kinship import ancestor_map, find_relationship
+from query_cache import QueryCache
+from traversal import chunks, walk_generations
+
+def _person(first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+    return {"first_name": first_name, "last_name": last_name, "birthdate": birthdate,
+            "occupation": occupation, "deathdate": deathdate, "description": description}
+
+def _married(person1_first_name, person1_last_name, person2_first_name, person2_last_name):
+    return {"person1_first_name": person1_first_name, "person1_last_name": person1_last_name,
+            "person2_first_name": person2_first_name, "person2_last_name": person2_last_name}
+
+def _child_of(child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
+    return {"child_first_name": child_first_name, "child_last_name": child_last_name,
+            "parent1_first_name": parent1_first_name, "parent1_last_name": parent1_last_name,
+            "parent2_first_name": parent2_first_name, "parent2_last_name": parent2_last_name}
+
+EXAMPLE_PEOPLE = [
+    _person("John", "Doe", date(1950, 7, 15), "Retired Engineer", description="Patriarch of the Doe family"),
+    _person("Jane", "Doe", date(1955, 9, 20), "Homemaker", description="Matriarch of the Doe family"),
+    _person("Mike", "Doe", date(1975, 3, 10), "Doctor", description="Eldest son of John and Jane Doe"),
+    _person("Sarah", "Doe", date(1978, 6, 25), "Lawyer", description="Daughter of John and Jane Doe"),
+    _person("Emily", "Doe", date(1980, 11, 5), "Teacher", description="Youngest daughter of John and Jane Doe"),
+    _person("Mark", "Smith", date(1988, 4, 12), "Architect", description="Son of Robert and Mary Smith"),
+    _person("Mary", "Smith", date(1990, 6, 20), "Nurse", description="Wife of Mark Smith"),
+    _person("Jacob", "Brown", date(1992, 9, 15), "Software Developer", description="Son of William and Emma Brown"),
+    _person("Emma", "Brown", date(1994, 11, 30), "Accountant", description="Wife of Jacob Brown"),
+    _person("Sophia", "Jones", date(1985, 3, 22), "Professor", description="Daughter of Peter and Susan Jones"),
+    _person("Peter", "Jones", date(1960, 8, 10), "Lawyer", description="Patriarch of the Jones family"),
+    _person("Susan", "Jones", date(1965, 11, 25), "Artist", description="Matriarch of the Jones family"),
+    _person("Olivia", "Williams", date(1993, 7, 18), "Veterinarian", description="Wife of Mike Doe"),
+    _person("Thomas", "Miller", date(1995, 12, 20), "Engineer", description="Husband of Sarah Doe"),
+    _person("Karl", "Washington", date(1888, 4, 12), "Entrepreneur", deathdate=date(1980, 5, 22), description="Root of the Washington family"),
+    _person("Linda", "Washington", date(1890, 6, 20), "Philanthropist", deathdate=date(1975, 4, 2), description="Root of the Washington family"),
+]
+
+EXAMPLE_MARRIAGES = [
+    _married("John", "Doe", "Jane", "Doe"),
+    _married("Mike", "Doe", "Olivia", "Williams"),
+    _married("Thomas", "Miller", "Sarah", "Doe"),
+    _married("Mark", "Smith", "Mary", "Smith"),
+    _married("Jacob", "Brown", "Emma", "Brown"),
+    _married("Peter", "Jones", "Susan", "Jones"),
+    _married("Karl", "Washington", "Linda", "Washington"),
+]
+
+EXAMPLE_CHILDREN = [
+    _child_of("Mike", "Doe", "John", "Doe", "Jane", "Doe"),
+    _child_of("Sarah", "Doe", "John", "Doe", "Jane", "Doe"),
+    _child_of("Emily", "Doe", "John", "Doe", "Jane", "Doe"),
+    _child_of("Mark", "Smith", "John", "Smith", "Susan", "Smith"),
+    _child_of("Mary", "Smith", "Peter", "Jones", "Susan", "Jones"),
+    _child_of("Jacob", "Brown", "Peter", "Jones", "Susan", "Jones"),
+    _child_of("Sophia", "Jones", "Peter", "Jones", "Susan", "Jones"),
+    _child_of("Susan", "Jones", "Karl", "Washington", "Linda", "Washington"),
+    _child_of("John", "Doe", "Karl", "Washington", "Linda", "Washington"),
+]
+
+SCHEMA_STATEMENTS = [
+    # Constraints
+    # People are identified by person_id; names no longer have to be unique.
+    "DROP CONSTRAINT constraint_unique_person_name IF EXISTS",
+    "CREATE CONSTRAINT constraint_unique_person_id IF NOT EXISTS FOR (p:Person) REQUIRE p.person_id IS UNIQUE",
+    "CREATE CONSTRAINT constraint_unique_sequence_name IF NOT EXISTS FOR (s:Sequence) REQUIRE s.name IS UNIQUE",
+    "CREATE CONSTRAINT constraint_for_person_person_id IF NOT EXISTS FOR (p:Person) REQUIRE p.person_id IS :: INTEGER",
+    "CREATE CONSTRAINT constraint_person_first_name_exists IF NOT EXISTS FOR (p:Person) REQUIRE p.first_name IS NOT NULL",
+    "CREATE CONSTRAINT constraint_person_last_name_exists IF NOT EXISTS FOR (p:Person) REQUIRE p.last_name IS NOT NULL",
+    "CREATE CONSTRAINT constraint_for_person_first_name IF NOT EXISTS FOR (p:Person) REQUIRE p.first_name IS :: STRING",
+    "CREATE CONSTRAINT constraint_for_person_last_name IF NOT EXISTS FOR (p:Person) REQUIRE p.last_name IS :: STRING",
+    "CREATE CONSTRAINT constraint_for_person_birthdate IF NOT EXISTS FOR (p:Person) REQUIRE p.birthdate IS :: DATE",
+    "CREATE CONSTRAINT constraint_for_person_occupation IF NOT EXISTS FOR (p:Person) REQUIRE p.occupation IS :: STRING",
+    "CREATE CONSTRAINT constraint_for_person_deathdate IF NOT EXISTS FOR (p:Person) REQUIRE p.deathdate IS :: DATE",
+
+    # Indexes
+    "CREATE INDEX index_for_person_first_name IF NOT EXISTS FOR (p:Person) ON (p.first_name)",
+    "CREATE INDEX index_for_person_last_name IF NOT EXISTS FOR (p:Person) ON (p.last_name)",
+    "CREATE INDEX index_for_person_birthdate IF NOT EXISTS FOR (p:Person) ON (p.birthdate)",
+    "CREATE INDEX index_for_person_occupation IF NOT EXISTS FOR (p:Person) ON (p.occupation)",
+    "CREATE INDEX index_for_person_deathdate IF NOT EXISTS FOR (p:Person) ON (p.deathdate)",
+    "CREATE INDEX index_for_person_description IF NOT EXISTS FOR (p:Person) ON (p.description)",
+    "CREATE INDEX index_for_person_last_first_name IF NOT EXISTS FOR (p:Person) ON (p.last_name, p.first_name)",
+    "CREATE INDEX index_for_person_generation IF NOT EXISTS FOR (p:Person) ON (p.generation)",
+    "CREATE INDEX index_for_person_child_count IF NOT EXISTS FOR (p:Person) ON (p.child_count)",
+    "CREATE INDEX index_for_person_descendant_count IF NOT EXISTS FOR (p:Person) ON (p.descendant_count)",
+    "CREATE FULLTEXT INDEX index_fulltext_person IF NOT EXISTS FOR (p:Person) ON EACH [p.first_name, p.last_name, p.occupation, p.description]",
+]
+
+# setup_schema only sends the statements above when the fingerprint stored in the
+# SchemaVersion node differs, so editing SCHEMA_STATEMENTS reapplies them on the next start.
+SCHEMA_FINGERPRINT = hashlib.sha256("\n".join(SCHEMA_STATEMENTS).encode("utf-8")).hexdigest()[:16]
+SCHEMA_VERSION_QUERY = "OPTIONAL MATCH (v:SchemaVersion) RETURN v.fingerprint AS fingerprint"
+SET_SCHEMA_VERSION_QUERY = (
+    "MERGE (v:SchemaVersion) "
+    "SET v.fingerprint = $fingerprint, v.applied_at = datetime()"
+)
+
+
+# Cypher statements shared by FamilyTreeApp and AsyncFamilyTreeApp.
+
+# Reserves $count consecutive person ids starting at first_id. The lock property makes
+# concurrent transactions wait for each other before they read s.next.
+ALLOCATE_PERSON_IDS = (
+    "MERGE (s:Sequence {name: 'person_id'}) ON CREATE SET s.next = 1 "
+    "SET s._lock = true "
+    "WITH s, s.next AS first_id "
+    "SET s.next = first_id + $count "
+    "REMOVE s._lock "
+    "WITH first_id "
+)
+
+# Every person stores derived properties, indexed for ranking and filtering:
+#   generation       longest CHILD_OF path up to someone without parents (they are 0)
+#   child_count      number of CHILD_OF relationships pointing at the person
+#   descendant_count number of distinct people with a CHILD_OF path to the person
+# The writes below keep them current; rebuild_derived_properties recomputes them.
+
+# Sets child_count of parent from its incoming CHILD_OF relationships.
+RECOUNT_CHILD_COUNT = "SET parent.child_count = COUNT { (parent)<-[:CHILD_OF]-(:Person) } "
+
+# The generation of d from its parents' generations.
+GENERATION_FROM_PARENTS = (
+    "reduce(g = -1, generation IN [(d)-[:CHILD_OF]->(parent:Person) | parent.generation] | "
+    "CASE WHEN generation > g THEN generation ELSE g END) + 1"
+)
+# Recomputes the generations of start and its descendants. Old generations are a valid
+# topological order (parents before children), and FOREACH sees its own earlier updates.
+UPDATE_SUBTREE_GENERATIONS = (
+    "MATCH (d:Person)-[:CHILD_OF*0..]->(start) "
+    "WITH DISTINCT d ORDER BY d.generation "
+    "WITH collect(d) AS subtree "
+    "FOREACH (d IN subtree | SET d.generation = " + GENERATION_FROM_PARENTS + ") "
+)
+# Unit subquery run after c got new parents (status 'created'); old_parents are the parents it had before.
+# The generations below c are only walked if c's own generation changes. People who were already
+# ancestors of c are unaffected. A new ancestor gains c and c's descendants: exactly one more when
+# c is a leaf (the usual case when loading a tree), otherwise it is recounted.
+DERIVED_AFTER_CHILD_OF = (
+    "CALL { WITH c, old_parents, status "
+    "WITH c, old_parents WHERE status = 'created' "
+    "MATCH (c)-[:CHILD_OF]->(parent:Person) "
+    + RECOUNT_CHILD_COUNT +
+    "WITH c, old_parents, collect(parent) AS new_parents, NOT EXISTS { (:Person)-[:CHILD_OF]->(c) } AS leaf "
+    "CALL { WITH c WITH c AS d WITH d WHERE d.generation <> " + GENERATION_FROM_PARENTS + " "
+    "WITH d AS start " + UPDATE_SUBTREE_GENERATIONS + "} "
+    "WITH old_parents, new_parents, leaf "
+    "UNWIND new_parents AS parent "
+    "MATCH (parent)-[:CHILD_OF*0..]->(a:Person) "
+    "WITH DISTINCT old_parents, leaf, a "
+    "WHERE NOT a IN old_parents AND NOT any(old IN old_parents WHERE EXISTS { (old)-[:CHILD_OF*1..]->(a) }) "
+    "CALL { WITH a, leaf WITH a WHERE NOT leaf "
+    "MATCH (d:Person)-[:CHILD_OF*1..]->(a) RETURN count(DISTINCT d) AS descendants } "
+    "SET a.descendant_count = CASE WHEN leaf THEN coalesce(a.descendant_count, 0) + 1 ELSE descendants END "
+    "} "
+)
+# Replaces DETACH DELETE p: updates the parents' child counts, the ancestors' descendant counts
+# (one less for a leaf, else recounted) and the generations below p.
+DETACH_DELETE_WITH_DERIVED = (
+    "CALL { WITH p MATCH (p)-[:CHILD_OF*1..]->(a:Person) RETURN collect(DISTINCT a) AS ancestors } "
+    "CALL { WITH p RETURN [(p)-[:CHILD_OF]->(parent:Person) | parent] AS parent_nodes, "
+    "[(child:Person)-[:CHILD_OF]->(p) | child] AS child_nodes } "
+    "DETACH DELETE p "
+    "CALL { WITH parent_nodes UNWIND parent_nodes AS parent " + RECOUNT_CHILD_COUNT + "} "
+    "CALL { WITH ancestors, child_nodes UNWIND ancestors AS a "
+    "CALL { WITH a, child_nodes WITH a WHERE size(child_nodes) > 0 "
+    "MATCH (d:Person)-[:CHILD_OF*1..]->(a) RETURN count(DISTINCT d) AS descendants } "
+    "SET a.descendant_count = CASE WHEN size(child_nodes) = 0 THEN a.descendant_count - 1 ELSE descendants END } "
+    "CALL { WITH child_nodes UNWIND child_nodes AS start " + UPDATE_SUBTREE_GENERATIONS + "} "
+)
+
+CREATE_PERSON_QUERY = (
+    ALLOCATE_PERSON_IDS +
+    "CREATE (p:Person {person_id: first_id, first_name: $first_name, last_name: $last_name, birthdate: $birthdate, "
+    "occupation: $occupation, deathdate: $deathdate, description: $description, "
+    "generation: 0, child_count: 0, descendant_count: 0}) "
+    "RETURN p.person_id AS person_id"
+)
+UPDATE_PERSON_QUERY = (
+    "MATCH (p:Person {first_name: $first_name, last_name: $last_name}) "
+    "SET p.birthdate = $birthdate, p.occupation = $occupation, "
+    "p.deathdate = $deathdate, p.description = $description"
+)
+# Deletes everyone with the name; returns each deleted person's parents and relationships.
+DELETE_PERSON_QUERY = (
+    "MATCH (p:Person {first_name: $first_name, last_name: $last_name}) "
+    "OPTIONAL MATCH (p)-[:CHILD_OF]->(parent:Person) "
+    "WITH p, collect(CASE WHEN parent IS NOT NULL THEN [parent.first_name, parent.last_name] END) AS parents "
+    "WITH p, parents, EXISTS { (p)<-[:CHILD_OF]-(:Person) } AS has_children, EXISTS { (p)-[:MARRIED]-(:Person) } AS married "
+    + DETACH_DELETE_WITH_DERIVED +
+    "RETURN parents, has_children, married"
+)
+DELETE_EVERYTHING_QUERY = "MATCH (n) DETACH DELETE n"
+FIND_PERSON_IDS_QUERY = (
+    "MATCH (p:Person {first_name: $first_name, last_name: $last_name}) "
+    "RETURN p.person_id AS person_id ORDER BY p.birthdate, p.person_id"
+)
+GET_PERSON_QUERY = (
+    "MATCH (p:Person {person_id: $person_id}) "
+    "RETURN p {.person_id, .first_name, .last_name, .birthdate, .occupation, .deathdate, .description, "
+    ".generation, .child_count, .descendant_count} AS person"
+)
+UPDATE_PERSON_BY_ID_QUERY = (
+    "MATCH (p:Person {person_id: $person_id}) "
+    "SET p.birthdate = $birthdate, p.occupation = $occupation, "
+    "p.deathdate = $deathdate, p.description = $description "
+    "RETURN p.person_id AS person_id"
+)
+DELETE_PERSON_BY_ID_QUERY = (
+    "MATCH (p:Person {person_id: $person_id}) "
+    "OPTIONAL MATCH (p)-[:CHILD_OF]->(parent:Person) "
+    "WITH p, collect(CASE WHEN parent IS NOT NULL THEN [parent.first_name, parent.last_name] END) AS parents "
+    "WITH p, p.first_name AS first_name, p.last_name AS last_name, parents, "
+    "EXISTS { (p)<-[:CHILD_OF]-(:Person) } AS has_children, EXISTS { (p)-[:MARRIED]-(:Person) } AS married "
+    + DETACH_DELETE_WITH_DERIVED +
+    "RETURN first_name, last_name, parents, has_children, married"
+)
+# Gives people created before person ids existed an id, at most $count per call.
+ASSIGN_PERSON_IDS_QUERY = (
+    "MATCH (p:Person) WHERE p.person_id IS NULL "
+    "WITH p LIMIT $count "
+    "WITH collect(p) AS people "
+    "WHERE size(people) > 0 "
+    "MERGE (s:Sequence {name: 'person_id'}) ON CREATE SET s.next = 1 "
+    "SET s._lock = true "
+    "WITH s, s.next AS first_id, people "
+    "SET s.next = first_id + size(people) "
+    "REMOVE s._lock "
+    "WITH first_id, people "
+    "UNWIND range(0, size(people) - 1) AS i "
+    "WITH people[i] AS p, first_id + i AS person_id "
+    "SET p.person_id = person_id "
+    "RETURN count(p) AS assigned"
+)
+
+PEOPLE_BATCH_QUERY = (
+    ALLOCATE_PERSON_IDS +
+    "UNWIND range(0, size($rows) - 1) AS i "
+    "WITH first_id + i AS person_id, $rows[i] AS row "
+    "CREATE (p:Person {person_id: person_id, first_name: row.first_name, last_name: row.last_name, birthdate: row.birthdate, "
+    "occupation: row.occupation, deathdate: row.deathdate, description: row.description, "
+    "generation: 0, child_count: 0, descendant_count: 0}) "
+    "RETURN person_id"
+)
+
+# Relationship writes check and create in one statement. The endpoints are locked (SET _lock)
+# before anything is read, so concurrent writers touching the same people run one after the
+# other and cannot both pass the checks. Every row reports a status instead of failing.
+# The single-row statements take $row, the batch statements $rows (one status per row, in order).
+
+MARRIAGE_BY_NAME_MATCH = (
+    "OPTIONAL MATCH (a:Person {first_name: row.person1_first_name, last_name: row.person1_last_name}) "
+    "WITH row, collect(a) AS first_matches "
+    "OPTIONAL MATCH (b:Person {first_name: row.person2_first_name, last_name: row.person2_last_name}) "
+    "WITH row, first_matches, collect(b) AS second_matches "
+    "WITH row, first_matches[0] AS p1, second_matches[0] AS p2, "
+    "size(first_matches) > 1 OR size(second_matches) > 1 AS ambiguous "
+)
+MARRIAGE_BY_ID_MATCH = (
+    "OPTIONAL MATCH (p1:Person {person_id: row.person1_id}) "
+    "OPTIONAL MATCH (p2:Person {person_id: row.person2_id}) "
+    "WITH row, p1, p2, false AS ambiguous "
+)
+MARRY = (
+    "SET p1._lock = true, p2._lock = true "
+    "WITH row, p1, p2, CASE "
+    "WHEN ambiguous THEN 'ambiguous' "
+    "WHEN p1 IS NULL OR p2 IS NULL THEN 'not_found' "
+    "WHEN p1 = p2 THEN 'same_person' "
+    "WHEN EXISTS { (p1)-[:MARRIED]-(p2) } THEN 'already_married' "
+    "WHEN EXISTS { (p1)-[:MARRIED]-() } OR EXISTS { (p2)-[:MARRIED]-() } THEN 'married_to_other' "
+    "ELSE 'created' END AS status "
+    "FOREACH (_ IN CASE WHEN status = 'created' THEN [1] ELSE [] END | "
+    "CREATE (p1)-[:MARRIED]->(p2), (p2)-[:MARRIED]->(p1)) "
+    "REMOVE p1._lock, p2._lock "
+    "RETURN status, CASE WHEN status = 'married_to_other' THEN "
+    "[(p1)-[:MARRIED]->(s:Person) | s.first_name + ' ' + s.last_name] + "
+    "[(p2)-[:MARRIED]->(s:Person) | s.first_name + ' ' + s.last_name] ELSE [] END AS spouses"
+)
+CHILD_OF_BY_NAME_MATCH = (
+    "OPTIONAL MATCH (a:Person {first_name: row.child_first_name, last_name: row.child_last_name}) "
+    "WITH row, collect(a) AS child_matches "
+    "OPTIONAL MATCH (b:Person {first_name: row.parent1_first_name, last_name: row.parent1_last_name}) "
+    "WITH row, child_matches, collect(b) AS parent1_matches "
+    "OPTIONAL MATCH (d:Person {first_name: row.parent2_first_name, last_name: row.parent2_last_name}) "
+    "WITH row, child_matches, parent1_matches, collect(d) AS parent2_matches "
+    "WITH row, child_matches[0] AS c, parent1_matches[0] AS p1, parent2_matches[0] AS p2, "
+    "size(child_matches) > 1 OR size(parent1_matches) > 1 OR size(parent2_matches) > 1 AS ambiguous "
+)
+CHILD_OF_BY_ID_MATCH = (
+    "OPTIONAL MATCH (c:Person {person_id: row.child_id}) "
+    "OPTIONAL MATCH (p1:Person {person_id: row.parent1_id}) "
+    "OPTIONAL MATCH (p2:Person {person_id: row.parent2_id}) "
+    "WITH row, c, p1, p2, false AS ambiguous "
+)
+# The bulk queries only keep child_count current per row; write_child_of_batch updates
+# generation and descendant_count once for the whole batch (see rebuild_derived_properties).
+RECOUNT_NEW_PARENTS = (
+    "CALL { WITH p1, p2, status WITH p1, p2 WHERE status = 'created' "
+    "UNWIND [p1, p2] AS parent " + RECOUNT_CHILD_COUNT + "} "
+)
+
+# Locking the child is enough: only the child's own CHILD_OF relationships are checked.
+def _add_parents(derived):
+    return (
+        "SET c._lock = true "
+        "WITH row, c, p1, p2, ambiguous, [(c)-[:CHILD_OF]->(parent:Person) | parent] AS old_parents "
+        "WITH row, c, p1, p2, old_parents, CASE "
+        "WHEN ambiguous THEN 'ambiguous' "
+        "WHEN c IS NULL OR p1 IS NULL OR p2 IS NULL THEN 'not_found' "
+        "WHEN c = p1 OR c = p2 OR p1 = p2 THEN 'same_person' "
+        "WHEN p1 IN old_parents AND p2 IN old_parents THEN 'already_exists' "
+        "WHEN any(parent IN old_parents WHERE parent <> p1 AND parent <> p2) THEN 'too_many_parents' "
+        "ELSE 'created' END AS status "
+        "FOREACH (_ IN CASE WHEN status = 'created' THEN [1] ELSE [] END | "
+        "MERGE (c)-[:CHILD_OF]->(p1) MERGE (c)-[:CHILD_OF]->(p2)) "
+        + derived +
+        "REMOVE c._lock "
+        "RETURN status, [c.first_name, c.last_name] AS child, "
+        "[[p1.first_name, p1.last_name], [p2.first_name, p2.last_name]] AS parents"
+    )
+
+def _single_row(match, body):
+    return "WITH $row AS row " + match + body
+
+def _per_row(match, body, columns):
+    # CALL runs once per row, so every row sees what the rows before it created.
+    return "UNWIND $rows AS row CALL { WITH row " + match + body + " } RETURN " + columns
+
+MARRIED_QUERY = _single_row(MARRIAGE_BY_NAME_MATCH, MARRY)
+MARRIED_BY_ID_QUERY = _single_row(MARRIAGE_BY_ID_MATCH, MARRY)
+MARRIED_BATCH_QUERY = _per_row(MARRIAGE_BY_NAME_MATCH, MARRY, "status, spouses")
+MARRIED_BY_ID_BATCH_QUERY = _per_row(MARRIAGE_BY_ID_MATCH, MARRY, "status, spouses")
+CHILD_OF_QUERY = _single_row(CHILD_OF_BY_NAME_MATCH, _add_parents(DERIVED_AFTER_CHILD_OF))
+CHILD_OF_BY_ID_QUERY = _single_row(CHILD_OF_BY_ID_MATCH, _add_parents(DERIVED_AFTER_CHILD_OF))
+CHILD_OF_BATCH_QUERY = _per_row(CHILD_OF_BY_NAME_MATCH, _add_parents(RECOUNT_NEW_PARENTS), "status, child, parents")
+CHILD_OF_BY_ID_BATCH_QUERY = _per_row(CHILD_OF_BY_ID_MATCH, _add_parents(RECOUNT_NEW_PARENTS), "status, child, parents")
+
+# Statuses after which the relationship exists.
+RELATIONSHIP_OK = ("created", "already_married", "already_exists")
+RELATIONSHIP_ERRORS = {
+    "ambiguous": "several people have one of these names, use the person ids",
+    "not_found": "one of the people does not exist",
+    "same_person": "the same person is given twice",
+    "married_to_other": "one of them is already married to {spouses}",
+    "too_many_parents": "the child already has other parents",
+}
+
+FAMILY_TREE_QUERY = (
+    "MATCH (p:Person)-[:CHILD_OF]->(parent:Person) "
+    "RETURN p.first_name + ' ' + p.last_name AS person1, parent.first_name + ' ' + parent.last_name AS person2, 'child' AS relationship "
+    "UNION "
+    "MATCH (p1:Person)-[:MARRIED]-(p2:Person) "
+    "RETURN p1.first_name + ' ' + p1.last_name AS person1, p2.first_name + ' ' + p2.last_name AS person2, 'married' AS relationship"
+)
+SEARCH_PEOPLE_QUERY = (
+    "CALL db.index.fulltext.queryNodes('index_fulltext_person', $lucene) YIELD node AS p, score "
+    "WHERE ($born_after IS NULL OR p.birthdate >= $born_after) "
+    "AND ($born_before IS NULL OR p.birthdate <= $born_before) "
+    "AND ($died_after IS NULL OR p.deathdate >= $died_after) "
+    "AND ($died_before IS NULL OR (p.deathdate <= $died_before AND p.deathdate <> date('0001-01-01'))) "
+    "AND ($after_score IS NULL OR score < $after_score OR (score = $after_score AND elementId(p) > $after_id)) "
+    "RETURN p.first_name AS first_name, p.last_name AS last_name, "
+    "p.birthdate AS birthdate, p.occupation AS occupation, "
+    "p.deathdate AS deathdate, p.description AS description, score, elementId(p) AS id "
+    "ORDER BY score DESC, id "
+    "LIMIT $limit"
+)
+# Index lookups on the materialized child_count / descendant_count / generation.
+MOST_CHILDREN_QUERY = (
+    "MATCH (top:Person) WHERE top.child_count > 0 "
+    "WITH top.child_count AS most ORDER BY most DESC LIMIT 1 "
+    "MATCH (parent:Person {child_count: most}) "
+    "RETURN parent.first_name + ' ' + parent.last_name AS person, parent.child_count AS num_children"
+)
+MOST_DESCENDANTS_QUERY = (
+    "MATCH (p:Person) WHERE p.descendant_count > 0 "
+    "RETURN p.first_name + ' ' + p.last_name AS person, p.descendant_count AS num_descendants "
+    "ORDER BY num_descendants DESC, person LIMIT $limit"
+)
+GENERATION_QUERY = (
+    "MATCH (p:Person {generation: $generation}) "
+    "RETURN p.first_name + ' ' + p.last_name AS person ORDER BY person"
+)
+
+# Full recomputation of the derived properties. CALL ... IN TRANSACTIONS needs auto-commit
+# transactions (session.run), so it works on trees of any size.
+MISSING_DERIVED_QUERY = "RETURN EXISTS { MATCH (p:Person) WHERE p.child_count IS NULL } AS missing"
+RESET_DERIVED_QUERY = (
+    "MATCH (p:Person) "
+    "CALL { WITH p SET p.child_count = COUNT { (p)<-[:CHILD_OF]-(:Person) }, p.generation = 0 } "
+    "IN TRANSACTIONS OF $batch_size ROWS"
+)
+# One relaxation round; repeated until nothing changes (at most the depth of the tree).
+GENERATION_ROUND_QUERY = (
+    "MATCH (d:Person) WHERE EXISTS { (d)-[:CHILD_OF]->(:Person) } "
+    "CALL { WITH d WITH d, " + GENERATION_FROM_PARENTS + " AS generation WHERE d.generation <> generation "
+    "SET d.generation = generation RETURN count(*) AS changed } "
+    "IN TRANSACTIONS OF $batch_size ROWS "
+    "RETURN sum(changed) AS changed"
+)
+DESCENDANT_COUNT_QUERY = (
+    "MATCH (a:Person) "
+    "CALL { WITH a OPTIONAL MATCH (d:Person)-[:CHILD_OF*1..]->(a) "
+    "WITH a, count(DISTINCT d) AS descendants SET a.descendant_count = descendants } "
+    "IN TRANSACTIONS OF $batch_size ROWS"
+)
+# One row of parallel lists for family_stats: dates as epoch days, missing values as null.
+POPULATION_COLUMNS_QUERY = (
+    "MATCH (p:Person) "
+    "RETURN collect(p.first_name + ' ' + p.last_name) AS names, "
+    "collect([duration.inDays(date('1970-01-01'), p.birthdate).days]) AS birth_days, "
+    "collect([duration.inDays(date('1970-01-01'), p.deathdate).days]) AS death_days, "
+    "collect([p.occupation]) AS occupations, "
+    "collect(coalesce(p.child_count, COUNT { (p)<-[:CHILD_OF]-() })) AS child_counts"
+)
+SIBLINGS_QUERY = (
+    "MATCH (person:Person {first_name: $first_name, last_name: $last_name}) "
+    "OPTIONAL MATCH (person)-[:CHILD_OF]->(parent:Person) "
+    "OPTIONAL MATCH (parent)<-[:CHILD_OF]-(sibling:Person) "
+    "WHERE (person.first_name <> sibling.first_name OR person.last_name <> sibling.last_name) "
+    "RETURN collect(DISTINCT CASE WHEN parent IS NOT NULL THEN [parent.first_name, parent.last_name] END) AS parents, "
+    "collect(DISTINCT sibling.first_name + ' ' + sibling.last_name) AS siblings"
+)
+COUNT_PEOPLE_QUERY = "MATCH (p:Person) RETURN count(p) AS num_people"
+
+# One hop along CHILD_OF for a whole generation; keys are [first_name, last_name] pairs.
+PARENTS_QUERY = (
+    "UNWIND $keys AS key "
+    "MATCH (c:Person {first_name: key[0], last_name: key[1]})-[:CHILD_OF]->(p:Person) "
+    "RETURN c.first_name AS from_first_name, c.last_name AS from_last_name, "
+    "p.first_name AS to_first_name, p.last_name AS to_last_name"
+)
+CHILDREN_QUERY = (
+    "UNWIND $keys AS key "
+    "MATCH (p:Person {first_name: key[0], last_name: key[1]})<-[:CHILD_OF]-(c:Person) "
+    "RETURN p.first_name AS from_first_name, p.last_name AS from_last_name, "
+    "c.first_name AS to_first_name, c.last_name AS to_last_name"
+)
+NEIGHBORHOOD_QUERY = (
+    "UNWIND $keys AS key "
+    "MATCH (p:Person {first_name: key[0], last_name: key[1]})-[r:CHILD_OF|MARRIED]->(o:Person) "
+    "RETURN p.first_name AS first_name, p.last_name AS last_name, type(r) AS type, "
+    "o.first_name AS other_first_name, o.last_name AS other_last_name"
+)
+SPOUSES_QUERY = (
+    "MATCH (:Person {first_name: $first_name, last_name: $last_name})-[:MARRIED]-(spouse:Person) "
+    "RETURN DISTINCT spouse.first_name AS first_name, spouse.last_name AS last_name"
+)
+# Outgoing CHILD_OF and MARRIED relationships per person as [type, other person_id], keyset-paged on person_id.
+EDGES_PAGE_QUERY = (
+    "MATCH (p:Person) WHERE p.person_id > $after "
+    "WITH p ORDER BY p.person_id LIMIT $page_size "
+    "RETURN p.person_id AS person_id, "
+    "[(p)-[r:CHILD_OF|MARRIED]->(o:Person) | [type(r), o.person_id]] AS edges"
+)
+# Raw relationships for the integrity check: neighbour ids per direction, duplicates included.
+INTEGRITY_PAGE_QUERY = (
+    "MATCH (p:Person) WHERE p.person_id > $after "
+    "WITH p ORDER BY p.person_id LIMIT $page_size "
+    "RETURN p.person_id AS person_id, p.birthdate AS birthdate, p.deathdate AS deathdate, "
+    "[(p)-[:CHILD_OF]->(parent:Person) | parent.person_id] AS parents, "
+    "[(p)-[:MARRIED]->(spouse:Person) | spouse.person_id] AS spouses_out, "
+    "[(p)<-[:MARRIED]-(spouse:Person) | spouse.person_id] AS spouses_in"
+)
+# Export pages (see export.py): a person with the ids of parents and spouses, and per child
+# [child id, id of the child's other parent or null], all in person_id order.
+EXPORT_COLUMNS = (
+    "RETURN p.person_id AS person_id, p.first_name AS first_name, p.last_name AS last_name, "
+    "p.birthdate AS birthdate, p.occupation AS occupation, p.deathdate AS deathdate, p.description AS description, "
+)
+OTHER_PARENT = "head([(c)-[:CHILD_OF]->(other:Person) WHERE other <> p | other.person_id])"
+EXPORT_PAGE_QUERY = (
+    "MATCH (p:Person) WHERE p.person_id > $after "
+    "WITH p ORDER BY p.person_id LIMIT $page_size "
+    + EXPORT_COLUMNS +
+    "[(p)-[:CHILD_OF]->(parent:Person) | parent.person_id] AS parents, "
+    "[(p)-[:MARRIED]->(spouse:Person) | spouse.person_id] AS spouses, "
+    "[(c:Person)-[:CHILD_OF]->(p) | [c.person_id, " + OTHER_PARENT + "]] AS children"
+)
+# The subtree of a person: the person, their descendants and everyone married to or having
+# children with one of them. References to people outside of it are left out, so the
+# partners appear without their parents and the root without its parents.
+SUBTREE_EXPORT_PAGE_QUERY = (
+    "MATCH (root:Person {person_id: $root_id}) "
+    "CALL { WITH root MATCH (p:Person)-[:CHILD_OF*0..]->(root) RETURN p "
+    "UNION WITH root MATCH (d:Person)-[:CHILD_OF*0..]->(root) MATCH (d)-[:MARRIED]-(p:Person) RETURN p "
+    "UNION WITH root MATCH (c:Person)-[:CHILD_OF*1..]->(root) MATCH (c)-[:CHILD_OF]->(p:Person) RETURN p } "
+    "WITH root, p WHERE p.person_id > $after "
+    "WITH root, p ORDER BY p.person_id LIMIT $page_size "
+    "WITH root, p, EXISTS { (p)-[:CHILD_OF*0..]->(root) } AS inside "
+    + EXPORT_COLUMNS +
+    "CASE WHEN inside AND p <> root THEN [(p)-[:CHILD_OF]->(parent:Person) | parent.person_id] ELSE [] END AS parents, "
+    "[(p)-[:MARRIED]->(spouse:Person) WHERE inside OR EXISTS { (spouse)-[:CHILD_OF*0..]->(root) } | spouse.person_id] AS spouses, "
+    "[(c:Person)-[:CHILD_OF]->(p) WHERE inside OR EXISTS { (c)-[:CHILD_OF*1..]->(root) } | [c.person_id, " + OTHER_PARENT + "]] AS children"
+)
+# Keeps one of identical relationships; parents that lost duplicate CHILD_OF relationships are recounted.
+REMOVE_DUPLICATE_EDGES_QUERY = (
+    "UNWIND $person_ids AS person_id "
+    "MATCH (p:Person {person_id: person_id})-[r:CHILD_OF|MARRIED]->(other:Person) "
+    "WITH p, type(r) AS relationship, other, collect(r) AS relationships "
+    "WHERE size(relationships) > 1 "
+    "FOREACH (r IN tail(relationships) | DELETE r) "
+    "WITH relationship, other, size(relationships) - 1 AS duplicates "
+    "CALL { WITH relationship, other WITH other AS parent WHERE relationship = 'CHILD_OF' " + RECOUNT_CHILD_COUNT + "} "
+    "RETURN coalesce(sum(duplicates), 0) AS removed"
+)
+# Counts only the relationships it creates: pairs already repaired (or listed twice) are skipped.
+ADD_REVERSE_MARRIED_QUERY = (
+    "UNWIND $pairs AS pair "
+    "MATCH (p:Person {person_id: pair[0]}), (spouse:Person {person_id: pair[1]}) "
+    "MERGE (spouse)-[r:MARRIED]->(p) ON CREATE SET r._created = true "
+    "WITH r, r._created IS NOT NULL AS created "
+    "REMOVE r._created "
+    "RETURN count(DISTINCT CASE WHEN created THEN r END) AS added"
+)
+TRAVERSAL_CHUNK_SIZE = 1000
+ANCESTOR_CACHE_SIZE = 1024
+
+# deathdate of the living; NULL cannot be indexed for range queries.
+ALIVE = date(1, 1, 1)
+PERSON_PROPERTIES = ("person_id", "first_name", "last_name", "birthdate", "occupation", "deathdate", "description")
+
+# Age in whole calendar years at death, or today for the living (deathdate 0001-01-01).
+PERSON_AGE_FILTER = (
+    "WITH p, duration.between(p.birthdate, CASE WHEN p.deathdate IS NULL OR p.deathdate = date('0001-01-01') "
+    "THEN $today ELSE p.deathdate END).years AS age "
+    "WHERE age > $age "
+)
+
+PEOPLE_OVER_AGE_QUERY = (
+    "MATCH (p:Person) WHERE p.birthdate <= $cutoff "
+    + PERSON_AGE_FILTER +
+    "RETURN p.first_name AS first_name, p.last_name AS last_name, age"
+)
+COUNT_PEOPLE_OVER_AGE_QUERY = (
+    "MATCH (p:Person) WHERE p.birthdate <= $cutoff "
+    + PERSON_AGE_FILTER +
+    "RETURN count(p) AS num_people"
+)
+
+# Names the shared queries in MetricsRegistry output.
+QUERY_NAMES = {query: name for name, query in list(globals().items()) if name.endswith("_QUERY")}
+QUERY_NAMES.update({statement: "SCHEMA_STATEMENTS" for statement in SCHEMA_STATEMENTS})
+
+
+def birthdate_cutoff(today, age):
+    """Latest birthdate of anyone older than age, used as an index range bound."""
+    try:
+        return today.replace(year=today.year - age - 1)
+    except ValueError:  # 29 February
+        return today.replace(year=today.year - age - 1, day=28)
+
+
+LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+def lucene_query(query_string, prefix=True, fuzzy=False):
+    """Builds a full-text query that requires every word, exact matches ranking highest."""
+    clauses = []
+    for word in query_string.lower().split():
+        word = LUCENE_SPECIAL_CHARACTERS.sub(r"\\\1", word)
+        alternatives = [f"{word}^2"]
+        if prefix:
+            alternatives.append(f"{word}*")
+        if fuzzy:
+            alternatives.append(f"{word}~")
+        clauses.append("(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(clauses)
+
+
+def people_page_queries(properties):
+    """Returns the first-page and next-page keyset queries projecting the given properties."""
+    unknown = set(properties) - set(PERSON_PROPERTIES)
+    if unknown:
+        raise ValueError(f"Unknown person properties: {', '.join(sorted(unknown))}")
+    projection = ", ".join(f".{name}" for name in dict.fromkeys(("last_name", "first_name", "person_id") + tuple(properties)))
+
+    # person_id breaks ties between people with the same name.
+    first_page_query = (
+        "MATCH (p:Person) WHERE p.last_name IS NOT NULL "
+        f"RETURN p {{{projection}}} AS person "
+        "ORDER BY p.last_name, p.first_name, p.person_id LIMIT $page_size"
+    )
+    next_page_query = (
+        "MATCH (p:Person) WHERE p.last_name >= $last_name "
+        "AND (p.last_name > $last_name OR p.first_name > $first_name "
+        "OR (p.first_name = $first_name AND p.person_id > $person_id)) "
+        f"RETURN p {{{projection}}} AS person "
+        "ORDER BY p.last_name, p.first_name, p.person_id LIMIT $page_size"
+    )
+    return first_page_query, next_page_query
+
+def person_rows(people):
+    """Fills in the optional person properties for PEOPLE_BATCH_QUERY."""
+    rows = []
+    for person in people:
+        row = dict(person)
+        row.setdefault("description", None)
+        if not row.get("deathdate"):
+            row["deathdate"] = ALIVE
+        rows.append(row)
+    return rows
+
+def check_relationship(record):
+    """Raises ValueError for a relationship write that did not end with the relationship in place."""
+    status = record['status']
+    if status not in RELATIONSHIP_OK:
+        raise ValueError(RELATIONSHIP_ERRORS[status].format(spouses=", ".join(record.get('spouses') or [])))
+    return record
+
+def most_children(records):
+    persons_with_most_children = []
+    max_children = 0
+    for record in records:
+        person = record['person']
+        num_children = record['num_children']
+        
+        if num_children > max_children:
+            max_children = num_children
+            persons_with_most_children = [(person, num_children)]
+        elif num_children == max_children:
+            persons_with_most_children.append((person, num_children))
+    
+    return persons_with_most_children
+
+
+def neighborhood_edges(nodes, found):
+    """Adds spouses to nodes and keeps the relationships between included people."""
+    edges = set()
+    for source, relationship, target in found:
+        if relationship == "MARRIED":
+            nodes.setdefault(target, nodes[source])
+            edges.add((min(source, target), max(source, target), "married"))
+    for source, relationship, target in found:
+        if relationship == "CHILD_OF" and target in nodes:
+            edges.add((source, target, "child"))
+    return nodes, sorted(edges)
+
+
+# Record shaping shared with AsyncFamilyTreeApp; records may be driver records or their data() dicts.
+
+def key_pairs(records):
+    """(from, to) name keys of PARENTS_QUERY or CHILDREN_QUERY records, as expected by walk_generations."""
+    return [((record['from_first_name'], record['from_last_name']), (record['to_first_name'], record['to_last_name']))
+            for record in records]
+
+def name_keys(records):
+    return [(record['first_name'], record['last_name']) for record in records]
+
+def neighborhood_rows(records):
+    return [((record['first_name'], record['last_name']), record['type'],
+             (record['other_first_name'], record['other_last_name'])) for record in records]
+
+def person_edges(person_id, edges):
+    """Yields the EDGES_PAGE_QUERY edges of one person, a marriage only from the smaller id."""
+    for relationship, other_id in edges:
+        if relationship == 'CHILD_OF' or person_id < other_id:
+            yield relationship, person_id, other_id
+
+def population_columns(record):
+    return {
+        "names": record['names'],
+        "birth_days": [value[0] for value in record['birth_days']],
+        "death_days": [value[0] for value in record['death_days']],
+        "occupations": [value[0] for value in record['occupations']],
+        "child_counts": record['child_counts'],
+    }
+
+def relationship_result(found):
+    """The get_relationship dict for a kinship.find_relationship result."""
+    if not found:
+        return None
+    label, path, common = found
+    return {
+        "relationship": label,
+        "path": [f"{first} {last}" for first, last in path],
+        "common_ancestors": [f"{first} {last}" for first, last in common],
+    }
+
+
+# Write statements as (query, parameters, read): read turns the result rows (as dicts) into
+# the value of the transaction function. AsyncFamilyTreeApp runs the same statements.
+
+def _ignore(rows):
+    return None
+
+def _first_row(rows):
+    return rows[0] if rows else None
+
+def _checked_relationship(rows):
+    return check_relationship(rows[0])
+
+def create_person_statement(first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+    parameters = _person(first_name, last_name, birthdate, occupation, deathdate or ALIVE, description)
+    return CREATE_PERSON_QUERY, dict(parameters, count=1), lambda rows: rows[0]['person_id']
+
+def update_person_statement(first_name, last_name, birthdate=None, occupation=None, deathdate=None, description=None):
+    return UPDATE_PERSON_QUERY, _person(first_name, last_name, birthdate, occupation, deathdate or ALIVE, description), _ignore
+
+def delete_person_statement(first_name, last_name):
+    return DELETE_PERSON_QUERY, {"first_name": first_name, "last_name": last_name}, list
+
+def update_person_by_id_statement(person_id, birthdate=None, occupation=None, deathdate=None, description=None):
+    def read(rows):
+        if not rows:
+            raise ValueError(f"No person with id {person_id}")
+    parameters = {"person_id": person_id, "birthdate": birthdate, "occupation": occupation,
+                  "deathdate": deathdate or ALIVE, "description": description}
+    return UPDATE_PERSON_BY_ID_QUERY, parameters, read
+
+def delete_person_by_id_statement(person_id):
+    return DELETE_PERSON_BY_ID_QUERY, {"person_id": person_id}, _first_row
+
+def married_statement(person1_first_name, person1_last_name, person2_first_name, person2_last_name):
+    row = _married(person1_first_name, person1_last_name, person2_first_name, person2_last_name)
+    return MARRIED_QUERY, {"row": row}, _checked_relationship
+
+def child_of_statement(child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
+    row = _child_of(child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name)
+    return CHILD_OF_QUERY, {"row": row}, _checked_relationship
+
+def married_by_id_statement(person1_id, person2_id):
+    return MARRIED_BY_ID_QUERY, {"row": {"person1_id": person1_id, "person2_id": person2_id}}, _checked_relationship
+
+def child_of_by_id_statement(child_id, parent1_id, parent2_id):
+    row = {"child_id": child_id, "parent1_id": parent1_id, "parent2_id": parent2_id}
+    return CHILD_OF_BY_ID_QUERY, {"row": row}, _checked_relationship
+
+def assign_person_ids_statement(count):
+    return ASSIGN_PERSON_IDS_QUERY, {"count": count}, lambda rows: rows[0]['assigned']
+
+def delete_everything_statement():
+    return DELETE_EVERYTHING_QUERY, {}, _ignore
+
+
+# Transaction functions. They receive a managed transaction as first argument, so the
+# same statement can run on its own or as one step of a UnitOfWork.
+
+def _run_statements(tx, statements):
+    for statement in statements:
+        run_query(tx, statement).consume()
+
+def _run_query(tx, query, parameters):
+    run_query(tx, query, parameters).consume()
+
+def _fetch_query(tx, query, parameters):
+    return [record.data() for record in run_query(tx, query, parameters)]
+
+def _execute(tx, query, parameters, read):
+    return read(_fetch_query(tx, query, parameters))
+
+def _create_person(tx, *person):
+    return _execute(tx, *create_person_statement(*person))
+
+def _update_person(tx, *person):
+    return _execute(tx, *update_person_statement(*person))
+
+def _delete_person(tx, first_name, last_name):
+    return _execute(tx, *delete_person_statement(first_name, last_name))
+
+def _update_person_by_id(tx, person_id, *properties):
+    return _execute(tx, *update_person_by_id_statement(person_id, *properties))
+
+def _delete_person_by_id(tx, person_id):
+    return _execute(tx, *delete_person_by_id_statement(person_id))
+
+def _add_married_relationship_by_id(tx, person1_id, person2_id):
+    return _execute(tx, *married_by_id_statement(person1_id, person2_id))
+
+def _add_child_of_relationship_by_id(tx, child_id, parent1_id, parent2_id):
+    return _execute(tx, *child_of_by_id_statement(child_id, parent1_id, parent2_id))
+
+def _assign_person_ids(tx, count):
+    return _execute(tx, *assign_person_ids_statement(count))
+
+def _delete_everything(tx):
+    return _execute(tx, *delete_everything_statement())
+
+def _add_married_relationship(tx, *names):
+    return _execute(tx, *married_statement(*names))
+
+def _add_child_of_relationship(tx, *names):
+    return _execute(tx, *child_of_statement(*names))
+
+def _apply_operations(tx, operations):
+    return [work(tx, *args) for work, args in operations]
+
+
+class UnitOfWork:
+    """Collects writes and commits them together in one managed write transaction.
+
+    Used as a context manager: the operations are sent when the block exits without
+    an exception, transient errors are retried by the driver, and a failing step
+    rolls back every other step of the block. Errors are raised, not printed.
+    """
+
+    def __init__(self, driver, on_commit=None, metrics=None):
+        self.driver = driver
+        self.on_commit = on_commit
+        self.metrics = metrics
+        self._operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._operations = []
+        return False
+
+    def __len__(self):
+        return len(self._operations)
+
+    def create_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+        self._operations.append((_create_person, (first_name, last_name, birthdate, occupation, deathdate, description)))
+
+    def update_person(self, first_name, last_name, birthdate=None, occupation=None, deathdate=None, description=None):
+        self._operations.append((_update_person, (first_name, last_name, birthdate, occupation, deathdate, description)))
+
+    def delete_person(self, first_name, last_name):
+        self._operations.append((_delete_person, (first_name, last_name)))
+
+    def deleteEverything(self):
+        self._operations.append((_delete_everything, ()))
+
+    def add_married_relationship(self, person1_first_name, person1_last_name, person2_first_name, person2_last_name):
+        self._operations.append((_add_married_relationship, (person1_first_name, person1_last_name,
+                                                             person2_first_name, person2_last_name)))
+
+    def add_child_of_relationship(self, child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
+        self._operations.append((_add_child_of_relationship, (child_first_name, child_last_name, parent1_first_name,
+                                                              parent1_last_name, parent2_first_name, parent2_last_name)))
+
+    def update_person_by_id(self, person_id, birthdate=None, occupation=None, deathdate=None, description=None):
+        self._operations.append((_update_person_by_id, (person_id, birthdate, occupation, deathdate, description)))
+
+    def delete_person_by_id(self, person_id):
+        self._operations.append((_delete_person_by_id, (person_id,)))
+
+    def add_married_relationship_by_id(self, person1_id, person2_id):
+        self._operations.append((_add_married_relationship_by_id, (person1_id, person2_id)))
+
+    def add_child_of_relationship_by_id(self, child_id, parent1_id, parent2_id):
+        self._operations.append((_add_child_of_relationship_by_id, (child_id, parent1_id, parent2_id)))
+
+    def run(self, query, **parameters):
+        self._operations.append((_run_query, (query, parameters)))
+
+    def commit(self):
+        """Sends the collected operations; returns what each of them returned, in order."""
+        operations, self._operations = self._operations, []
+        if not operations:
+            return []
+        with self.driver.session() as session:
+            if self.metrics is None:
+                results = session.execute_write(_apply_operations, operations)
+            else:
+                with self.metrics.operation("unit_of_work"):
+                    results = session.execute_write(_apply_operations, operations)
+        if self.on_commit:
+            self.on_commit(operations, results)
+        return results
+
+
 class FamilyTreeApp:
 
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, cache_size=None, cache_ttl=None, metrics=None):
+        self._ancestor_cache = OrderedDict()
+        self.cache = None
+        self.metrics = metrics
+        self.connected = False
+        # Seconds spent per startup phase, see main.py.
+        self.startup_timings = {}
+        if cache_size:
+            self.enable_cache(cache_size, cache_ttl)
         try:
+            start = time.perf_counter()
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            self.driver.verify_connectivity()
+            self.connected = True
+            self.startup_timings["connect"] = time.perf_counter() - start
+
+            start = time.perf_counter()
             self.setup_schema()
+            self.startup_timings["schema"] = time.perf_counter() - start
         except exceptions.AuthError as e:
             print(f"Authentication failed: {e}")
         except exceptions.ServiceUnavailable as e:
@@ -24,160 +905,258 @@ class FamilyTreeApp:
         except Exception as e:
             print(f"Failed to close the database connection: {e}")
 
-    def setup_schema(self):
+    def enable_cache(self, max_entries=1024, ttl=None):
+        """Caches the hot read methods; ttl is in seconds, None keeps entries until a write invalidates them."""
+        self.cache = QueryCache(max_entries, ttl)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+
+    def enable_metrics(self, slow_query_ms=None, profile_sample_rate=0.0):
+        """Starts recording every query in a MetricsRegistry (self.metrics) and returns it."""
+        self.metrics = MetricsRegistry(slow_query_ms, profile_sample_rate, query_names=QUERY_NAMES)
+        return self.metrics
+
+    def _cached(self, key, load, tags):
+        # Read-through: tags is a tuple or a function of the loaded value.
+        if self.cache is None:
+            return load()
+        hit, value = self.cache.get(key)
+        if not hit:
+            value = load()
+            self.cache.put(key, value, tags(value) if callable(tags) else tags)
+        return value
+
+    def _invalidate(self, *tags):
+        if self.cache is not None:
+            self.cache.invalidate(*tags)
+
+    def _invalidate_child_of(self, child_key, parent_keys):
+        self._forget_ancestors(child_key)
+        self._invalidate("child_of", ("parents_of", child_key), *(("children_of", key) for key in parent_keys))
+
+    def _invalidate_deleted(self, key, deleted_rows):
+        """Invalidates after deleting everyone named key, given one DELETE_PERSON_QUERY row per deleted person."""
+        self._forget_ancestors(key)
+        if not deleted_rows:
+            return
+        tags = ["people", ("parents_of", key), ("children_of", key)]
+        for deleted in deleted_rows:
+            tags.extend(("children_of", tuple(parent)) for parent in deleted['parents'])
+            if deleted['parents'] or deleted['has_children']:
+                tags.append("child_of")
+            if deleted['married']:
+                tags.append("married")
+        self._invalidate(*dict.fromkeys(tags))
+
+    @measured
+    def setup_schema(self, force=False):
+        """Creates constraints and indexes unless the stored fingerprint says they are current. Returns True if DDL ran."""
         try:
             with self.driver.session() as session:
-                # Constraints
-                session.run("CREATE CONSTRAINT constraint_unique_person_name IF NOT EXISTS FOR (p:Person) REQUIRE (p.first_name, p.last_name) IS NODE KEY")
-                session.run("CREATE CONSTRAINT constraint_for_person_first_name IF NOT EXISTS FOR (p:Person) REQUIRE p.first_name IS :: STRING")
-                session.run("CREATE CONSTRAINT constraint_for_person_last_name IF NOT EXISTS FOR (p:Person) REQUIRE p.last_name IS :: STRING")
-                session.run("CREATE CONSTRAINT constraint_for_person_birthdate IF NOT EXISTS FOR (p:Person) REQUIRE p.birthdate IS :: DATE")
-                session.run("CREATE CONSTRAINT constraint_for_person_occupation IF NOT EXISTS FOR (p:Person) REQUIRE p.occupation IS :: STRING")
-                session.run("CREATE CONSTRAINT constraint_for_person_deathdate IF NOT EXISTS FOR (p:Person) REQUIRE p.deathdate IS :: DATE")
-
-                # Indexes
-                session.run("CREATE INDEX index_for_person_first_name IF NOT EXISTS FOR (p:Person) ON (p.first_name)")
-                session.run("CREATE INDEX index_for_person_last_name IF NOT EXISTS FOR (p:Person) ON (p.last_name)")
-                session.run("CREATE INDEX index_for_person_birthdate IF NOT EXISTS FOR (p:Person) ON (p.birthdate)")
-                session.run("CREATE INDEX index_for_person_occupation IF NOT EXISTS FOR (p:Person) ON (p.occupation)")
-                session.run("CREATE INDEX index_for_person_deathdate IF NOT EXISTS FOR (p:Person) ON (p.deathdate)")
-                session.run("CREATE INDEX index_for_person_description IF NOT EXISTS FOR (p:Person) ON (p.description)")
+                if not force:
+                    record = run_query(session, SCHEMA_VERSION_QUERY).single()
+                    if record and record['fingerprint'] == SCHEMA_FINGERPRINT:
+                        return False
+                session.execute_write(_run_statements, SCHEMA_STATEMENTS)
+            # Ids and derived properties for people stored before they existed; only needed when the schema changed.
+            self.assign_person_ids()
+            with self.driver.session() as session:
+                missing = run_query(session, MISSING_DERIVED_QUERY).single()['missing']
+            if missing:
+                self.rebuild_derived_properties()
+            with self.driver.session() as session:
+                session.execute_write(_run_query, SET_SCHEMA_VERSION_QUERY, {"fingerprint": SCHEMA_FINGERPRINT})
+            return True
         except Exception as e:
             print(f"Error setting up schema: {e}")
 
+    @measured
+    def assign_person_ids(self, batch_size=10000):
+        """Gives every person without a person_id (data from before ids existed) a new id. Returns how many."""
+        assigned = 0
+        while True:
+            with self.driver.session() as session:
+                count = session.execute_write(_assign_person_ids, batch_size)
+            assigned += count
+            if count < batch_size:
+                return assigned
+
 
+    @measured
     def insert_example_data(self):
         try:
             # Create people with example data
-            self.create_person("John", "Doe", datetime.strptime("1950-07-15", "%Y-%m-%d").date(), "Retired Engineer", description="Patriarch of the Doe family")
-            self.create_person("Jane", "Doe", datetime.strptime("1955-09-20", "%Y-%m-%d").date(), "Homemaker", description="Matriarch of the Doe family")
-            self.create_person("Mike", "Doe", datetime.strptime("1975-03-10", "%Y-%m-%d").date(), "Doctor", description="Eldest son of John and Jane Doe")
-            self.create_person("Sarah", "Doe", datetime.strptime("1978-06-25", "%Y-%m-%d").date(), "Lawyer", description="Daughter of John and Jane Doe")
-            self.create_person("Emily", "Doe", datetime.strptime("1980-11-05", "%Y-%m-%d").date(), "Teacher", description="Youngest daughter of John and Jane Doe")
-            self.create_person("Mark", "Smith", datetime.strptime("1988-04-12", "%Y-%m-%d").date(), "Architect", description="Son of Robert and Mary Smith")
-            self.create_person("Mary", "Smith", datetime.strptime("1990-06-20", "%Y-%m-%d").date(), "Nurse", description="Wife of Mark Smith")
-            self.create_person("Jacob", "Brown", datetime.strptime("1992-09-15", "%Y-%m-%d").date(), "Software Developer", description="Son of William and Emma Brown")
-            self.create_person("Emma", "Brown", datetime.strptime("1994-11-30", "%Y-%m-%d").date(), "Accountant", description="Wife of Jacob Brown")
-            self.create_person("Sophia", "Jones", datetime.strptime("1985-03-22", "%Y-%m-%d").date(), "Professor", description="Daughter of Peter and Susan Jones")
-            self.create_person("Peter", "Jones", datetime.strptime("1960-08-10", "%Y-%m-%d").date(), "Lawyer", description="Patriarch of the Jones family")
-            self.create_person("Susan", "Jones", datetime.strptime("1965-11-25", "%Y-%m-%d").date(), "Artist", description="Matriarch of the Jones family")
-            self.create_person("Olivia", "Williams", datetime.strptime("1993-07-18", "%Y-%m-%d").date(), "Veterinarian", description="Wife of Mike Doe")
-            self.create_person("Thomas", "Miller", datetime.strptime("1995-12-20", "%Y-%m-%d").date(), "Engineer", description="Husband of Sarah Doe")
-            self.create_person("Karl", "Washington", datetime.strptime("1888-04-12", "%Y-%m-%d").date(), "Entrepreneur", deathdate=datetime.strptime("1980-05-22", "%Y-%m-%d").date(), description="Root of the Washington family")
-            self.create_person("Linda", "Washington", datetime.strptime("1890-06-20", "%Y-%m-%d").date(), "Philanthropist", deathdate=datetime.strptime("1975-04-02", "%Y-%m-%d").date(), description="Root of the Washington family")
+            self.write_people_batch(EXAMPLE_PEOPLE)
 
             # Establish relationships
-            self.add_married_relationship("John", "Doe", "Jane", "Doe")
-            self.add_married_relationship("Mike", "Doe", "Olivia", "Williams")
-            self.add_married_relationship("Thomas", "Miller", "Sarah", "Doe")
-            self.add_married_relationship("Mark", "Smith", "Mary", "Smith")
-            self.add_married_relationship("Jacob", "Brown", "Emma", "Brown")
-            self.add_married_relationship("Peter", "Jones", "Susan", "Jones")
-            self.add_married_relationship("Karl", "Washington", "Linda", "Washington")
-
-            self.add_child_of_relationship("Mike", "Doe", "John", "Doe", "Jane", "Doe")
-            self.add_child_of_relationship("Sarah", "Doe", "John", "Doe", "Jane", "Doe")
-            self.add_child_of_relationship("Emily", "Doe", "John", "Doe", "Jane", "Doe")
-            self.add_child_of_relationship("Mark", "Smith", "John", "Smith", "Susan", "Smith")
-            self.add_child_of_relationship("Mary", "Smith", "Peter", "Jones", "Susan", "Jones")
-            self.add_child_of_relationship("Jacob", "Brown", "Peter", "Jones", "Susan", "Jones")
-            self.add_child_of_relationship("Sophia", "Jones", "Peter", "Jones", "Susan", "Jones")
-            self.add_child_of_relationship("Susan", "Jones", "Karl", "Washington", "Linda", "Washington")
-            self.add_child_of_relationship("John", "Doe", "Karl", "Washington", "Linda", "Washington")
+            self.write_married_batch(EXAMPLE_MARRIAGES)
+            self.write_child_of_batch(EXAMPLE_CHILDREN)
         except Exception as e:
             print(f"Failed to insert example data: {e}")
 
+    @measured
     def get_all_people(self):
+        for person in self.iter_people():
+            print(f"{person['first_name']} {person['last_name']} - "
+                  f"{person['birthdate']} - {person['occupation']} - "
+                  f"{person['deathdate']} - {person['description']}")
+
+    @measured
+    def iter_people(self, properties=PERSON_PROPERTIES, page_size=500):
+        """Yields people as dicts of the requested properties, ordered by last and first name.
+
+        Pages are fetched by keyset on (last_name, first_name, person_id), each in its own
+        short session, so at most page_size people are held at once.
+        """
+        first_page_query, next_page_query = people_page_queries(properties)
         try:
-            with self.driver.session() as session:
-                query = "MATCH (p:Person) RETURN p"
-                result = session.run(query)
-                for record in result:
-                    print(f"{record['p']['first_name']} {record['p']['last_name']} - "
-                          f"{record['p']['birthdate']} - {record['p']['occupation']} - "
-                          f"{record['p']['deathdate']} - {record['p']['description']}")
+            last = None
+            while True:
+                with self.driver.session() as session:
+                    if last is None:
+                        result = run_query(session, first_page_query, page_size=page_size)
+                    else:
+                        result = run_query(session, next_page_query, last_name=last[0], first_name=last[1], person_id=last[2],
+                                           page_size=page_size)
+                    page = [record['person'] for record in result]
+
+                for person in page:
+                    yield {name: person[name] for name in properties}
+                if len(page) < page_size:
+                    return
+                last = (page[-1]['last_name'], page[-1]['first_name'], page[-1]['person_id'])
+
         except Exception as e:
             print(f"Error retrieving people: {e}")
 
 
-    def create_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+    @measured
+    def iter_edges(self, page_size=500):
+        """Yields ('CHILD_OF', child, parent) and ('MARRIED', person, spouse) as person_id pairs.
+
+        Every relationship is yielded once (a marriage from the smaller id).
+        Pages of page_size people are fetched by keyset on person_id.
+        """
         try:
-            if not deathdate:
-                deathdate = datetime(1, 1, 1).date()
+            after = -1
+            while True:
+                with self.driver.session() as session:
+                    result = run_query(session, EDGES_PAGE_QUERY, after=after, page_size=page_size)
+                    page = [(record['person_id'], record['edges']) for record in result]
 
+                for person_id, edges in page:
+                    yield from person_edges(person_id, edges)
+                if len(page) < page_size:
+                    return
+                after = page[-1][0]
+
+        except Exception as e:
+            print(f"Error retrieving relationships: {e}")
+
+    @measured
+    def iter_integrity_rows(self, page_size=5000):
+        """Yields every person in person_id order with the ids of their CHILD_OF parents and of the
+        MARRIED relationships going out and coming in, duplicates included (see integrity.py)."""
+        after = -1
+        while True:
+            with self.driver.session() as session:
+                page = [record.data() for record in
+                        run_query(session, INTEGRITY_PAGE_QUERY, after=after, page_size=page_size)]
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]['person_id']
+
+    def iter_export_rows(self, root_id=None, page_size=5000):
+        """Yields the people of the whole tree, or of the subtree of root_id, for export.py in person_id order.
+
+        Rows hold the person properties, the ids of parents and spouses and the children
+        as [child_id, other_parent_id] pairs; every page is its own query.
+        """
+        query = EXPORT_PAGE_QUERY if root_id is None else SUBTREE_EXPORT_PAGE_QUERY
+        after = -1
+        while True:
+            with self.driver.session() as session:
+                page = [record.data() for record in
+                        run_query(session, query, root_id=root_id, after=after, page_size=page_size)]
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]['person_id']
+
+    # Integrity repairs, batched like the bulk writes below; they raise on failure.
+
+    @measured
+    def remove_duplicate_edges(self, person_ids):
+        """Keeps one of several identical CHILD_OF or MARRIED relationships going out of these people. Returns how many were removed."""
+        with self.driver.session() as session:
+            removed = session.execute_write(_fetch_query, REMOVE_DUPLICATE_EDGES_QUERY, {"person_ids": list(person_ids)})
+        self._invalidate("child_of", "married", "siblings")
+        return removed[0]['removed']
+
+    @measured
+    def add_reverse_married_edges(self, pairs):
+        """Adds spouse -> person for each (person_id, spouse_id) pair that only has person -> spouse."""
+        with self.driver.session() as session:
+            added = session.execute_write(_fetch_query, ADD_REVERSE_MARRIED_QUERY, {"pairs": [list(pair) for pair in pairs]})
+        self._invalidate("married")
+        return added[0]['added']
+
+    @measured
+    def create_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+        try:
             with self.driver.session() as session:
-                query = (
-                    "CREATE (p:Person {first_name: $first_name, last_name: $last_name, birthdate: $birthdate, "
-                    "occupation: $occupation, deathdate: $deathdate, description: $description})"
-                )
-                session.run(query, first_name=first_name, last_name=last_name, birthdate=birthdate,
-                            occupation=occupation, deathdate=deathdate, description=description)
+                person_id = session.execute_write(_create_person, first_name, last_name, birthdate, occupation, deathdate, description)
+            self._invalidate("people")
+            return person_id
         
         except Exception as e:
             print(f"Error creating person {first_name} {last_name}: {e}")
 
+    @measured
     def update_person(self, first_name, last_name, birthdate=None, occupation=None, deathdate=None, description=None):
         try:
-            if not deathdate:
-                deathdate = datetime(1, 1, 1).date()
-
             with self.driver.session() as session:
-                query = (
-                    "MATCH (p:Person {first_name: $first_name, last_name: $last_name}) "
-                    "SET p.birthdate = $birthdate, p.occupation = $occupation, "
-                    "p.deathdate = $deathdate, p.description = $description"
-                )
-                session.run(query, first_name=first_name, last_name=last_name, birthdate=birthdate,
-                            occupation=occupation, deathdate=deathdate, description=description)
+                session.execute_write(_update_person, first_name, last_name, birthdate, occupation, deathdate, description)
         
         except Exception as e:
             print(f"Error updating person {first_name} {last_name}: {e}")
 
+    @measured
     def delete_person(self, first_name, last_name):
         try:
             with self.driver.session() as session:
-                query = "MATCH (p:Person {first_name: $first_name, last_name: $last_name}) DETACH DELETE p"
-                session.run(query, first_name=first_name, last_name=last_name)
+                deleted = session.execute_write(_delete_person, first_name, last_name)
+            self._invalidate_deleted((first_name, last_name), deleted)
         
         except Exception as e:
             print(f"Error deleting person {first_name} {last_name}: {e}")
 
+    @measured
     def deleteEverything(self):
         try:
             with self.driver.session() as session:
-                query = "MATCH (n) DETACH DELETE n"
-                session.run(query)
+                session.execute_write(_delete_everything)
+            self._ancestor_cache.clear()
+            if self.cache is not None:
+                self.cache.clear()
         
         except Exception as e:
             print(f"Error deleting everything: {e}")
 
+    # The relationship writes return the status of the write: 'created', or 'already_married' /
+    # 'already_exists' when the relationship was there before (nothing is written twice).
+
+    @measured
     def add_married_relationship(self, person1_first_name, person1_last_name, person2_first_name, person2_last_name):
         try:
             with self.driver.session() as session:
-                check_query = (
-                    "MATCH (p:Person)-[:MARRIED]-(spouse:Person) "
-                    "WHERE (p.first_name = $person1_first_name AND p.last_name = $person1_last_name) "
-                    "OR (p.first_name = $person2_first_name AND p.last_name = $person2_last_name) "
-                    "RETURN p.first_name AS first_name, p.last_name AS last_name, "
-                    "collect(spouse.first_name + ' ' + spouse.last_name) AS spouses"
-                )
-                result = session.run(check_query, person1_first_name=person1_first_name,
-                                    person1_last_name=person1_last_name, person2_first_name=person2_first_name,
-                                    person2_last_name=person2_last_name)
-                marriage_status = result.single()
-
-                if marriage_status:
-                    for person in marriage_status.items():
-                        if person in [(person1_first_name, person1_last_name), (person2_first_name, person2_last_name)] and marriage_status['spouses']:
-                            raise ValueError(f"{person1_first_name} {person1_last_name} or {person2_first_name} {person2_last_name} is already married to {', '.join(marriage_status['spouses'])}")
-
-                query = (
-                    "MATCH (p1:Person {first_name: $person1_first_name, last_name: $person1_last_name}), "
-                    "(p2:Person {first_name: $person2_first_name, last_name: $person2_last_name}) "
-                    "CREATE (p1)-[:MARRIED]->(p2), (p2)-[:MARRIED]->(p1)"
-                )
-                session.run(query, person1_first_name=person1_first_name, person1_last_name=person1_last_name,
-                            person2_first_name=person2_first_name, person2_last_name=person2_last_name)
+                record = session.execute_write(_add_married_relationship, person1_first_name, person1_last_name,
+                                               person2_first_name, person2_last_name)
+            if record['status'] == 'created':
+                self._invalidate("married")
+            return record['status']
 
         except ValueError as ve:
             print(f"Error adding married relationship: {ve}")
@@ -185,160 +1164,449 @@ class FamilyTreeApp:
             print(f"Error adding married relationship: {e}")
 
 
+    @measured
     def add_child_of_relationship(self, child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
         try:
             with self.driver.session() as session:
-                query = (
-                    "MATCH (c:Person {first_name: $child_first_name, last_name: $child_last_name}), "
-                    "(p1:Person {first_name: $parent1_first_name, last_name: $parent1_last_name}), "
-                    "(p2:Person {first_name: $parent2_first_name, last_name: $parent2_last_name}) "
-                    "CREATE (c)-[:CHILD_OF]->(p1), (c)-[:CHILD_OF]->(p2)"
-                )
-                session.run(query, child_first_name=child_first_name, child_last_name=child_last_name,
-                            parent1_first_name=parent1_first_name, parent1_last_name=parent1_last_name,
-                            parent2_first_name=parent2_first_name, parent2_last_name=parent2_last_name)
+                record = session.execute_write(_add_child_of_relationship, child_first_name, child_last_name,
+                                               parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name)
+            if record['status'] == 'created':
+                self._invalidate_child_of((child_first_name, child_last_name),
+                                          [(parent1_first_name, parent1_last_name), (parent2_first_name, parent2_last_name)])
+            return record['status']
 
         except Exception as e:
             print(f"Error adding child-of relationship: {e}")
 
+    # Addressing people by person_id: one unique-index seek per person instead of a name match.
 
-    def get_family_tree(self):
+    @measured
+    def find_person_ids(self, first_name, last_name):
+        """Returns the ids of everyone with this name, oldest first."""
+        try:
+            with self.driver.session() as session:
+                result = run_query(session, FIND_PERSON_IDS_QUERY, first_name=first_name, last_name=last_name)
+                return [record['person_id'] for record in result]
+        except Exception as e:
+            print(f"Error looking up {first_name} {last_name}: {e}")
+            return []
+
+    @measured
+    def get_person(self, person_id):
         try:
             with self.driver.session() as session:
-                query = (
-                    "MATCH (p:Person)-[:CHILD_OF]->(parent:Person) "
-                    "RETURN p.first_name + ' ' + p.last_name AS person1, parent.first_name + ' ' + parent.last_name AS person2, 'child' AS relationship "
-                    "UNION "
-                    "MATCH (p1:Person)-[:MARRIED]-(p2:Person) "
-                    "RETURN p1.first_name + ' ' + p1.last_name AS person1, p2.first_name + ' ' + p2.last_name AS person2, 'married' AS relationship"
-                )
-                result = session.run(query)
-                return list(result)
+                record = run_query(session, GET_PERSON_QUERY, person_id=person_id).single()
+                return dict(record['person']) if record else None
+        except Exception as e:
+            print(f"Error getting person {person_id}: {e}")
+            return None
+
+    @measured
+    def update_person_by_id(self, person_id, birthdate=None, occupation=None, deathdate=None, description=None):
+        try:
+            with self.driver.session() as session:
+                session.execute_write(_update_person_by_id, person_id, birthdate, occupation, deathdate, description)
+
+        except Exception as e:
+            print(f"Error updating person {person_id}: {e}")
+
+    @measured
+    def delete_person_by_id(self, person_id):
+        try:
+            with self.driver.session() as session:
+                deleted = session.execute_write(_delete_person_by_id, person_id)
+            if deleted is not None:
+                self._invalidate_deleted((deleted['first_name'], deleted['last_name']), [deleted])
+
+        except Exception as e:
+            print(f"Error deleting person {person_id}: {e}")
+
+    @measured
+    def add_married_relationship_by_id(self, person1_id, person2_id):
+        try:
+            with self.driver.session() as session:
+                record = session.execute_write(_add_married_relationship_by_id, person1_id, person2_id)
+            if record['status'] == 'created':
+                self._invalidate("married")
+            return record['status']
+
+        except Exception as e:
+            print(f"Error adding married relationship: {e}")
+
+    @measured
+    def add_child_of_relationship_by_id(self, child_id, parent1_id, parent2_id):
+        try:
+            with self.driver.session() as session:
+                record = session.execute_write(_add_child_of_relationship_by_id, child_id, parent1_id, parent2_id)
+            if record['status'] == 'created':
+                self._invalidate_child_of(tuple(record['child']), [tuple(parent) for parent in record['parents']])
+            return record['status']
+
+        except Exception as e:
+            print(f"Error adding child-of relationship: {e}")
+
+    def unit_of_work(self):
+        """Returns a context manager that commits all collected writes in one transaction."""
+        return UnitOfWork(self.driver, on_commit=self._after_unit_of_work, metrics=self.metrics)
+
+    def _after_unit_of_work(self, operations, results):
+        for (work, args), result in zip(operations, results):
+            if work is _create_person:
+                self._invalidate("people")
+            elif work in (_add_married_relationship, _add_married_relationship_by_id):
+                self._invalidate("married")
+            elif work is _add_child_of_relationship:
+                self._invalidate_child_of((args[0], args[1]), [(args[2], args[3]), (args[4], args[5])])
+            elif work is _add_child_of_relationship_by_id:
+                self._invalidate_child_of(tuple(result['child']), [tuple(parent) for parent in result['parents']])
+            elif work is _delete_person_by_id:
+                if result is not None:
+                    self._invalidate_deleted((result['first_name'], result['last_name']), [result])
+            elif work is _delete_person:
+                self._invalidate_deleted((args[0], args[1]), result)
+            elif work in (_delete_everything, _run_query):
+                self._ancestor_cache.clear()
+                if self.cache is not None:
+                    self.cache.clear()
+
+
+    # Bulk writes: one UNWIND statement per batch in a single write transaction.
+    # These raise on failure so callers (see importer.py) know what was not committed.
+
+    @measured
+    def write_people_batch(self, people):
+        """Returns the new person ids, in the order of the rows."""
+        rows = person_rows(people)
+        with self.driver.session() as session:
+            results = session.execute_write(_fetch_query, PEOPLE_BATCH_QUERY, {"rows": rows, "count": len(rows)})
+        self._invalidate("people")
+        return [result["person_id"] for result in results]
+
+    # The relationship batches return one status per row (see add_married_relationship); rows that
+    # cannot be written are reported by their status instead of failing the batch.
+
+    @measured
+    def write_married_batch(self, marriages):
+        """Rows name both people (person1_first_name, ...) or give their ids (person1_id, person2_id)."""
+        rows = list(marriages)
+        query = MARRIED_BY_ID_BATCH_QUERY if rows and "person1_id" in rows[0] else MARRIED_BATCH_QUERY
+        with self.driver.session() as session:
+            results = session.execute_write(_fetch_query, query, {"rows": rows})
+        statuses = [result["status"] for result in results]
+        if "created" in statuses:
+            self._invalidate("married")
+        return statuses
+
+    @measured
+    def write_child_of_batch(self, children, update_derived=True):
+        """Rows name child and parents (child_first_name, ...) or give their ids (child_id, parent1_id, parent2_id).
+
+        child_count is kept current per row; generation and descendant_count are recomputed once
+        after the batch. Bulk loads pass update_derived=False and call rebuild_derived_properties()
+        after their last batch instead.
+        """
+        rows = list(children)
+        query = CHILD_OF_BY_ID_BATCH_QUERY if rows and "child_id" in rows[0] else CHILD_OF_BATCH_QUERY
+        with self.driver.session() as session:
+            results = session.execute_write(_fetch_query, query, {"rows": rows})
+        statuses = [result["status"] for result in results]
+        for result in results:
+            if result["status"] == "created":
+                self._invalidate_child_of(tuple(result["child"]), [tuple(parent) for parent in result["parents"]])
+        if update_derived and "created" in statuses:
+            self.rebuild_derived_properties()
+        return statuses
+
+
+    @measured
+    def get_family_tree(self):
+        try:
+            return list(self._cached(("get_family_tree",), self._get_family_tree, ("child_of", "married")))
         
         except Exception as e:
             print(f"Error fetching family tree: {e}")
             return []
+
+    def _get_family_tree(self):
+        with self.driver.session() as session:
+            result = run_query(session, FAMILY_TREE_QUERY)
+            return list(result)
         
-    def search_people(self, query_string):
+    @measured
+    def search_people(self, query_string, **options):
+        """Returns every match ranked by relevance, see search_people_page for the options."""
+        results = []
+        cursor = None
+        while True:
+            page, cursor = self.search_people_page(query_string, cursor=cursor, **options)
+            results.extend(page)
+            if cursor is None:
+                return results
+
+    @measured
+    def search_people_page(self, query_string, limit=50, cursor=None, prefix=True, fuzzy=False,
+                           born_after=None, born_before=None, died_after=None, died_before=None):
+        """Searches names, occupation and description through the full-text index.
+
+        Returns one page of rows ordered by relevance and the cursor for the next
+        page (None on the last page). Date arguments restrict the results to a
+        birthdate or deathdate range.
+        """
         try:
+            lucene = lucene_query(query_string, prefix=prefix, fuzzy=fuzzy)
+            if not lucene:
+                return [], None
+            after_score, after_id = cursor if cursor else (None, None)
+
             with self.driver.session() as session:
-                query = (
-                    "MATCH (p:Person) WHERE p.description CONTAINS $query_string "
-                    "OR p.first_name CONTAINS $query_string "
-                    "OR p.last_name CONTAINS $query_string "
-                    "OR p.birthdate CONTAINS $query_string "
-                    "OR p.occupation CONTAINS $query_string "
-                    "OR p.deathdate CONTAINS $query_string "
-                    "RETURN p.first_name AS first_name, p.last_name AS last_name, "
-                    "p.birthdate AS birthdate, p.occupation AS occupation, "
-                    "p.deathdate AS deathdate, p.description AS description"
-                )
-                result = session.run(query, query_string=query_string)
-                return list(result)
+                result = run_query(session, SEARCH_PEOPLE_QUERY, lucene=lucene, born_after=born_after, born_before=born_before,
+                                     died_after=died_after, died_before=died_before,
+                                     after_score=after_score, after_id=after_id, limit=limit)
+                page = list(result)
+
+            next_cursor = (page[-1]['score'], page[-1]['id']) if len(page) == limit else None
+            return page, next_cursor
         
         except Exception as e:
             print(f"Error searching people: {e}")
-            return []
+            return [], None
 
+    @measured
     def list_and_count_people_over_age(self, age):
         try:
             age = int(age)  # Convert age input to integer
-            
-            today = date.today()
-            with self.driver.session() as session:
-                query = "MATCH (p:Person) RETURN p.first_name AS first_name, p.last_name AS last_name, p.birthdate AS birthdate, p.deathdate AS deathdate"
-                result = session.run(query)
-                
-                people_over_age = []
-                for record in result:
-                    birthdate = record['birthdate']
-                    if birthdate:
-                        birthdate = date(birthdate.year, birthdate.month, birthdate.day) 
-                    else:
-                        continue 
-                    
-                    deathdate = record['deathdate']
-                    if deathdate and deathdate != date(1, 1, 1):
-                        deathdate = date(deathdate.year, deathdate.month, deathdate.day)
-                    else:
-                        deathdate = today
-                    
-                    age_at_death_or_today = (deathdate - birthdate).days // 365
-                    if age_at_death_or_today > age:
-                        people_over_age.append(f"{record['first_name']} {record['last_name']} {age_at_death_or_today} years old")
-                
-                return len(people_over_age), people_over_age
-        
+            return self.count_people_over_age(age), self.iter_people_over_age(age)
+
         except Exception as e:
             print(f"Error listing and counting people over age {age}: {e}")
             return 0, []
 
-    def get_persons_with_most_children(self):
+    @measured
+    def count_people_over_age(self, age):
+        today = date.today()
+        with self.driver.session() as session:
+            record = run_query(session, COUNT_PEOPLE_OVER_AGE_QUERY, cutoff=birthdate_cutoff(today, age), today=today, age=age).single()
+            return record['num_people'] if record else 0
+
+    @measured
+    def iter_people_over_age(self, age):
+        """Lazily yields '<name> <age> years old' for everyone older than age."""
+        today = date.today()
         try:
             with self.driver.session() as session:
-                query = (
-                    "MATCH (child:Person)-[:CHILD_OF]->(parent:Person) "
-                    "WITH parent, count(child) AS num_children "
-                    "ORDER BY num_children DESC "
-                    "RETURN parent.first_name + ' ' + parent.last_name AS person, num_children "
-                )
-                result = session.run(query)
-                
-                persons_with_most_children = []
-                max_children = 0
+                result = run_query(session, PEOPLE_OVER_AGE_QUERY, cutoff=birthdate_cutoff(today, age), today=today, age=age)
                 for record in result:
-                    person = record['person']
-                    num_children = record['num_children']
-                    
-                    if num_children > max_children:
-                        max_children = num_children
-                        persons_with_most_children = [(person, num_children)]
-                    elif num_children == max_children:
-                        persons_with_most_children.append((person, num_children))
-                
-                return persons_with_most_children
+                    yield f"{record['first_name']} {record['last_name']} {record['age']} years old"
+
+        except Exception as e:
+            print(f"Error listing people over age {age}: {e}")
+
+    @measured
+    def get_persons_with_most_children(self):
+        try:
+            return list(self._cached(("get_persons_with_most_children",), self._get_persons_with_most_children, ("child_of",)))
         
         except Exception as e:
             print(f"Error getting persons with most children: {e}")
             return []
 
-    def get_siblings(self, first_name, last_name):
+    def _get_persons_with_most_children(self):
+        with self.driver.session() as session:
+            result = run_query(session, MOST_CHILDREN_QUERY)
+            return most_children(result)
+
+    @measured
+    def get_persons_with_most_descendants(self, limit=10):
+        """Returns (name, descendant count) of the limit people with the most descendants."""
         try:
             with self.driver.session() as session:
-                query = (
-                    "MATCH (person:Person {first_name: $first_name, last_name: $last_name})-[:CHILD_OF]->(parent:Person)<-[:CHILD_OF]-(sibling:Person) "
-                    "WHERE (person.first_name <> sibling.first_name OR person.last_name <> sibling.last_name) "
-                    "RETURN DISTINCT sibling.first_name + ' ' + sibling.last_name AS sibling_name"
-                )
-                result = session.run(query, first_name=first_name, last_name=last_name)
-                
-                siblings = []
-                for record in result:
-                    siblings.append(record['sibling_name'])
-                
-                return siblings
+                result = run_query(session, MOST_DESCENDANTS_QUERY, limit=limit)
+                return [(record['person'], record['num_descendants']) for record in result]
+        except Exception as e:
+            print(f"Error getting persons with most descendants: {e}")
+            return []
+
+    @measured
+    def get_people_of_generation(self, generation):
+        """Returns the names of the people whose generation (0 = no known parents) is generation."""
+        try:
+            with self.driver.session() as session:
+                result = run_query(session, GENERATION_QUERY, generation=generation)
+                return [record['person'] for record in result]
+        except Exception as e:
+            print(f"Error getting people of generation {generation}: {e}")
+            return []
+
+    @measured
+    def rebuild_derived_properties(self, batch_size=10000, max_rounds=1000):
+        """Recomputes generation, child_count and descendant_count of every person. Returns the generation rounds.
+
+        Only needed for data written without them (e.g. directly with Cypher); the app's own writes keep them current.
+        """
+        with self.driver.session() as session:
+            run_query(session, RESET_DERIVED_QUERY, batch_size=batch_size).consume()
+            for rounds in range(1, max_rounds + 1):
+                if not run_query(session, GENERATION_ROUND_QUERY, batch_size=batch_size).single()['changed']:
+                    break
+            else:
+                raise ValueError(f"Generations did not settle after {max_rounds} rounds, check for CHILD_OF cycles (integrity.py)")
+            run_query(session, DESCENDANT_COUNT_QUERY, batch_size=batch_size).consume()
+        self._ancestor_cache.clear()
+        if self.cache is not None:
+            self.cache.clear()
+        return rounds
+
+    @measured
+    def get_population_columns(self):
+        """Fetches names, epoch-day birth and death dates, occupations and child counts of everyone in one query.
+
+        Returns a dict of equally long lists (missing dates and occupations as None).
+        """
+        try:
+            with self.driver.session() as session:
+                record = run_query(session, POPULATION_COLUMNS_QUERY).single()
+            return population_columns(record)
+        except Exception as e:
+            print(f"Error fetching population statistics: {e}")
+            return None
+
+    @measured
+    def get_siblings(self, first_name, last_name):
+        try:
+            key = (first_name, last_name)
+            # Tagged with the person's parents, so only child-of writes touching them invalidate it.
+            tags = lambda value: ["siblings", ("parents_of", key)] + [("children_of", parent) for parent in value[0]]
+            parents, siblings = self._cached(("get_siblings", key), lambda: self._get_siblings(first_name, last_name), tags)
+            return list(siblings)
         
         except Exception as e:
             print(f"Error getting siblings for {first_name} {last_name}: {e}")
             return []
 
-    def count_people(self):
+    def _get_siblings(self, first_name, last_name):
+        with self.driver.session() as session:
+            record = run_query(session, SIBLINGS_QUERY, first_name=first_name, last_name=last_name).single()
+            if not record:
+                return [], []
+            return [tuple(parent) for parent in record['parents']], record['siblings']
+
+    @measured
+    def iter_ancestors(self, first_name, last_name, max_generations=None):
+        """Yields (generation, [(first_name, last_name), ...]), parents being generation 1."""
+        return self._iter_generations(first_name, last_name, max_generations, PARENTS_QUERY, "ancestors")
+
+    @measured
+    def iter_descendants(self, first_name, last_name, max_generations=None):
+        """Yields (generation, [(first_name, last_name), ...]), children being generation 1."""
+        return self._iter_generations(first_name, last_name, max_generations, CHILDREN_QUERY, "descendants")
+
+    def _iter_generations(self, first_name, last_name, max_generations, query, kind):
         try:
+            for generation, found in walk_generations([(first_name, last_name)], self._expander(query), max_generations):
+                yield generation, [key for key, _ in found]
+
+        except Exception as e:
+            print(f"Error getting {kind} of {first_name} {last_name}: {e}")
+
+    def _expander(self, query):
+        def expand(frontier):
+            pairs = []
             with self.driver.session() as session:
-                query = "MATCH (p:Person) RETURN count(p) AS num_people"
-                result = session.run(query)
-                record = result.single()
-                if record:
-                    return record['num_people']
-                else:
-                    return 0
+                for keys in chunks(frontier, TRAVERSAL_CHUNK_SIZE):
+                    pairs.extend(key_pairs(run_query(session, query, keys=keys)))
+            return pairs
+        return expand
+
+    @measured
+    def get_neighborhood(self, first_name, last_name, generations_up=2, generations_down=2):
+        """Returns the people around a person and the relationships between them.
+
+        The result is ({(first_name, last_name): generation}, [(from, to, 'child' | 'married')])
+        with generations relative to the person (ancestors negative) and
+        spouses placed on their partner's generation.
+        """
+        nodes = {(first_name, last_name): 0}
+        for generation, people in self.iter_ancestors(first_name, last_name, generations_up):
+            for key in people:
+                nodes.setdefault(key, -generation)
+        for generation, people in self.iter_descendants(first_name, last_name, generations_down):
+            for key in people:
+                nodes.setdefault(key, generation)
+
+        found = []
+        try:
+            with self.driver.session() as session:
+                for keys in chunks(list(nodes), TRAVERSAL_CHUNK_SIZE):
+                    found.extend(neighborhood_rows(run_query(session, NEIGHBORHOOD_QUERY, keys=keys)))
+
+        except Exception as e:
+            print(f"Error getting relationships around {first_name} {last_name}: {e}")
+
+        return neighborhood_edges(nodes, found)
+
+    @measured
+    def get_relationship(self, first_name1, last_name1, first_name2, last_name2):
+        """Describes what the second person is to the first.
+
+        Returns a dict with the kinship 'relationship' label, the connecting
+        'path' and the lowest 'common_ancestors', or None if they are not related.
+        """
+        try:
+            found = find_relationship((first_name1, last_name1), (first_name2, last_name2), self._ancestors, self._spouses)
+            return relationship_result(found)
+
+        except Exception as e:
+            print(f"Error getting relationship between {first_name1} {last_name1} and {first_name2} {last_name2}: {e}")
+            return None
+
+    def _ancestors(self, key):
+        # LRU cache of ancestor sets, invalidated by the writes that can change them.
+        ancestors = self._ancestor_cache.get(key)
+        if ancestors is None:
+            ancestors = ancestor_map(key, self._expander(PARENTS_QUERY))
+            self._ancestor_cache[key] = ancestors
+            if len(self._ancestor_cache) > ANCESTOR_CACHE_SIZE:
+                self._ancestor_cache.popitem(last=False)
+        else:
+            self._ancestor_cache.move_to_end(key)
+        return ancestors
+
+    def _forget_ancestors(self, *keys):
+        """Drops every cached ancestor set that contains one of the given people."""
+        keys = set(keys)
+        stale = [cached for cached, ancestors in self._ancestor_cache.items() if not keys.isdisjoint(ancestors)]
+        for cached in stale:
+            del self._ancestor_cache[cached]
+
+    def _spouses(self, key):
+        with self.driver.session() as session:
+            return name_keys(run_query(session, SPOUSES_QUERY, first_name=key[0], last_name=key[1]))
+
+    @measured
+    def count_people(self):
+        try:
+            return self._cached(("count_people",), self._count_people, ("people",))
         
         except Exception as e:
             print(f"Error counting people: {e}")
             return 0
 
+    def _count_people(self):
+        with self.driver.session() as session:
+            result = run_query(session, COUNT_PEOPLE_QUERY)
+            record = result.single()
+            if record:
+                return record['num_people']
+            else:
+                return 0
+
 
 def visualize_family_tree(tree_data):
+    # The plotting stack takes longer to import than the rest of the app together,
+    # so it is only loaded when a tree is actually shown.
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     try:
         G = nx.Graph()
 
@@ -355,17 +1623,3 @@ def visualize_family_tree(tree_data):
     
     except Exception as e:
         print(f"Error visualizing family tree: {e}")
-
-def test_connection(connection_string, username, password):
-    if not connection_string or not username or not password:
-        raise ValueError("One or more environment variables are missing.")
-
-    driver = GraphDatabase.driver(connection_string, auth=(username, password))
-    try:
-        with driver.session() as session:
-            result = session.run("RETURN 1")
-            print("Connection successful: ", result.single()[0])
-    except Exception as e:
-        print("Connection failed: ", e)
-    finally:
-        driver.close()
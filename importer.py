@@ -0,0 +1,181 @@
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from dotenv import load_dotenv
+
+from function import RELATIONSHIP_OK, FamilyTreeApp
+
+PEOPLE = "people"
+MARRIED = "married"
+CHILD_OF = "child_of"
+
+
+def read_records(path):
+    """Streams the rows of a CSV or JSON-Lines file as dictionaries."""
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_date(value):
+    """Converts 'YYYY-MM-DD' strings to dates, empty values to None."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _prepare_person(record):
+    return {
+        "first_name": record["first_name"],
+        "last_name": record["last_name"],
+        "birthdate": parse_date(record.get("birthdate")),
+        "occupation": record.get("occupation") or None,
+        "deathdate": parse_date(record.get("deathdate")),
+        "description": record.get("description") or None,
+    }
+
+
+def _prepare_relationship(record):
+    # CSV values are strings; person ids must be integers to match person_id.
+    row = dict(record)
+    for key, value in row.items():
+        if key.endswith("_id") and value not in (None, ""):
+            row[key] = int(value)
+    return row
+
+
+class BulkImporter:
+    """Loads people and relationships in batches and resumes after failures.
+
+    The number of committed records per file is kept in a JSON checkpoint file,
+    so a rerun after an error skips everything that was already written.
+    """
+
+    def __init__(self, app, batch_size=1000, checkpoint_path=None, report=print):
+        self.app = app
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.report = report
+        self._writers = {
+            PEOPLE: (app.write_people_batch, _prepare_person),
+            MARRIED: (app.write_married_batch, _prepare_relationship),
+            # Generations and descendant counts are rebuilt once after the last batch, not per batch.
+            CHILD_OF: (lambda rows: app.write_child_of_batch(rows, update_derived=False), _prepare_relationship),
+        }
+
+    def import_people(self, path):
+        return self.import_file(PEOPLE, path)
+
+    def import_married(self, path):
+        return self.import_file(MARRIED, path)
+
+    def import_child_of(self, path):
+        return self.import_file(CHILD_OF, path)
+
+    def import_file(self, kind, path):
+        return self.import_records(kind, read_records(path), checkpoint_key=f"{kind}:{os.path.abspath(path)}")
+
+    def import_records(self, kind, records, checkpoint_key=None):
+        """Writes records of one kind batch by batch. Returns False if a batch failed."""
+        write_batch, prepare = self._writers[kind]
+        committed = self._load_checkpoint().get(checkpoint_key, 0) if checkpoint_key else 0
+        if committed:
+            self.report(f"{kind}: resuming after {committed} committed records")
+
+        records = iter(records)
+        for _ in islice(records, committed):
+            pass
+
+        start = time.perf_counter()
+        written = 0
+        while True:
+            batch = [prepare(record) for record in islice(records, self.batch_size)]
+            if not batch:
+                break
+            try:
+                result = write_batch(batch)
+            except Exception as e:
+                self.report(f"{kind}: batch starting at record {committed} failed: {e}")
+                self.report(f"{kind}: rerun the import to resume from record {committed}")
+                return False
+
+            committed += len(batch)
+            written += len(batch)
+            # Relationship batches return a status per row; rows that were not written stay committed.
+            rejected = [status for status in result if status not in RELATIONSHIP_OK] if kind != PEOPLE else []
+            if rejected:
+                self.report(f"{kind}: {len(rejected)} records not written ({', '.join(sorted(set(rejected)))})")
+            if checkpoint_key:
+                self._save_checkpoint(checkpoint_key, committed)
+            elapsed = time.perf_counter() - start
+            rate = written / elapsed if elapsed else 0
+            self.report(f"{kind}: {committed} records committed ({rate:.0f} records/s)")
+
+        if kind == CHILD_OF and written:
+            try:
+                rounds = self.app.rebuild_derived_properties()
+            except Exception as e:
+                self.report(f"{kind}: updating generations and descendant counts failed: {e}")
+                self.report(f"{kind}: run rebuild_derived_properties (menu option 23) to finish the import")
+                return False
+            self.report(f"{kind}: generations and descendant counts updated ({rounds} rounds)")
+        if checkpoint_key:
+            self._save_checkpoint(checkpoint_key, None)
+        return True
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_checkpoint(self, key, committed):
+        if not self.checkpoint_path:
+            return
+        checkpoint = self._load_checkpoint()
+        if committed is None:
+            checkpoint.pop(key, None)
+        else:
+            checkpoint[key] = committed
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import people and relationships from CSV or JSON-Lines files.")
+    parser.add_argument("--people", help="file with first_name, last_name, birthdate, occupation, deathdate, description")
+    parser.add_argument("--married", help="file with person1_first_name, person1_last_name, person2_first_name, "
+                                          "person2_last_name, or with person1_id, person2_id")
+    parser.add_argument("--child-of", help="file with child_first_name, child_last_name, parent1_first_name, ... "
+                                           "parent2_last_name, or with child_id, parent1_id, parent2_id")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default=".import_checkpoint.json")
+    args = parser.parse_args()
+
+    load_dotenv()
+    app = FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+    importer = BulkImporter(app, batch_size=args.batch_size, checkpoint_path=args.checkpoint)
+    try:
+        # People first, relationships can only be matched once both ends exist.
+        for kind, path in ((PEOPLE, args.people), (MARRIED, args.married), (CHILD_OF, args.child_of)):
+            if path and not importer.import_file(kind, path):
+                break
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+
+COUNTER_NAMES = ("nodes_created", "nodes_deleted", "relationships_created", "relationships_deleted",
+                 "properties_set", "labels_added", "labels_removed", "indexes_added", "indexes_removed",
+                 "constraints_added", "constraints_removed")
+NOT_PROFILEABLE = ("CREATE CONSTRAINT", "CREATE INDEX", "CREATE FULLTEXT", "CREATE TEXT", "CREATE RANGE",
+                   "CREATE POINT", "DROP", "SHOW", "EXPLAIN", "PROFILE")
+
+slow_query_log = logging.getLogger("familytree.slow_queries")
+
+# (registry, operation name) of the app method currently running in this context.
+_current = contextvars.ContextVar("familytree_operation", default=None)
+
+
+def _db_hits(plan):
+    return plan.get("dbHits", 0) + sum(_db_hits(child) for child in plan.get("children", ()))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class MetricsRegistry:
+    """In-process metrics for app operations and the Cypher queries they run.
+
+    Per (operation, query) it keeps calls, errors, client wall time, the
+    server's result_available_after / result_consumed_after, rows and the
+    write counters of the result summary. A fraction of the queries can be
+    run with PROFILE, and queries slower than slow_query_ms are logged to the
+    'familytree.slow_queries' logger and kept in a short in-memory list.
+    """
+
+    def __init__(self, slow_query_ms=None, profile_sample_rate=0.0, query_names=None, slow_query_history=100,
+                 sample=random.random):
+        self.slow_query_ms = slow_query_ms
+        self.profile_sample_rate = profile_sample_rate
+        self.query_names = query_names or {}
+        self.sample = sample
+        self.operations = {}
+        self.queries = {}
+        self.profiles = {}
+        self.slow_queries = deque(maxlen=slow_query_history)
+
+    @contextmanager
+    def operation(self, name):
+        token = _current.set((self, name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            stats = self.operations.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def label(self, query):
+        return self.query_names.get(query) or " ".join(query.split())[:80]
+
+    def should_profile(self, query):
+        return (self.profile_sample_rate > 0 and self.sample() < self.profile_sample_rate
+                and not query.lstrip().upper().startswith(NOT_PROFILEABLE))
+
+    def _query_stats(self, operation, label):
+        stats = self.queries.get((operation, label))
+        if stats is None:
+            stats = {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0,
+                     "available_after_ms": 0, "consumed_after_ms": 0, "counters": dict.fromkeys(COUNTER_NAMES, 0)}
+            self.queries[(operation, label)] = stats
+        return stats
+
+    def observe(self, operation, query, seconds, rows, summary=None, profiled=False):
+        label = self.label(query)
+        stats = self._query_stats(operation, label)
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["rows"] += rows
+        if summary is not None:
+            stats["available_after_ms"] += summary.result_available_after or 0
+            stats["consumed_after_ms"] += summary.result_consumed_after or 0
+            for name in COUNTER_NAMES:
+                stats["counters"][name] += getattr(summary.counters, name, 0)
+            if profiled and summary.profile:
+                self.profiles[label] = {"operation": operation, "db_hits": _db_hits(summary.profile),
+                                        "rows": rows, "plan": summary.profile}
+
+        if self.slow_query_ms is not None and seconds * 1000 >= self.slow_query_ms:
+            entry = {"operation": operation, "query": label, "ms": seconds * 1000, "rows": rows,
+                     "available_after_ms": summary.result_available_after if summary else None,
+                     "consumed_after_ms": summary.result_consumed_after if summary else None}
+            self.slow_queries.append(entry)
+            slow_query_log.warning("slow query in %s: %s took %.1f ms (%d rows)", operation, label, entry["ms"], rows)
+
+    def observe_error(self, operation, query):
+        self._query_stats(operation, self.label(query))["errors"] += 1
+
+    def reset(self):
+        self.operations.clear()
+        self.queries.clear()
+        self.profiles.clear()
+        self.slow_queries.clear()
+
+    def snapshot(self):
+        return {
+            "operations": {name: dict(stats) for name, stats in self.operations.items()},
+            "queries": [{"operation": operation, "query": label, **stats, "counters": dict(stats["counters"])}
+                        for (operation, label), stats in self.queries.items()],
+            "profiles": {label: {key: value for key, value in profile.items() if key != "plan"}
+                         for label, profile in self.profiles.items()},
+            "slow_queries": list(self.slow_queries),
+        }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2, default=str)
+
+    def to_prometheus(self):
+        """Renders the registry in the Prometheus text exposition format."""
+        lines = ["# TYPE familytree_operation_calls_total counter"]
+        for name, stats in sorted(self.operations.items()):
+            lines.append(f'familytree_operation_calls_total{{operation="{_escape_label(name)}"}} {stats["calls"]}')
+        lines.append("# TYPE familytree_operation_seconds_total counter")
+        for name, stats in sorted(self.operations.items()):
+            lines.append(f'familytree_operation_seconds_total{{operation="{_escape_label(name)}"}} {stats["seconds"]:.6f}')
+
+        series = (("calls", "familytree_query_calls_total"), ("errors", "familytree_query_errors_total"),
+                  ("seconds", "familytree_query_seconds_total"), ("rows", "familytree_query_rows_total"),
+                  ("available_after_ms", "familytree_query_available_after_ms_total"),
+                  ("consumed_after_ms", "familytree_query_consumed_after_ms_total"))
+        for key, metric in series:
+            lines.append(f"# TYPE {metric} counter")
+            for (operation, label), stats in sorted(self.queries.items()):
+                value = f"{stats[key]:.6f}" if key == "seconds" else stats[key]
+                lines.append(f'{metric}{{operation="{_escape_label(operation)}",query="{_escape_label(label)}"}} {value}')
+        lines.append("# TYPE familytree_query_updates_total counter")
+        for (operation, label), stats in sorted(self.queries.items()):
+            for name, value in stats["counters"].items():
+                if value:
+                    lines.append(f'familytree_query_updates_total{{operation="{_escape_label(operation)}",'
+                                 f'query="{_escape_label(label)}",counter="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def report_lines(self, limit=10):
+        """Human-readable summary of the operations and queries with the most total time."""
+        lines = ["Operation                          calls   total ms     max ms"]
+        for name, stats in sorted(self.operations.items(), key=lambda item: -item[1]["seconds"])[:limit]:
+            lines.append(f"{name:<32} {stats['calls']:>7} {stats['seconds'] * 1000:>10.1f} {stats['max_seconds'] * 1000:>10.1f}")
+        lines.append("")
+        lines.append("Query                              calls   total ms       rows  server ms")
+        for (operation, label), stats in sorted(self.queries.items(), key=lambda item: -item[1]["seconds"])[:limit]:
+            server_ms = stats["available_after_ms"] + stats["consumed_after_ms"]
+            lines.append(f"{label[:32]:<32} {stats['calls']:>7} {stats['seconds'] * 1000:>10.1f} "
+                         f"{stats['rows']:>10} {server_ms:>10}")
+        if self.slow_queries:
+            lines.append("")
+            lines.append(f"{len(self.slow_queries)} slow queries (>= {self.slow_query_ms} ms), latest:")
+            for entry in list(self.slow_queries)[-5:]:
+                lines.append(f"  {entry['operation']}: {entry['query'][:50]} {entry['ms']:.1f} ms")
+        return lines
+
+
+class InstrumentedResult:
+    """Wraps a driver Result and reports to the registry once the result is consumed."""
+
+    def __init__(self, result, registry, operation, query, start, profiled):
+        self._result = result
+        self._registry = registry
+        self._operation = operation
+        self._query = query
+        self._start = start
+        self._profiled = profiled
+        self._rows = 0
+        self._summary = None
+
+    def __iter__(self):
+        try:
+            for record in self._result:
+                self._rows += 1
+                yield record
+        except Exception:
+            self._registry.observe_error(self._operation, self._query)
+            raise
+        self.consume()
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+    def single(self, strict=False):
+        try:
+            record = self._result.single(strict=strict)
+        except Exception:
+            self._registry.observe_error(self._operation, self._query)
+            raise
+        self._rows += record is not None
+        self.consume()
+        return record
+
+    def consume(self):
+        if self._summary is None:
+            self._summary = self._result.consume()
+            self._registry.observe(self._operation, self._query, time.perf_counter() - self._start, self._rows,
+                                   self._summary, self._profiled)
+        return self._summary
+
+
+def run_query(runner, query, parameters=None, **kwargs):
+    """Runs a query on a session or transaction, instrumented when an operation is being measured."""
+    current = _current.get()
+    if current is None:
+        return runner.run(query, parameters, **kwargs)
+
+    registry, operation = current
+    profiled = registry.should_profile(query)
+    start = time.perf_counter()
+    try:
+        result = runner.run("PROFILE " + query if profiled else query, parameters, **kwargs)
+    except Exception:
+        registry.observe_error(operation, query)
+        raise
+    return InstrumentedResult(result, registry, operation, query, start, profiled)
+
+
+def measured(method):
+    """Marks a FamilyTreeApp method as an operation of self.metrics (a no-op while metrics are off)."""
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                yield from method(self, *args, **kwargs)
+                return
+            with self.metrics.operation(name):
+                yield from method(self, *args, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return method(self, *args, **kwargs)
+        with self.metrics.operation(name):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+
+from snapshot import NO_DAY, day_number
+
+# Problems the checker can repair on its own; everything else is only reported.
+FIXABLE = ("duplicate_child_of", "duplicate_married", "one_directional_married")
+
+
+def _violation(kind, person_id, **details):
+    return {"kind": kind, "person_id": person_id, "fixable": kind in FIXABLE, **details}
+
+
+def strongly_connected_components(offsets, targets):
+    """Iterative Tarjan over a CSR graph: yields every component with more than one node, as lists of node indices.
+
+    Linear in nodes plus edges and without recursion, so deep parent chains
+    cannot overflow the stack.
+    """
+    size = len(offsets) - 1
+    offsets, targets = offsets.tolist(), targets.tolist()
+    index = [-1] * size
+    lowlink = [0] * size
+    on_stack = [False] * size
+    stack = []
+    counter = 0
+    for root in range(size):
+        if index[root] != -1 or offsets[root] == offsets[root + 1]:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, offsets[root])]
+        while work:
+            node, position = work[-1]
+            if position < offsets[node + 1]:
+                work[-1] = (node, position + 1)
+                target = targets[position]
+                if index[target] == -1:
+                    index[target] = lowlink[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = True
+                    work.append((target, offsets[target]))
+                elif on_stack[target] and index[target] < lowlink[node]:
+                    lowlink[node] = index[target]
+                continue
+            work.pop()
+            if work and lowlink[node] < lowlink[work[-1][0]]:
+                lowlink[work[-1][0]] = lowlink[node]
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1:
+                    yield component
+
+
+class IntegrityChecker:
+    """Checks the whole family graph in one paged scan.
+
+    Problems visible on a single person (more than two parents, duplicate
+    relationships, a MARRIED relationship without its reverse, death before
+    birth, being one's own parent) are yielded while the scan runs. Only
+    person ids, birth and death days and the distinct CHILD_OF pairs are kept,
+    as compact arrays; after the scan they give the CHILD_OF cycles (Tarjan)
+    and the children born before a parent or after a parent's death.
+
+    With repair=True the fixable problems (see FIXABLE) are corrected through
+    the app in batches of batch_size people while the scan goes on.
+    """
+
+    def __init__(self, app, page_size=5000, repair=False, batch_size=1000):
+        self.app = app
+        self.page_size = page_size
+        self.repair = repair
+        self.batch_size = batch_size
+        self.counts = Counter()
+        self.repaired = 0
+        self._duplicates = []
+        self._reverse_married = []
+
+    def check(self):
+        return self.check_rows(self.app.iter_integrity_rows(page_size=self.page_size))
+
+    def check_rows(self, rows):
+        """Yields the violations found in rows (dicts like app.iter_integrity_rows yields) as dicts."""
+        ids, birth_days, death_days = array("q"), array("i"), array("i")
+        children, parents = array("q"), array("q")
+        for row in rows:
+            person_id = row["person_id"]
+            birth_day, death_day = day_number(row["birthdate"]), day_number(row["deathdate"])
+            ids.append(person_id)
+            birth_days.append(birth_day)
+            death_days.append(death_day)
+            yield from self._emit(self._check_person(row, birth_day, death_day))
+            for parent_id in set(row["parents"]) - {None}:
+                children.append(person_id)
+                parents.append(parent_id)
+        yield from self._emit(self._flush(force=True))
+        yield from self._emit(self._check_graph(ids, birth_days, death_days, children, parents))
+
+    def _emit(self, violations):
+        for violation in violations:
+            self.counts[violation["kind"]] += 1
+            yield violation
+
+    def _check_person(self, row, birth_day, death_day):
+        person_id = row["person_id"]
+        if NO_DAY not in (birth_day, death_day) and death_day < birth_day:
+            yield _violation("died_before_born", person_id)
+
+        parent_counts = Counter(row["parents"])
+        if person_id in parent_counts:
+            yield _violation("child_of_cycle", person_id, person_ids=[person_id])
+        if len(parent_counts) > 2:
+            yield _violation("too_many_parents", person_id, parent_ids=sorted(parent_counts))
+        duplicated = False
+        for parent_id, count in parent_counts.items():
+            if count > 1:
+                duplicated = True
+                yield _violation("duplicate_child_of", person_id, parent_id=parent_id, count=count)
+
+        spouses_out, spouses_in = Counter(row["spouses_out"]), set(row["spouses_in"])
+        for spouse_id, count in spouses_out.items():
+            if count > 1:
+                duplicated = True
+                yield _violation("duplicate_married", person_id, spouse_id=spouse_id, count=count)
+            if spouse_id not in spouses_in:
+                self._reverse_married.append((person_id, spouse_id))
+                yield _violation("one_directional_married", person_id, spouse_id=spouse_id)
+        if duplicated:
+            self._duplicates.append(person_id)
+        yield from self._flush()
+
+    def _flush(self, force=False):
+        if not self.repair:
+            self._duplicates, self._reverse_married = [], []
+            return
+        # Repairs run in their own transactions; a failure is reported, the scan continues.
+        for pending, write in ((self._duplicates, self.app.remove_duplicate_edges),
+                               (self._reverse_married, self.app.add_reverse_married_edges)):
+            if pending and (force or len(pending) >= self.batch_size):
+                batch = pending[:]
+                pending.clear()
+                try:
+                    self.repaired += write(batch)
+                except Exception as e:
+                    yield _violation("repair_failed", None, error=str(e), batch=batch)
+
+    def _check_graph(self, ids, birth_days, death_days, children, parents):
+        ids = np.frombuffer(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        births = np.frombuffer(birth_days, dtype=np.int32)
+        deaths = np.frombuffer(death_days, dtype=np.int32)
+        child_ids = np.frombuffer(children, dtype=np.int64)
+        parent_ids = np.frombuffer(parents, dtype=np.int64)
+        child_index = order[np.searchsorted(sorted_ids, child_ids)]
+        parent_index = order[np.minimum(np.searchsorted(sorted_ids, parent_ids), len(ids) - 1)]
+        known = ids[parent_index] == parent_ids
+
+        child_births, parent_births = births[child_index], births[parent_index]
+        parent_deaths = deaths[parent_index]
+        has_birth = known & (child_births != NO_DAY)
+        for kind, mask in (
+            ("born_before_parent", has_birth & (parent_births != NO_DAY) & (child_births < parent_births)),
+            ("born_after_parent_death", has_birth & (parent_deaths != NO_DAY) & (child_births > parent_deaths)),
+        ):
+            for position in np.flatnonzero(mask):
+                yield _violation(kind, int(child_ids[position]), parent_id=int(parent_ids[position]))
+
+        # CHILD_OF edges as CSR (child -> parents); self-loops were reported per person.
+        keep = known & (child_index != parent_index)
+        sources, targets = child_index[keep], parent_index[keep]
+        edge_order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(ids)), out=offsets[1:])
+        for component in strongly_connected_components(offsets, targets[edge_order]):
+            members = sorted(int(ids[index]) for index in component)
+            yield _violation("child_of_cycle", members[0], person_ids=members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the family tree database for inconsistent data.")
+    parser.add_argument("--repair", action="store_true",
+                        help="remove duplicate relationships and add missing reverse MARRIED relationships")
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="people per repair transaction")
+    args = parser.parse_args()
+
+    from function import FamilyTreeApp
+    load_dotenv()
+    app = FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+    start = time.perf_counter()
+    try:
+        checker = IntegrityChecker(app, args.page_size, args.repair, args.batch_size)
+        for violation in checker.check():
+            print(json.dumps(violation))
+    finally:
+        app.close()
+    summary = ", ".join(f"{kind}: {count}" for kind, count in sorted(checker.counts.items())) or "no problems found"
+    print(f"{summary} ({checker.repaired} repaired) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    sys.exit(1 if checker.counts else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from traversal import walk_generations
+
+ORDINALS = {1: "first", 2: "second", 3: "third", 4: "fourth", 5: "fifth", 6: "sixth", 7: "seventh", 8: "eighth", 9: "ninth"}
+TIMES = {1: "once", 2: "twice", 3: "three times", 4: "four times"}
+
+
+def ancestor_map(key, expand_parents):
+    """Returns {ancestor: (generations up, child it was reached from)}, key itself at 0."""
+    return ancestors_from_generations(key, walk_generations([key], expand_parents))
+
+
+def ancestors_from_generations(key, generations):
+    """ancestor_map from the (generation, found) steps of a walk up from key, e.g. walk_generations_async."""
+    ancestors = {key: (0, None)}
+    for generation, found in generations:
+        for ancestor, via in found:
+            ancestors[ancestor] = (generation, via)
+    return ancestors
+
+
+def _ordinal(number):
+    if number in ORDINALS:
+        return ORDINALS[number]
+    suffix = "th" if number % 100 in (11, 12, 13) else {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+
+def _greats(count):
+    return "great-" * count
+
+
+def kinship_label(up, down):
+    """Names what B is to A, given the generations from A (up) and B (down) to their closest common ancestor."""
+    if up == 0 and down == 0:
+        return "same person"
+    if up == 0:
+        return "child" if down == 1 else _greats(down - 2) + "grandchild"
+    if down == 0:
+        return "parent" if up == 1 else _greats(up - 2) + "grandparent"
+    if up == 1 and down == 1:
+        return "sibling"
+    if up == 1:
+        return _greats(down - 2) + "niece/nephew"
+    if down == 1:
+        return _greats(up - 2) + "aunt/uncle"
+    label = f"{_ordinal(min(up, down) - 1)} cousin"
+    removed = abs(up - down)
+    if removed:
+        label += f" {TIMES.get(removed, f'{removed} times')} removed"
+    return label
+
+
+def in_law_label(label):
+    if label in ("parent", "child", "sibling"):
+        return f"{label}-in-law"
+    return f"{label} by marriage"
+
+
+def _chain(ancestors, ancestor):
+    # Walks the BFS back-pointers from the ancestor down to the start person.
+    chain = [ancestor]
+    while ancestors[chain[-1]][1] is not None:
+        chain.append(ancestors[chain[-1]][1])
+    return chain
+
+
+def blood_relationship(a, b, ancestors_of):
+    """Returns (label, path, common ancestors) for two blood relatives, else None.
+
+    Both ancestor sets are walked upwards and meet at their intersection; the
+    common ancestors with the shortest combined distance are the lowest ones.
+    """
+    ancestors_a = ancestors_of(a)
+    ancestors_b = ancestors_of(b)
+    common = ancestors_a.keys() & ancestors_b.keys()
+    if not common:
+        return None
+
+    distance = lambda key: ancestors_a[key][0] + ancestors_b[key][0]
+    shortest = min(distance(key) for key in common)
+    lowest = sorted(key for key in common if distance(key) == shortest)
+    up, down = ancestors_a[lowest[0]][0], ancestors_b[lowest[0]][0]
+    path = _chain(ancestors_a, lowest[0])[::-1] + _chain(ancestors_b, lowest[0])[1:]
+    return kinship_label(up, down), path, lowest
+
+
+def find_relationship(a, b, ancestors_of, spouses_of):
+    """Returns (label, path, common ancestors) or None, falling back to in-law relations via MARRIED."""
+    blood = blood_relationship(a, b, ancestors_of)
+    if blood:
+        return blood
+
+    if b in spouses_of(a):
+        return "spouse", [a, b], []
+    for spouse in spouses_of(a):
+        blood = blood_relationship(spouse, b, ancestors_of)
+        if blood:
+            label, path, common = blood
+            return in_law_label(label), [a] + path, common
+    for spouse in spouses_of(b):
+        blood = blood_relationship(a, spouse, ancestors_of)
+        if blood:
+            label, path, common = blood
+            return in_law_label(label), path + [b], common
+    return None
@@ -1,10 +1,24 @@
-from function import FamilyTreeApp, test_connection
+import time
+
+_start = time.perf_counter()
+
+from function import FamilyTreeApp
+from memory_backend import InMemoryFamilyTreeApp
 from menu import Menu
+import argparse
+import contextlib
 import os
+import sys
 from dotenv import load_dotenv
 
-def main():
-    load_dotenv()
+IMPORT_SECONDS = time.perf_counter() - _start
+
+def print_startup_timings(timings):
+    print("Startup: " + ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items()))
+
+def create_app():
+    if os.getenv("BACKEND_DB") == "memory":
+        return InMemoryFamilyTreeApp()
 
     connection_string = os.getenv("CONNECTION_STRING_DB")
     username = os.getenv("USERNAME_DB")
@@ -12,13 +26,45 @@ def main():
 
     if not connection_string or not username or not password:
         print("Environment variables are not set correctly.")
+        return None
+
+    cache_size = int(os.getenv("CACHE_SIZE", "0"))
+    cache_ttl = float(os.getenv("CACHE_TTL", "0")) or None
+    app = FamilyTreeApp(connection_string, username, password, cache_size=cache_size, cache_ttl=cache_ttl)
+    if not app.connected:
+        raise ValueError("Connection failed.")
+    if os.getenv("METRICS") == "1":
+        slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "0")) or None
+        app.enable_metrics(slow_query_ms, float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
+    print_startup_timings({"imports": IMPORT_SECONDS, **app.startup_timings})
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Family tree application.")
+    parser.add_argument("--batch", metavar="SCRIPT",
+                        help="run JSON-Lines commands from SCRIPT (- for stdin) instead of the menu, see batch.py")
+    parser.add_argument("--batch-size", type=int, default=500, help="writes per transaction in batch mode")
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.batch is None:
+        app = create_app()
+        if app is not None:
+            Menu(app).run()
         return
-    if test_connection(connection_string, username, password) is False:
-            raise ValueError("Connection failed.")
-    else:
-        app = FamilyTreeApp(connection_string, username, password)
-        menu = Menu(app)
-        menu.run()
+
+    # In batch mode stdout carries only the JSON-Lines results.
+    from batch import run_script
+    with contextlib.redirect_stdout(sys.stderr):
+        app = create_app()
+    if app is None:
+        sys.exit(1)
+    try:
+        counts = run_script(app, args.batch, args.batch_size)
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            app.close()
+    sys.exit(1 if counts["failed"] else 0)
 
 if __name__ == "__main__":
     main()
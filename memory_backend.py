@@ -0,0 +1,531 @@
+import re
+from datetime import date
+
+from function import (EXAMPLE_CHILDREN, EXAMPLE_MARRIAGES, EXAMPLE_PEOPLE, PERSON_PROPERTIES, birthdate_cutoff,
+                      check_relationship, neighborhood_edges)
+from kinship import ancestor_map, find_relationship
+from traversal import walk_generations
+
+ALIVE = date(1, 1, 1)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _edit_distance_at_most(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+def _word_score(word, tokens, prefix, fuzzy):
+    if word in tokens:
+        return 2.0
+    if prefix and any(token.startswith(word) for token in tokens):
+        return 1.0
+    if fuzzy and any(_edit_distance_at_most(word, token, 2) for token in tokens):
+        return 0.5
+    return 0.0
+
+
+class PersonRecord:
+    """A stored person. Supports record['key'] access like a driver record."""
+
+    __slots__ = ("person_id", "first_name", "last_name", "birthdate", "occupation", "deathdate", "description")
+
+    def __init__(self, person_id, first_name, last_name, birthdate, occupation, deathdate, description):
+        self.person_id = person_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.birthdate = birthdate
+        self.occupation = occupation
+        self.deathdate = deathdate
+        self.description = description
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def as_dict(self):
+        return {
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "birthdate": self.birthdate,
+            "occupation": self.occupation,
+            "deathdate": self.deathdate,
+            "description": self.description,
+        }
+
+
+class InMemoryFamilyTreeApp:
+    """Pure-Python storage backend with the same interface as FamilyTreeApp.
+
+    People live in a dict keyed by their person_id, a name index lists the ids
+    per (first_name, last_name) and parent/child/spouse sets replace the
+    CHILD_OF and MARRIED relationships. Query methods return the same rows as
+    the Cypher versions, as dicts instead of driver records.
+    """
+
+    def __init__(self):
+        self._next_id = 1
+        self._people = {}
+        self._ids_by_name = {}
+        self._parents = {}
+        self._children = {}
+        self._spouses = {}
+        # Generations of everyone, computed on first use after a change to people or CHILD_OF.
+        self._generation_cache = None
+
+    def close(self):
+        pass
+
+    def setup_schema(self):
+        pass
+
+    def _id(self, first_name, last_name):
+        # The name-based reads act on the first person of that name.
+        ids = self._ids_by_name.get((first_name, last_name))
+        return ids[0] if ids else None
+
+    def _add_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+        person_id = self._next_id
+        self._next_id += 1
+        self._people[person_id] = PersonRecord(person_id, first_name, last_name, birthdate, occupation,
+                                               deathdate or ALIVE, description)
+        self._ids_by_name.setdefault((first_name, last_name), []).append(person_id)
+        self._parents[person_id] = set()
+        self._children[person_id] = set()
+        self._spouses[person_id] = set()
+        self._generation_cache = None
+        return person_id
+
+    def _remove_person(self, person_id):
+        person = self._people.pop(person_id)
+        ids = self._ids_by_name[(person.first_name, person.last_name)]
+        ids.remove(person_id)
+        if not ids:
+            del self._ids_by_name[(person.first_name, person.last_name)]
+        for parent_id in self._parents.pop(person_id):
+            self._children[parent_id].discard(person_id)
+        for child_id in self._children.pop(person_id):
+            self._parents[child_id].discard(person_id)
+        for spouse_id in self._spouses.pop(person_id):
+            self._spouses[spouse_id].discard(person_id)
+        self._generation_cache = None
+
+    def _resolve(self, row, prefixes):
+        # Same rules as the Cypher relationship writes: ids when given, else names; the first match wins.
+        if f"{prefixes[0]}_id" in row:
+            return [row[f"{prefix}_id"] if row[f"{prefix}_id"] in self._people else None for prefix in prefixes], False
+        matches = [self._ids_by_name.get((row[f"{prefix}_first_name"], row[f"{prefix}_last_name"]), [])
+                   for prefix in prefixes]
+        return [ids[0] if ids else None for ids in matches], any(len(ids) > 1 for ids in matches)
+
+    def _marry(self, row):
+        (id1, id2), ambiguous = self._resolve(row, ("person1", "person2"))
+        if ambiguous:
+            return {"status": "ambiguous", "spouses": []}
+        if id1 is None or id2 is None:
+            return {"status": "not_found", "spouses": []}
+        if id1 == id2:
+            return {"status": "same_person", "spouses": []}
+        if id2 in self._spouses[id1]:
+            return {"status": "already_married", "spouses": []}
+        if self._spouses[id1] or self._spouses[id2]:
+            spouses = [self._people[s].name for s in self._spouses[id1] | self._spouses[id2]]
+            return {"status": "married_to_other", "spouses": spouses}
+        self._spouses[id1].add(id2)
+        self._spouses[id2].add(id1)
+        return {"status": "created", "spouses": []}
+
+    def _add_parents(self, row):
+        (child_id, *parent_ids), ambiguous = self._resolve(row, ("child", "parent1", "parent2"))
+        if ambiguous:
+            return "ambiguous"
+        if None in (child_id, *parent_ids):
+            return "not_found"
+        if len({child_id, *parent_ids}) < 3:
+            return "same_person"
+        parents = self._parents[child_id]
+        if parents.issuperset(parent_ids):
+            return "already_exists"
+        if parents - set(parent_ids):
+            return "too_many_parents"
+        for parent_id in parent_ids:
+            parents.add(parent_id)
+            self._children[parent_id].add(child_id)
+        self._generation_cache = None
+        return "created"
+
+    def _relationship_status(self, record, relationship):
+        try:
+            return check_relationship(record)["status"]
+        except ValueError as ve:
+            print(f"Error adding {relationship} relationship: {ve}")
+
+    def insert_example_data(self):
+        try:
+            self.write_people_batch(EXAMPLE_PEOPLE)
+            self.write_married_batch(EXAMPLE_MARRIAGES)
+            self.write_child_of_batch(EXAMPLE_CHILDREN)
+        except Exception as e:
+            print(f"Failed to insert example data: {e}")
+
+    def get_all_people(self):
+        for person in self.iter_people():
+            print(f"{person['first_name']} {person['last_name']} - "
+                  f"{person['birthdate']} - {person['occupation']} - "
+                  f"{person['deathdate']} - {person['description']}")
+
+    def iter_people(self, properties=PERSON_PROPERTIES, page_size=500):
+        unknown = set(properties) - set(PERSON_PROPERTIES)
+        if unknown:
+            raise ValueError(f"Unknown person properties: {', '.join(sorted(unknown))}")
+        for person in sorted(self._people.values(), key=lambda person: (person.last_name, person.first_name, person.person_id)):
+            yield {name: getattr(person, name) for name in properties}
+
+    def iter_integrity_rows(self, page_size=5000):
+        # Sets cannot hold duplicate or one-directional relationships; cycles and dates can still be wrong.
+        for person_id in sorted(self._people):
+            person = self._people[person_id]
+            spouses = sorted(self._spouses[person_id])
+            yield {"person_id": person_id, "birthdate": person.birthdate, "deathdate": person.deathdate,
+                   "parents": sorted(self._parents[person_id]), "spouses_out": spouses, "spouses_in": spouses}
+
+    def iter_export_rows(self, root_id=None, page_size=5000):
+        # The same subtree as SUBTREE_EXPORT_PAGE_QUERY: root, descendants and their partners.
+        inside = members = None
+        if root_id is not None:
+            if root_id not in self._people:
+                return
+            inside, frontier = {root_id}, [root_id]
+            while frontier:
+                frontier = [child_id for key in frontier for child_id in self._children[key] if child_id not in inside]
+                inside.update(frontier)
+            members = inside.union(*(self._spouses[key] for key in inside),
+                                   *(self._parents[child_id] for key in inside for child_id in self._children[key]))
+        for person_id in sorted(self._people if members is None else members):
+            person = self._people[person_id]
+            within = members is None or person_id in inside
+            children = [child_id for child_id in self._children[person_id] if within or child_id in inside]
+            yield {
+                "person_id": person_id, **person.as_dict(),
+                "parents": sorted(self._parents[person_id]) if within and person_id != root_id else [],
+                "spouses": sorted(spouse_id for spouse_id in self._spouses[person_id]
+                                  if within or spouse_id in inside),
+                "children": [[child_id, next((other for other in self._parents[child_id] if other != person_id), None)]
+                             for child_id in sorted(children)],
+            }
+
+    def remove_duplicate_edges(self, person_ids):
+        return 0
+
+    def add_reverse_married_edges(self, pairs):
+        added = 0
+        for person_id, spouse_id in pairs:
+            if person_id not in self._spouses[spouse_id]:
+                self._spouses[spouse_id].add(person_id)
+                added += 1
+        return added
+
+    def iter_edges(self, page_size=500):
+        for person_id in sorted(self._people):
+            for parent_id in sorted(self._parents[person_id]):
+                yield 'CHILD_OF', person_id, parent_id
+            for spouse_id in sorted(self._spouses[person_id]):
+                if person_id < spouse_id:
+                    yield 'MARRIED', person_id, spouse_id
+
+    def create_person(self, first_name, last_name, birthdate, occupation, deathdate=None, description=None):
+        try:
+            return self._add_person(first_name, last_name, birthdate, occupation, deathdate, description)
+        except Exception as e:
+            print(f"Error creating person {first_name} {last_name}: {e}")
+
+    # Like UPDATE_PERSON_QUERY and DELETE_PERSON_QUERY, these act on everyone with that name.
+
+    def update_person(self, first_name, last_name, birthdate=None, occupation=None, deathdate=None, description=None):
+        for person_id in self._ids_by_name.get((first_name, last_name), []):
+            self.update_person_by_id(person_id, birthdate, occupation, deathdate, description)
+
+    def delete_person(self, first_name, last_name):
+        for person_id in list(self._ids_by_name.get((first_name, last_name), [])):
+            self._remove_person(person_id)
+
+    def deleteEverything(self):
+        self.__init__()
+
+    def add_married_relationship(self, person1_first_name, person1_last_name, person2_first_name, person2_last_name):
+        row = {"person1_first_name": person1_first_name, "person1_last_name": person1_last_name,
+               "person2_first_name": person2_first_name, "person2_last_name": person2_last_name}
+        return self._relationship_status(self._marry(row), "married")
+
+    def add_child_of_relationship(self, child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name):
+        row = {"child_first_name": child_first_name, "child_last_name": child_last_name,
+               "parent1_first_name": parent1_first_name, "parent1_last_name": parent1_last_name,
+               "parent2_first_name": parent2_first_name, "parent2_last_name": parent2_last_name}
+        return self._relationship_status({"status": self._add_parents(row)}, "child-of")
+
+    def find_person_ids(self, first_name, last_name):
+        ids = self._ids_by_name.get((first_name, last_name), [])
+        return sorted(ids, key=lambda person_id: (self._people[person_id].birthdate or date.min, person_id))
+
+    def get_person(self, person_id):
+        person = self._people.get(person_id)
+        if person is None:
+            return None
+        return {"person_id": person_id, **person.as_dict(), "generation": self._generations().get(person_id),
+                "child_count": len(self._children[person_id]),
+                "descendant_count": self._descendant_count(person_id)}
+
+    def update_person_by_id(self, person_id, birthdate=None, occupation=None, deathdate=None, description=None):
+        person = self._people.get(person_id)
+        if person is None:
+            print(f"Error updating person {person_id}: No person with id {person_id}")
+            return
+        person.birthdate = birthdate
+        person.occupation = occupation
+        person.deathdate = deathdate or ALIVE
+        person.description = description
+
+    def delete_person_by_id(self, person_id):
+        if person_id in self._people:
+            self._remove_person(person_id)
+
+    def add_married_relationship_by_id(self, person1_id, person2_id):
+        record = self._marry({"person1_id": person1_id, "person2_id": person2_id})
+        return self._relationship_status(record, "married")
+
+    def add_child_of_relationship_by_id(self, child_id, parent1_id, parent2_id):
+        status = self._add_parents({"child_id": child_id, "parent1_id": parent1_id, "parent2_id": parent2_id})
+        return self._relationship_status({"status": status}, "child-of")
+
+    def write_people_batch(self, people):
+        return [self._add_person(row["first_name"], row["last_name"], row.get("birthdate"), row.get("occupation"),
+                                 row.get("deathdate"), row.get("description")) for row in people]
+
+    def write_married_batch(self, marriages):
+        return [self._marry(row)["status"] for row in marriages]
+
+    def write_child_of_batch(self, children, update_derived=True):
+        # Derived values are computed when read, so update_derived has nothing to defer.
+        return [self._add_parents(row) for row in children]
+
+    def get_family_tree(self):
+        tree = []
+        for person_id, parent_ids in self._parents.items():
+            name = self._people[person_id].name
+            for parent_id in parent_ids:
+                tree.append({"person1": name, "person2": self._people[parent_id].name, "relationship": "child"})
+        for person_id, spouse_ids in self._spouses.items():
+            name = self._people[person_id].name
+            for spouse_id in spouse_ids:
+                tree.append({"person1": name, "person2": self._people[spouse_id].name, "relationship": "married"})
+        return tree
+
+    def search_people(self, query_string, **options):
+        results = []
+        cursor = None
+        while True:
+            page, cursor = self.search_people_page(query_string, cursor=cursor, **options)
+            results.extend(page)
+            if cursor is None:
+                return results
+
+    def search_people_page(self, query_string, limit=50, cursor=None, prefix=True, fuzzy=False,
+                           born_after=None, born_before=None, died_after=None, died_before=None):
+        # Mirrors the full-text query: every word must match a word of the names,
+        # occupation or description, exact matches outranking prefix and fuzzy ones.
+        words = query_string.lower().split()
+        if not words:
+            return [], None
+
+        matches = []
+        for person in self._people.values():
+            if born_after and (not person.birthdate or person.birthdate < born_after):
+                continue
+            if born_before and (not person.birthdate or person.birthdate > born_before):
+                continue
+            if died_after and person.deathdate < died_after:
+                continue
+            if died_before and (person.deathdate == ALIVE or person.deathdate > died_before):
+                continue
+            tokens = set()
+            for value in (person.first_name, person.last_name, person.occupation, person.description):
+                if value:
+                    tokens.update(re.findall(r"\w+", value.lower()))
+            score = 0.0
+            for word in words:
+                word_score = _word_score(word, tokens, prefix, fuzzy)
+                if not word_score:
+                    break
+                score += word_score
+            else:
+                matches.append((-score, person.person_id, person))
+
+        matches.sort(key=lambda match: match[:2])
+        if cursor:
+            after_score, after_id = cursor
+            matches = [match for match in matches if (match[0], match[1]) > (-after_score, after_id)]
+        page = matches[:limit]
+        rows = [dict(person.as_dict(), score=-score, id=person_id) for score, person_id, person in page]
+        next_cursor = (rows[-1]['score'], rows[-1]['id']) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def list_and_count_people_over_age(self, age):
+        try:
+            age = int(age)
+            people_over_age = list(self.iter_people_over_age(age))
+            return len(people_over_age), iter(people_over_age)
+
+        except Exception as e:
+            print(f"Error listing and counting people over age {age}: {e}")
+            return 0, []
+
+    def count_people_over_age(self, age):
+        return sum(1 for _ in self.iter_people_over_age(age))
+
+    def iter_people_over_age(self, age):
+        today = date.today()
+        cutoff = birthdate_cutoff(today, age)
+        for person in self._people.values():
+            if not person.birthdate or person.birthdate > cutoff:
+                continue
+            end = person.deathdate if person.deathdate and person.deathdate != ALIVE else today
+            years = end.year - person.birthdate.year - ((end.month, end.day) < (person.birthdate.month, person.birthdate.day))
+            if years > age:
+                yield f"{person.first_name} {person.last_name} {years} years old"
+
+    def get_persons_with_most_children(self):
+        max_children = max((len(children) for children in self._children.values()), default=0)
+        if not max_children:
+            return []
+        return [(self._people[person_id].name, len(children))
+                for person_id, children in self._children.items() if len(children) == max_children]
+
+    # generation, child_count and descendant_count are computed on demand instead of stored.
+    def _generations(self):
+        if self._generation_cache is None:
+            self._generation_cache = self._compute_generations()
+        return self._generation_cache
+
+    def _compute_generations(self):
+        # Kahn's algorithm from the people without parents; people on a cycle get none.
+        generations = {}
+        waiting = {person_id: len(parents) for person_id, parents in self._parents.items()}
+        frontier = [person_id for person_id, count in waiting.items() if not count]
+        for person_id in frontier:
+            generations[person_id] = 0
+        highest = {}
+        while frontier:
+            following = []
+            for person_id in frontier:
+                for child_id in self._children[person_id]:
+                    highest[child_id] = max(highest.get(child_id, 0), generations[person_id] + 1)
+                    waiting[child_id] -= 1
+                    if not waiting[child_id]:
+                        generations[child_id] = highest[child_id]
+                        following.append(child_id)
+            frontier = following
+        return generations
+
+    def _descendant_count(self, person_id):
+        seen, frontier = set(), [person_id]
+        while frontier:
+            frontier = [child_id for key in frontier for child_id in self._children[key] if child_id not in seen]
+            seen.update(frontier)
+        return len(seen)
+
+    def get_persons_with_most_descendants(self, limit=10):
+        counts = [(self._people[person_id].name, self._descendant_count(person_id))
+                  for person_id, children in self._children.items() if children]
+        return sorted(counts, key=lambda row: (-row[1], row[0]))[:limit]
+
+    def get_people_of_generation(self, generation):
+        return sorted(self._people[person_id].name
+                      for person_id, value in self._generations().items() if value == generation)
+
+    def rebuild_derived_properties(self, batch_size=10000, max_rounds=1000):
+        return 0
+
+    def get_population_columns(self):
+        people = list(self._people.values())
+        epoch_days = lambda value: value.toordinal() - EPOCH_ORDINAL if value else None
+        return {
+            "names": [person.name for person in people],
+            "birth_days": [epoch_days(person.birthdate) for person in people],
+            "death_days": [epoch_days(person.deathdate) for person in people],
+            "occupations": [person.occupation for person in people],
+            "child_counts": [len(self._children[person.person_id]) for person in people],
+        }
+
+    def get_siblings(self, first_name, last_name):
+        person_id = self._id(first_name, last_name)
+        if person_id is None:
+            return []
+        sibling_ids = set()
+        for parent_id in self._parents[person_id]:
+            sibling_ids |= self._children[parent_id]
+        sibling_ids.discard(person_id)
+        return [self._people[sibling_id].name for sibling_id in sibling_ids]
+
+    def count_people(self):
+        return len(self._people)
+
+    def iter_ancestors(self, first_name, last_name, max_generations=None):
+        return self._iter_generations(first_name, last_name, max_generations, self._parents)
+
+    def iter_descendants(self, first_name, last_name, max_generations=None):
+        return self._iter_generations(first_name, last_name, max_generations, self._children)
+
+    def _iter_generations(self, first_name, last_name, max_generations, adjacency):
+        person_id = self._id(first_name, last_name)
+        if person_id is None:
+            return
+        expand = lambda frontier: [(key, other) for key in frontier for other in adjacency[key]]
+        for generation, found in walk_generations([person_id], expand, max_generations):
+            yield generation, [(self._people[key].first_name, self._people[key].last_name) for key, _ in found]
+
+    def get_relationship(self, first_name1, last_name1, first_name2, last_name2):
+        a = self._id(first_name1, last_name1)
+        b = self._id(first_name2, last_name2)
+        if a is None or b is None:
+            return None
+        expand_parents = lambda frontier: [(key, parent) for key in frontier for parent in self._parents[key]]
+        found = find_relationship(a, b, lambda key: ancestor_map(key, expand_parents), lambda key: self._spouses[key])
+        if not found:
+            return None
+        label, path, common = found
+        return {
+            "relationship": label,
+            "path": [self._people[key].name for key in path],
+            "common_ancestors": [self._people[key].name for key in common],
+        }
+
+    def get_neighborhood(self, first_name, last_name, generations_up=2, generations_down=2):
+        nodes = {(first_name, last_name): 0}
+        for generation, people in self.iter_ancestors(first_name, last_name, generations_up):
+            for key in people:
+                nodes.setdefault(key, -generation)
+        for generation, people in self.iter_descendants(first_name, last_name, generations_down):
+            for key in people:
+                nodes.setdefault(key, generation)
+
+        found = []
+        for key in list(nodes):
+            person_id = self._id(*key)
+            if person_id is None:
+                continue
+            for other_id, relationship in ([(i, "CHILD_OF") for i in self._parents[person_id]]
+                                           + [(i, "MARRIED") for i in self._spouses[person_id]]):
+                other = self._people[other_id]
+                found.append((key, relationship, (other.first_name, other.last_name)))
+        return neighborhood_edges(nodes, found)
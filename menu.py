@@ -28,6 +28,16 @@ class Menu:
         print("12: Get person with most children")
         print("13: Get siblings of a person")
         print("14: Count total number of people")
+        print("15: Show ancestors of a person")
+        print("16: Show descendants of a person")
+        print("17: How are two people related")
+        print("18: Render family tree around a person to a file")
+        print("19: Show query metrics")
+        print("20: Show population statistics")
+        print("21: Check data integrity")
+        print("22: Show persons with the most descendants")
+        print("23: Rebuild generations and descendant counts")
+        print("24: Export family tree (GEDCOM or JSON Lines)")
         print("0: Exit")
 
     def validate_input(self, prompt, data_type=str, required=True):
@@ -52,6 +62,47 @@ class Menu:
                 except ValueError:
                     print(f"Invalid input format. Please enter a valid {data_type.__name__}.")
 
+    def choose_person(self, role="person"):
+        """Asks for a name and returns the person_id, letting the user pick when several people share the name."""
+        first_name = self.validate_input(f"Enter first name of {role}: ")
+        last_name = self.validate_input(f"Enter last name of {role}: ")
+        person_ids = self.app.find_person_ids(first_name, last_name)
+        if not person_ids:
+            print(f"No person named {first_name} {last_name} found.")
+            return None
+        if len(person_ids) == 1:
+            return person_ids[0]
+
+        print(f"There are {len(person_ids)} people named {first_name} {last_name}:")
+        for person_id in person_ids:
+            person = self.app.get_person(person_id) or {}
+            print(f"  {person_id}: born {person.get('birthdate')} - {person.get('occupation')}")
+        while True:
+            person_id = self.validate_input("Enter the id of the person: ", data_type=int)
+            if person_id in person_ids:
+                return person_id
+            print("Please enter one of the ids listed above.")
+
+    @staticmethod
+    def print_statistics(stats):
+        """Prints the population statistics computed by family_stats."""
+        print(f"{len(stats)} people")
+        print("\nAge distribution:")
+        for lower, upper, count in stats.age_histogram():
+            print(f"  {lower:>3}-{upper - 1:<3} {count:>8}")
+        print("\nLifespan by birth decade (10th / 50th / 90th percentile):")
+        for decade, lifespan in sorted(stats.lifespan_percentiles_by_decade().items()):
+            print(f"  {decade}s: {lifespan[10]:.0f} / {lifespan[50]:.0f} / {lifespan[90]:.0f} years ({lifespan['count']} people)")
+        print("\nChildren per person:")
+        for children, people in stats.children_distribution().items():
+            print(f"  {children:>3} children: {people}")
+        print("\nMost children:")
+        for name, children in stats.top_parents(5):
+            print(f"  {name}: {children}")
+        print("\nMost common occupations:")
+        for occupation, count in stats.occupation_frequencies(10):
+            print(f"  {occupation}: {count}")
+
     def run(self):
         """Runs the main menu loop."""
         while True:
@@ -66,7 +117,10 @@ class Menu:
             elif choice == '2':
                 self.clear_screen()
                 print("Fetching all people...\n")
-                self.app.get_all_people()
+                for person in self.app.iter_people():
+                    print(f"{person['first_name']} {person['last_name']} - "
+                          f"{person['birthdate']} - {person['occupation']} - "
+                          f"{person['deathdate']} - {person['description']}")
             elif choice == '3':
                 self.clear_screen()
                 print("Creating a new person...\n")
@@ -76,26 +130,29 @@ class Menu:
                 occupation = self.validate_input("Enter occupation: ")
                 deathdate = self.validate_input("Enter deathdate (YYYY-MM-DD) (Optional): ", data_type=datetime, required=False)
                 description = self.validate_input("Enter description (Optional): ", required=False)
-                self.app.create_person(first_name, last_name, birthdate, occupation, deathdate, description)
-                print(f"\n{first_name} {last_name} created successfully.")
+                person_id = self.app.create_person(first_name, last_name, birthdate, occupation, deathdate, description)
+                if person_id is not None:
+                    print(f"\n{first_name} {last_name} created successfully (id {person_id}).")
             elif choice == '4':
                 self.clear_screen()
                 print("Updating a person...\n")
-                first_name = self.validate_input("Enter first name: ")
-                last_name = self.validate_input("Enter last name: ")
+                person_id = self.choose_person()
+                if person_id is None:
+                    continue
                 birthdate = self.validate_input("Enter new birthdate (YYYY-MM-DD) (leave blank to keep current): ", data_type=datetime, required=False)
                 occupation = self.validate_input("Enter new occupation (leave blank to keep current): ", required=False)
                 deathdate = self.validate_input("Enter new deathdate (YYYY-MM-DD) (leave blank to keep current): ", data_type=datetime, required=False)
                 description = self.validate_input("Enter new description (leave blank to keep current): ", required=False)
-                self.app.update_person(first_name, last_name, birthdate or None, occupation, deathdate, description)
-                print(f"\n{first_name} {last_name} updated successfully.")
+                self.app.update_person_by_id(person_id, birthdate or None, occupation, deathdate, description)
+                print(f"\nPerson {person_id} updated successfully.")
             elif choice == '5':
                 self.clear_screen()
                 print("Deleting a person...\n")
-                first_name = self.validate_input("Enter first name: ")
-                last_name = self.validate_input("Enter last name: ")
-                self.app.delete_person(first_name, last_name)
-                print(f"\n{first_name} {last_name} deleted successfully.")
+                person_id = self.choose_person()
+                if person_id is None:
+                    continue
+                self.app.delete_person_by_id(person_id)
+                print(f"\nPerson {person_id} deleted successfully.")
             elif choice == '6':
                 self.clear_screen()
                 confirmation = input("Are you sure you want to delete everything? (y/n): ").strip().lower()
@@ -108,23 +165,29 @@ class Menu:
             elif choice == '7':
                 self.clear_screen()
                 print("Adding a married relationship...\n")
-                person1_first_name = self.validate_input("Enter first name of first person: ")
-                person1_last_name = self.validate_input("Enter last name of first person: ")
-                person2_first_name = self.validate_input("Enter first name of second person: ")
-                person2_last_name = self.validate_input("Enter last name of second person: ")
-                self.app.add_married_relationship(person1_first_name, person1_last_name, person2_first_name, person2_last_name)
-                print(f"\nMarried relationship added between {person1_first_name} {person1_last_name} and {person2_first_name} {person2_last_name}.")
+                person1_id = self.choose_person("first person")
+                person2_id = self.choose_person("second person") if person1_id is not None else None
+                if person2_id is None:
+                    continue
+                status = self.app.add_married_relationship_by_id(person1_id, person2_id)
+                # On failure the app has printed why (not_found, married_to_other, ...) and returns None.
+                if status == 'created':
+                    print(f"\nMarried relationship added between {person1_id} and {person2_id}.")
+                elif status == 'already_married':
+                    print(f"\n{person1_id} and {person2_id} are already married.")
             elif choice == '8':
                 self.clear_screen()
                 print("Adding a child relationship...\n")
-                child_first_name = self.validate_input("Enter first name of child: ")
-                child_last_name = self.validate_input("Enter last name of child: ")
-                parent1_first_name = self.validate_input("Enter first name of first parent: ")
-                parent1_last_name = self.validate_input("Enter last name of first parent: ")
-                parent2_first_name = self.validate_input("Enter first name of second parent: ")
-                parent2_last_name = self.validate_input("Enter last name of second parent: ")
-                self.app.add_child_of_relationship(child_first_name, child_last_name, parent1_first_name, parent1_last_name, parent2_first_name, parent2_last_name)
-                print(f"\nChild relationship added for {child_first_name} {child_last_name}.")
+                child_id = self.choose_person("child")
+                parent1_id = self.choose_person("first parent") if child_id is not None else None
+                parent2_id = self.choose_person("second parent") if parent1_id is not None else None
+                if parent2_id is None:
+                    continue
+                status = self.app.add_child_of_relationship_by_id(child_id, parent1_id, parent2_id)
+                if status == 'created':
+                    print(f"\nChild relationship added for {child_id}.")
+                elif status == 'already_exists':
+                    print(f"\n{parent1_id} and {parent2_id} are already the parents of {child_id}.")
             elif choice == '9':
                 self.clear_screen()
                 print("Displaying family tree...\n")
@@ -133,11 +196,15 @@ class Menu:
             elif choice == '10':
                 self.clear_screen()
                 search_term = self.validate_input("Enter search term: ")
-                result = self.app.search_people(search_term)
-                for record in result:
-                    print(f"{record['first_name']} {record['last_name']} - "
-                          f"{record['birthdate']} - {record['occupation']} - "
-                          f"{record['deathdate']} - {record['description']}")
+                cursor = None
+                while True:
+                    result, cursor = self.app.search_people_page(search_term, limit=20, cursor=cursor)
+                    for record in result:
+                        print(f"{record['first_name']} {record['last_name']} - "
+                              f"{record['birthdate']} - {record['occupation']} - "
+                              f"{record['deathdate']} - {record['description']}")
+                    if cursor is None or input("\nShow more results? (y/n): ").strip().lower() != 'y':
+                        break
             elif choice == '11':
                 self.clear_screen()
                 age = self.validate_input("Enter age: ", data_type=int)
@@ -169,6 +236,112 @@ class Menu:
                 self.clear_screen()
                 count = self.app.count_people()
                 print(f"Total number of people: {count}")
+            elif choice in ('15', '16'):
+                self.clear_screen()
+                first_name = self.validate_input("Enter first name: ")
+                last_name = self.validate_input("Enter last name: ")
+                max_generations = self.validate_input("Enter number of generations (leave blank for all): ", data_type=int, required=False)
+                if choice == '15':
+                    kind, generations = "Ancestors", self.app.iter_ancestors(first_name, last_name, max_generations)
+                else:
+                    kind, generations = "Descendants", self.app.iter_descendants(first_name, last_name, max_generations)
+                print(f"{kind} of {first_name} {last_name}:")
+                found = False
+                for generation, people in generations:
+                    found = True
+                    print(f"Generation {generation}: " + ", ".join(f"{first} {last}" for first, last in people))
+                if not found:
+                    print("None found.")
+            elif choice == '17':
+                self.clear_screen()
+                first_name1 = self.validate_input("Enter first name of first person: ")
+                last_name1 = self.validate_input("Enter last name of first person: ")
+                first_name2 = self.validate_input("Enter first name of second person: ")
+                last_name2 = self.validate_input("Enter last name of second person: ")
+                relationship = self.app.get_relationship(first_name1, last_name1, first_name2, last_name2)
+                if relationship:
+                    print(f"{first_name2} {last_name2} is the {relationship['relationship']} of {first_name1} {last_name1}.")
+                    print("Path: " + " -> ".join(relationship['path']))
+                    if relationship['common_ancestors']:
+                        print("Closest common ancestors: " + ", ".join(relationship['common_ancestors']))
+                else:
+                    print(f"No relationship found between {first_name1} {last_name1} and {first_name2} {last_name2}.")
+            elif choice == '18':
+                self.clear_screen()
+                first_name = self.validate_input("Enter first name: ")
+                last_name = self.validate_input("Enter last name: ")
+                generations_up = self.validate_input("Generations up (leave blank for 2): ", data_type=int, required=False)
+                generations_down = self.validate_input("Generations down (leave blank for 2): ", data_type=int, required=False)
+                path = self.validate_input("Output file (.svg or .png): ")
+                # Imported here: matplotlib is only loaded when a tree is rendered.
+                from render import render_family_tree
+                if render_family_tree(self.app, first_name, last_name, path,
+                                      2 if generations_up is None else generations_up,
+                                      2 if generations_down is None else generations_down):
+                    print(f"Family tree written to {path}.")
+            elif choice == '19':
+                self.clear_screen()
+                metrics = getattr(self.app, 'metrics', None)
+                if metrics is None:
+                    print("Query metrics are not enabled (set METRICS=1 in the .env file).")
+                else:
+                    print("\n".join(metrics.report_lines()))
+                    path = self.validate_input("Dump metrics to JSON file (leave blank to skip): ", required=False)
+                    if path:
+                        metrics.dump(path)
+                        print(f"Metrics written to {path}.")
+            elif choice == '20':
+                self.clear_screen()
+                from family_stats import PopulationStats
+                stats = PopulationStats.from_app(self.app)
+                if stats is not None:
+                    self.print_statistics(stats)
+            elif choice == '21':
+                self.clear_screen()
+                repair = input("Repair duplicate and one-directional relationships? (y/n): ").strip().lower() == 'y'
+                print("Checking the family tree...\n")
+                from integrity import IntegrityChecker
+                checker = IntegrityChecker(self.app, repair=repair)
+                for violation in checker.check():
+                    details = ", ".join(f"{key}={value}" for key, value in violation.items()
+                                        if key not in ("kind", "person_id", "fixable"))
+                    print(f"{violation['kind']}: person {violation['person_id']}" + (f" ({details})" if details else ""))
+                if checker.counts:
+                    print("\n" + ", ".join(f"{kind}: {count}" for kind, count in sorted(checker.counts.items())))
+                    if repair:
+                        print(f"{checker.repaired} relationships repaired.")
+                else:
+                    print("No problems found.")
+            elif choice == '22':
+                self.clear_screen()
+                ranking = self.app.get_persons_with_most_descendants()
+                if ranking:
+                    print("Persons with the most descendants:")
+                    for person, num_descendants in ranking:
+                        print(f"{person} has {num_descendants} descendants")
+                else:
+                    print("No persons found with descendants.")
+            elif choice == '23':
+                self.clear_screen()
+                print("Rebuilding generations, child and descendant counts...")
+                try:
+                    rounds = self.app.rebuild_derived_properties()
+                    print(f"Done ({rounds} generation rounds).")
+                except Exception as e:
+                    print(f"Error rebuilding derived properties: {e}")
+            elif choice == '24':
+                self.clear_screen()
+                path = self.validate_input("File (.ged or .jsonl, add .gz to compress): ")
+                root_id = None
+                if input("Export only the subtree of one person? (y/n): ").strip().lower() == 'y':
+                    root_id = self.choose_person()
+                    if root_id is None:
+                        continue
+                from export import Exporter
+                try:
+                    Exporter(self.app).export(path, root_id=root_id)
+                except Exception as e:
+                    print(f"Error exporting family tree: {e}")
             elif choice == '0':
                 self.clear_screen()
                 print("Exiting application. Goodbye!")
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Size- and TTL-bounded LRU cache whose entries are invalidated by tag.
+
+    Every entry is stored with the tags of the data it was computed from;
+    write methods invalidate just the tags they touch instead of flushing
+    the whole cache.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > self.clock()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        if entry is not None:
+            self._remove(key)
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value, tags=()):
+        if key in self._entries:
+            self._remove(key)
+        expires = self.clock() + self.ttl if self.ttl else None
+        self._entries[key] = (expires, value, frozenset(tags))
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, ()):
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
@@ -0,0 +1,121 @@
+import io
+from collections import OrderedDict
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+LAYOUT_CACHE_SIZE = 128
+
+# (nodes, edges) -> {"positions": {...}, "images": {format: bytes}}
+_layout_cache = OrderedDict()
+
+
+def layered_layout(nodes, edges):
+    """Places every person on the row of their generation, ancestors on top.
+
+    Rows are ordered top-down: each person sits at the mean position of their
+    parents in the row above (barycenter), spouses are kept side by side and
+    ties are broken by name, so the same subtree always gets the same layout.
+    """
+    parents = {}
+    spouses = {}
+    for source, target, relationship in edges:
+        if relationship == "child":
+            parents.setdefault(source, []).append(target)
+        else:
+            spouses.setdefault(source, set()).add(target)
+            spouses.setdefault(target, set()).add(source)
+
+    rows = {}
+    for key, generation in nodes.items():
+        rows.setdefault(generation, []).append(key)
+
+    positions = {}
+    for generation in sorted(rows):
+        def barycenter(key):
+            placed = [positions[parent][0] for parent in parents.get(key, ()) if parent in positions]
+            return sum(placed) / len(placed) if placed else float("inf")
+
+        ordered = []
+        for key in sorted(rows[generation], key=lambda key: (barycenter(key), key)):
+            if key in ordered:
+                continue
+            ordered.append(key)
+            ordered.extend(sorted(spouse for spouse in spouses.get(key, ())
+                                  if nodes.get(spouse) == generation and spouse not in ordered))
+        offset = (len(ordered) - 1) / 2
+        for index, key in enumerate(ordered):
+            positions[key] = (index - offset, -generation)
+    return positions
+
+
+def _cache_entry(nodes, edges):
+    cache_key = (frozenset(nodes.items()), frozenset(edges))
+    entry = _layout_cache.get(cache_key)
+    if entry is None:
+        entry = {"positions": layered_layout(nodes, edges), "images": {}}
+        _layout_cache[cache_key] = entry
+        if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    else:
+        _layout_cache.move_to_end(cache_key)
+    return entry
+
+
+def _draw(nodes, edges, positions, focus, image_format):
+    xs = [x for x, _ in positions.values()]
+    ys = [y for _, y in positions.values()]
+    width = max(6, 1.8 * (max(xs) - min(xs) + 1))
+    height = max(4, 1.4 * (max(ys) - min(ys) + 1))
+    figure = Figure(figsize=(width, height))
+    FigureCanvasAgg(figure)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.set_axis_off()
+
+    for source, target, relationship in edges:
+        (x1, y1), (x2, y2) = positions[source], positions[target]
+        if relationship == "child":
+            axes.plot((x1, x2), (y1, y2), color="gray", linewidth=1, zorder=1)
+        else:
+            axes.plot((x1, x2), (y1, y2), color="firebrick", linestyle="--", linewidth=1, zorder=1)
+
+    for key, (x, y) in positions.items():
+        color = "gold" if key == focus else "lightblue"
+        axes.text(x, y, f"{key[0]}\n{key[1]}", ha="center", va="center", fontsize=8, zorder=2,
+                  bbox={"boxstyle": "round", "facecolor": color, "edgecolor": "gray"})
+
+    axes.set_xlim(min(xs) - 0.8, max(xs) + 0.8)
+    axes.set_ylim(min(ys) - 0.6, max(ys) + 0.6)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def render_family_tree(app, first_name, last_name, output, generations_up=2, generations_down=2, image_format=None):
+    """Renders the family around one person to a file path or binary buffer without a display.
+
+    Only the given number of generations above and below the person (plus
+    spouses) is fetched. image_format is 'svg' or 'png', taken from the file
+    extension when not given. Unchanged subtrees reuse the cached layout and image.
+    """
+    try:
+        if image_format is None:
+            image_format = output.rsplit(".", 1)[-1].lower() if isinstance(output, str) and "." in output else "svg"
+        nodes, edges = app.get_neighborhood(first_name, last_name, generations_up, generations_down)
+
+        entry = _cache_entry(nodes, edges)
+        image = entry["images"].get((image_format, (first_name, last_name)))
+        if image is None:
+            image = _draw(nodes, edges, entry["positions"], (first_name, last_name), image_format)
+            entry["images"][(image_format, (first_name, last_name))] = image
+
+        if isinstance(output, str):
+            with open(output, "wb") as file:
+                file.write(image)
+        else:
+            output.write(image)
+        return output
+
+    except Exception as e:
+        print(f"Error rendering family tree of {first_name} {last_name}: {e}")
+        return None
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import time
+from bisect import bisect_left
+from datetime import date, datetime
+
+import numpy as np
+from dotenv import load_dotenv
+
+MAGIC = b"FTSNAP01"
+ALIGNMENT = 64
+NO_DAY = np.iinfo(np.int32).min
+NO_CODE = -1
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SNAPSHOT_PROPERTIES = ("person_id", "first_name", "last_name", "birthdate", "occupation", "deathdate")
+
+
+def day_number(value):
+    """Days since 1970-01-01 for a date (driver or datetime), NO_DAY for None and the 0001-01-01 'alive' marker."""
+    if value is None:
+        return NO_DAY
+    ordinal = value.to_ordinal() if hasattr(value, "to_ordinal") else value.toordinal()
+    return NO_DAY if ordinal == 1 else ordinal - EPOCH_ORDINAL
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class _Dictionary:
+    # Assigns int32 codes to strings in order of first appearance.
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value):
+        if value is None:
+            return NO_CODE
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def arrays(self):
+        encoded = [value.encode("utf-8") for value in self.codes]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype="u1"), offsets
+
+
+def _csr(sources, targets, size):
+    """Builds (offsets, indices) so that indices[offsets[i]:offsets[i + 1]] are the targets of i."""
+    order = np.argsort(sources, kind="stable")
+    offsets = np.zeros(size + 1, dtype="<i8")
+    np.cumsum(np.bincount(sources, minlength=size), out=offsets[1:])
+    return offsets, targets[order].astype("<i4")
+
+
+def write_snapshot(app, path, page_size=5000, report=print):
+    """Exports all people and relationships of the app into a single snapshot file.
+
+    People are stored sorted by (last_name, first_name) as dictionary-encoded
+    name and occupation columns and int32 day numbers; CHILD_OF and MARRIED
+    become int32 CSR adjacency arrays for parents, children and spouses.
+    Descriptions are not exported. Returns the number of people.
+    """
+    start = time.perf_counter()
+    first_names, last_names, occupations = _Dictionary(), _Dictionary(), _Dictionary()
+    rows = []
+    for person in app.iter_people(properties=SNAPSHOT_PROPERTIES, page_size=page_size):
+        rows.append((person["last_name"], person["first_name"], person["person_id"], day_number(person["birthdate"]),
+                     day_number(person["deathdate"]), occupations.code(person["occupation"])))
+    rows.sort()
+    # Relationships refer to people by person_id; names need not be unique.
+    index = {row[2]: position for position, row in enumerate(rows)}
+    size = len(rows)
+    report(f"{size} people read in {time.perf_counter() - start:.1f}s")
+
+    child_of = ([], [])
+    married = ([], [])
+    for relationship, source, target in app.iter_edges(page_size=page_size):
+        pair = child_of if relationship == "CHILD_OF" else married
+        pair[0].append(index[source])
+        pair[1].append(index[target])
+    report(f"{len(child_of[0])} child-of and {len(married[0])} married relationships read")
+
+    children, parents = (np.array(column, dtype="<i4") for column in child_of)
+    person, spouse = (np.array(column, dtype="<i4") for column in married)
+    arrays = {
+        "first_name": np.array([first_names.code(row[1]) for row in rows], dtype="<i4"),
+        "last_name": np.array([last_names.code(row[0]) for row in rows], dtype="<i4"),
+        "birth_day": np.array([row[3] for row in rows], dtype="<i4"),
+        "death_day": np.array([row[4] for row in rows], dtype="<i4"),
+        "occupation": np.array([row[5] for row in rows], dtype="<i4"),
+    }
+    del rows, index
+    for name, dictionary in (("first_names", first_names), ("last_names", last_names), ("occupations", occupations)):
+        arrays[f"{name}_data"], arrays[f"{name}_offsets"] = dictionary.arrays()
+    arrays["parents_offsets"], arrays["parents"] = _csr(children, parents, size)
+    arrays["children_offsets"], arrays["children"] = _csr(parents, children, size)
+    arrays["spouses_offsets"], arrays["spouses"] = _csr(np.concatenate([person, spouse]),
+                                                        np.concatenate([spouse, person]), size)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "length": len(array)}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"version": 1, "created": datetime.now().isoformat(timespec="seconds"),
+                         "people": size, "child_of": len(children), "married": len(person),
+                         "arrays": layout}).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array([len(header)], dtype="<u8").tobytes())
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    report(f"Snapshot written to {path} in {time.perf_counter() - start:.1f}s")
+    return size
+
+
+class Snapshot:
+    """Read-only view of a snapshot file; all columns are memory-mapped, nothing is loaded up front.
+
+    Person i is the i-th person in (last_name, first_name) order. Columns
+    (first_name / last_name / occupation codes, birth_day / death_day) are
+    NumPy arrays usable for vectorized statistics; parents(i), children(i) and
+    spouses(i) return index arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype="u1", mode="r")
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a family tree snapshot")
+        header_length = int(self._map[len(MAGIC):len(MAGIC) + 8].view("<u8")[0])
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self._map[header_start:header_start + header_length]))
+        data_start = _align(header_start + header_length)
+
+        self._arrays = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            self._arrays[name] = self._map[start:start + spec["length"] * dtype.itemsize].view(dtype)
+        self.first_name_codes = self._arrays["first_name"]
+        self.last_name_codes = self._arrays["last_name"]
+        self.occupation_codes = self._arrays["occupation"]
+        self.birth_days = self._arrays["birth_day"]
+        self.death_days = self._arrays["death_day"]
+
+    def __len__(self):
+        return self.header["people"]
+
+    def close(self):
+        self._arrays.clear()
+        self._map = None
+
+    def _string(self, dictionary, code):
+        if code == NO_CODE:
+            return None
+        offsets = self._arrays[f"{dictionary}_offsets"]
+        return bytes(self._arrays[f"{dictionary}_data"][offsets[code]:offsets[code + 1]]).decode("utf-8")
+
+    def dictionary(self, name):
+        """Decodes one of 'first_names', 'last_names', 'occupations' into a list indexed by code."""
+        offsets = self._arrays[f"{name}_offsets"]
+        data = bytes(self._arrays[f"{name}_data"])
+        return [data[offsets[code]:offsets[code + 1]].decode("utf-8") for code in range(len(offsets) - 1)]
+
+    def key(self, index):
+        return (self._string("first_names", self.first_name_codes[index]),
+                self._string("last_names", self.last_name_codes[index]))
+
+    def name(self, index):
+        return " ".join(self.key(index))
+
+    def occupation(self, index):
+        return self._string("occupations", self.occupation_codes[index])
+
+    def birthdate(self, index):
+        return self._date(self.birth_days[index])
+
+    def deathdate(self, index):
+        return self._date(self.death_days[index])
+
+    @staticmethod
+    def _date(day):
+        return None if day == NO_DAY else date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+    def index_of(self, first_name, last_name):
+        """Binary search on the sort order; returns the person's index or None."""
+        position = bisect_left(range(len(self)), (last_name, first_name), key=lambda index: self.key(index)[::-1])
+        if position < len(self) and self.key(position) == (first_name, last_name):
+            return position
+        return None
+
+    def _neighbours(self, relation, index):
+        offsets = self._arrays[f"{relation}_offsets"]
+        return self._arrays[relation][offsets[index]:offsets[index + 1]]
+
+    def parents(self, index):
+        return self._neighbours("parents", index)
+
+    def children(self, index):
+        return self._neighbours("children", index)
+
+    def spouses(self, index):
+        return self._neighbours("spouses", index)
+
+    def child_counts(self):
+        return np.diff(self._arrays["children_offsets"]).astype(np.int32)
+
+    def iter_ancestors(self, index, max_generations=None):
+        return self._iter_generations("parents", index, max_generations)
+
+    def iter_descendants(self, index, max_generations=None):
+        return self._iter_generations("children", index, max_generations)
+
+    def _iter_generations(self, relation, index, max_generations):
+        # Breadth-first like traversal.walk_generations, one vectorized CSR gather per generation.
+        offsets, neighbours = self._arrays[f"{relation}_offsets"], self._arrays[relation]
+        visited = np.zeros(len(self), dtype=bool)
+        visited[index] = True
+        frontier = np.array([index], dtype=np.int64)
+        generation = 0
+        while len(frontier) and (max_generations is None or generation < max_generations):
+            generation += 1
+            starts, lengths = offsets[frontier], offsets[frontier + 1] - offsets[frontier]
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            found = np.unique(neighbours[positions])
+            found = found[~visited[found]]
+            if not len(found):
+                return
+            visited[found] = True
+            yield generation, found
+            frontier = found.astype(np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the family tree database into a memory-mappable snapshot file.")
+    parser.add_argument("path")
+    parser.add_argument("--page-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from function import FamilyTreeApp
+    load_dotenv()
+    app = FamilyTreeApp(os.getenv("CONNECTION_STRING_DB"), os.getenv("USERNAME_DB"), os.getenv("PASSWORD_DB"))
+    try:
+        write_snapshot(app, args.path, page_size=args.page_size)
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
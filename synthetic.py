@@ -0,0 +1,171 @@
+import math
+import random
+from datetime import date
+
+from importer import CHILD_OF, MARRIED, PEOPLE
+
+FIRST_NAMES = {
+    "m": ["John", "Mike", "Tom", "Peter", "Paul", "David", "James", "Robert", "Daniel", "Lukas", "Jonas", "Felix",
+          "Max", "Leon", "Noah", "Elias", "Ben", "Samuel", "Anton", "Oskar", "Karl", "Emil", "Henry", "Jakob"],
+    "f": ["Jane", "Sarah", "Emily", "Anna", "Laura", "Lisa", "Julia", "Mary", "Emma", "Mia", "Hannah", "Lea",
+          "Sophie", "Marie", "Clara", "Lena", "Ida", "Greta", "Paula", "Frieda", "Alice", "Olivia", "Nora", "Ella"],
+}
+LAST_NAMES = ["Doe", "Smith", "Miller", "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner",
+              "Becker", "Schulz", "Hoffmann", "Koch", "Richter", "Klein", "Wolf", "Neumann", "Schwarz", "Braun",
+              "Zimmermann", "Krüger", "Hartmann", "Lange", "Brown", "Taylor", "Wilson", "Clark", "Lewis", "Walker"]
+OCCUPATIONS = ["Engineer", "Doctor", "Teacher", "Nurse", "Farmer", "Carpenter", "Lawyer", "Artist", "Architect",
+               "Baker", "Student", "Homemaker", "Accountant", "Mechanic", "Scientist", "Chef", "Writer", "Pilot"]
+# Cut-off for deaths and births, fixed so that a seed always gives the same tree.
+DEFAULT_TODAY = date(2024, 1, 1)
+
+
+def _poisson(rng, mean):
+    # Knuth's method, fine for the small means used as fertility.
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _random_date(rng, year):
+    return date(year, rng.randint(1, 12), rng.randint(1, 28))
+
+
+def generate_family_tree(seed=0, generations=4, founders=100, fertility=2.5, marriage_rate=0.8,
+                         first_names=FIRST_NAMES, last_names=LAST_NAMES, occupations=OCCUPATIONS,
+                         unique_names=True, start_year=1850, generation_gap=(20, 40), lifespan=(50, 95),
+                         today=DEFAULT_TODAY, max_people=None):
+    """Yields (kind, row) for a random but reproducible family tree, kind being PEOPLE, MARRIED or CHILD_OF.
+
+    Every founder and descendant marries a newcomer with probability
+    marriage_rate; couples get a Poisson(fertility) number of children.
+    Rows are streamed generation by generation and only one generation is
+    kept in memory, so millions of people are fine. Each row is yielded after
+    the people it references. MARRIED rows ({"person1", "person2"}) and
+    CHILD_OF rows ({"child", "parent1", "parent2"}) reference people by their
+    position among the PEOPLE rows, counting from 0, because names need not be
+    unique. Smaller name pools give more name collisions;
+    with unique_names repeated full names get a numbered suffix
+    ("Anna 2 Weber"), otherwise they are yielded as they are. Nobody is born
+    or dies after today, which defaults to DEFAULT_TODAY.
+    """
+    rng = random.Random(seed)
+    name_counts = {}
+    emitted = 0
+
+    def new_person(sex, last_name, year):
+        nonlocal emitted
+        first_name = rng.choice(first_names[sex])
+        if unique_names:
+            count = name_counts.get((first_name, last_name), 0) + 1
+            name_counts[(first_name, last_name)] = count
+            if count > 1:
+                first_name = f"{first_name} {count}"
+        birthdate = _random_date(rng, year)
+        death_year = year + rng.randint(*lifespan)
+        deathdate = _random_date(rng, death_year) if death_year < today.year else None
+        emitted += 1
+        return emitted - 1, {"first_name": first_name, "last_name": last_name, "birthdate": birthdate,
+                "occupation": rng.choice(occupations), "deathdate": deathdate, "description": None}
+
+    def full():
+        return max_people is not None and emitted >= max_people
+
+    # One generation: (index, last name, sex, birth year) of everyone born into the tree.
+    current = []
+    for _ in range(founders):
+        if full():
+            return
+        sex = rng.choice("mf")
+        index, person = new_person(sex, rng.choice(last_names), start_year + rng.randint(0, 10))
+        current.append((index, person["last_name"], sex, person["birthdate"].year))
+        yield PEOPLE, person
+
+    for _ in range(generations):
+        following = []
+        for index, last_name, sex, year in current:
+            if full():
+                return
+            if rng.random() >= marriage_rate:
+                continue
+            spouse_sex = "f" if sex == "m" else "m"
+            spouse_index, spouse = new_person(spouse_sex, rng.choice(last_names), year + rng.randint(-5, 5))
+            yield PEOPLE, spouse
+            yield MARRIED, {"person1": index, "person2": spouse_index}
+
+            family_name = last_name if sex == "m" else spouse["last_name"]
+            for _ in range(_poisson(rng, fertility)):
+                if full():
+                    return
+                child_sex = rng.choice("mf")
+                child_index, child = new_person(child_sex, family_name,
+                                                max(year, spouse["birthdate"].year) + rng.randint(*generation_gap))
+                if child["birthdate"] > today:
+                    emitted -= 1
+                    continue
+                yield PEOPLE, child
+                yield CHILD_OF, {"child": child_index, "parent1": index, "parent2": spouse_index}
+                following.append((child_index, child["last_name"], child_sex, child["birthdate"].year))
+        if not following:
+            return
+        current = following
+
+
+def load_synthetic_tree(app, batch_size=1000, sample_size=1000, seed=0, **options):
+    """Writes a generated tree through the app's batch methods.
+
+    Relationships are written by the person ids the people batches return, so
+    trees without unique names load completely. Returns the number of people
+    and of relationships actually created per kind, and a uniform sample of up
+    to sample_size (first_name, last_name) keys, e.g. as benchmark arguments.
+    """
+    person_ids = []
+    relationship_rows = {
+        MARRIED: lambda row: {"person1_id": person_ids[row["person1"]], "person2_id": person_ids[row["person2"]]},
+        CHILD_OF: lambda row: {"child_id": person_ids[row["child"]], "parent1_id": person_ids[row["parent1"]],
+                               "parent2_id": person_ids[row["parent2"]]},
+    }
+    writers = {PEOPLE: app.write_people_batch, MARRIED: app.write_married_batch,
+               CHILD_OF: lambda rows: app.write_child_of_batch(rows, update_derived=False)}
+    buffers = {kind: [] for kind in writers}
+    counts = {kind: 0 for kind in writers}
+    sample = []
+    rng = random.Random(seed)
+    generated = 0
+
+    def flush(kind):
+        if not buffers[kind]:
+            return
+        if kind == PEOPLE:
+            ids = writers[PEOPLE](buffers[PEOPLE])
+            person_ids.extend(ids)
+            counts[PEOPLE] += len(ids)
+        else:
+            statuses = writers[kind]([relationship_rows[kind](row) for row in buffers[kind]])
+            counts[kind] += statuses.count("created")
+        buffers[kind] = []
+
+    for kind, row in generate_family_tree(seed=seed, **options):
+        buffers[kind].append(row)
+        if kind == PEOPLE:
+            generated += 1
+            key = (row["first_name"], row["last_name"])
+            if len(sample) < sample_size:
+                sample.append(key)
+            else:
+                index = rng.randrange(generated)
+                if index < sample_size:
+                    sample[index] = key
+        if len(buffers[kind]) >= batch_size:
+            # Relationship rows need the ids of the people still buffered.
+            if kind != PEOPLE:
+                flush(PEOPLE)
+            flush(kind)
+
+    for kind in (PEOPLE, MARRIED, CHILD_OF):
+        flush(kind)
+    if counts[CHILD_OF]:
+        app.rebuild_derived_properties()
+    return counts, sample
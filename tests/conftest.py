@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def neo4j_app():
+    """A FamilyTreeApp on an empty Neo4j test database.
+
+    The tests delete all data, so they only run against the database named by
+    TEST_CONNECTION_STRING_DB, TEST_USERNAME_DB and TEST_PASSWORD_DB.
+    """
+    connection_string = os.getenv("TEST_CONNECTION_STRING_DB")
+    username = os.getenv("TEST_USERNAME_DB")
+    password = os.getenv("TEST_PASSWORD_DB")
+    if not connection_string or not username or not password:
+        pytest.skip("no Neo4j test database configured (TEST_CONNECTION_STRING_DB, TEST_USERNAME_DB, TEST_PASSWORD_DB)")
+    from function import FamilyTreeApp
+    app = FamilyTreeApp(connection_string, username, password)
+    if not app.connected:
+        pytest.skip("Neo4j test database not reachable")
+    app.deleteEverything()
+    yield app
+    app.deleteEverything()
+    app.close()
@@ -0,0 +1,57 @@
+import io
+import json
+
+from batch import BatchRunner
+from memory_backend import InMemoryFamilyTreeApp
+
+
+def _run(lines, batch_size=500):
+    app = InMemoryFamilyTreeApp()
+    output = io.StringIO()
+    counts = BatchRunner(app, output, batch_size).run(json.dumps(line) if isinstance(line, dict) else line
+                                                      for line in lines)
+    return app, counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_results_follow_the_order_of_the_commands():
+    app, counts, results = _run([
+        {"op": "create_person", "first_name": "Anna", "last_name": "Muster", "birthdate": "1950-01-01"},
+        {"op": "create_person", "first_name": "Ben", "last_name": "Muster", "birthdate": "1952-01-01"},
+        {"op": "add_married", "person1_first_name": "Anna", "person1_last_name": "Muster",
+         "person2_first_name": "Ben", "person2_last_name": "Muster"},
+        {"op": "unknown"},
+        "# comment",
+        {"op": "count_people"},
+        "not json",
+        {"op": "delete_everything"},
+        {"op": "siblings", "first_name": "Anna", "last_name": "Muster"},
+    ], batch_size=2)
+
+    assert [result["line"] for result in results] == [1, 2, 3, 4, 6, 7, 8, 9]
+    assert [result["ok"] for result in results] == [True, True, True, False, True, False, False, True]
+    assert results[0]["result"] == {"person_id": 1}
+    assert results[2]["result"] == {"status": "created"}
+    assert results[3]["error"] == "unknown op 'unknown'"
+    assert results[4]["result"] == 2
+    assert counts == {"commands": 8, "failed": 3}
+    assert app.count_people() == 2
+
+
+def test_writes_by_id_and_relationship_statuses():
+    app, counts, results = _run([
+        {"op": "insert_example_data"},
+        {"op": "create_person", "first_name": "Lena", "last_name": "Doe", "birthdate": "1999-05-01"},
+        {"op": "add_child_of", "child_id": 17, "parent1_id": 3, "parent2_id": 4},
+        {"op": "add_child_of", "child_id": 17, "parent1_id": 3, "parent2_id": 4},
+        {"op": "update_person", "person_id": 17, "occupation": "Student"},
+        {"op": "add_married", "person1_id": 17, "person2_id": 99},
+        {"op": "people_over_age", "age": 200},
+    ])
+
+    assert [result.get("result") for result in results] == [
+        None, {"person_id": 17}, {"status": "created"}, {"status": "already_exists"}, None,
+        None, {"count": 0, "people": []},
+    ]
+    assert results[5]["error"] == "relationship not written"
+    assert counts["failed"] == 1
+    assert app.get_person(17)["occupation"] == "Student"
@@ -0,0 +1,112 @@
+from datetime import date
+
+from family_stats import PopulationStats
+
+EPOCH = date(1970, 1, 1)
+
+
+def test_population_columns_counts_epoch_days(neo4j_app):
+    neo4j_app.create_person("Anna", "Muster", date(1950, 4, 1), "Teacher", date(2020, 2, 29))
+    neo4j_app.create_person("Ben", "Muster", date(1969, 12, 31), None)
+
+    columns = neo4j_app.get_population_columns()
+
+    assert columns is not None
+    days = dict(zip(columns["names"], zip(columns["birth_days"], columns["death_days"])))
+    assert days["Anna Muster"] == ((date(1950, 4, 1) - EPOCH).days, (date(2020, 2, 29) - EPOCH).days)
+    assert days["Ben Muster"][0] == -1
+    assert len(PopulationStats.from_columns(columns)) == 2
+
+
+def test_remove_duplicate_edges_recounts_child_count(neo4j_app):
+    mother = neo4j_app.create_person("Eva", "Muster", date(1950, 1, 1), None)
+    father = neo4j_app.create_person("Karl", "Muster", date(1948, 1, 1), None)
+    child = neo4j_app.create_person("Lena", "Muster", date(1975, 1, 1), None)
+    assert neo4j_app.add_child_of_relationship_by_id(child, mother, father) == "created"
+    with neo4j_app.driver.session() as session:
+        session.run("MATCH (c:Person {person_id: $child}), (p:Person {person_id: $mother}) CREATE (c)-[:CHILD_OF]->(p)",
+                    child=child, mother=mother).consume()
+    neo4j_app.rebuild_derived_properties()
+    assert neo4j_app.get_person(mother)["child_count"] == 2
+
+    assert neo4j_app.remove_duplicate_edges([child]) == 1
+
+    assert neo4j_app.get_person(mother)["child_count"] == 1
+    assert neo4j_app.get_person(father)["child_count"] == 1
+    assert sorted(neo4j_app.get_persons_with_most_children()) == [("Eva Muster", 1), ("Karl Muster", 1)]
+
+
+def test_delete_person_by_name_invalidates_every_match(neo4j_app):
+    neo4j_app.enable_cache()
+    ids = {}
+    for first_name, last_name, year in [("Eva", "Alt", 1940), ("Karl", "Alt", 1938), ("Rita", "Neu", 1945),
+                                        ("Otto", "Neu", 1943), ("Tom", "Alt", 1965), ("Tom", "Neu", 1970),
+                                        ("Ida", "Alt", 1967), ("Udo", "Neu", 1972)]:
+        ids[first_name, last_name] = neo4j_app.create_person(first_name, last_name, date(year, 1, 1), None)
+    # Two people called "Tom Doe" in different families.
+    with neo4j_app.driver.session() as session:
+        session.run("MATCH (p:Person {first_name: 'Tom'}) SET p.last_name = 'Doe'").consume()
+    for child, parents in [(("Tom", "Alt"), (("Eva", "Alt"), ("Karl", "Alt"))), (("Ida", "Alt"), (("Eva", "Alt"), ("Karl", "Alt"))),
+                           (("Tom", "Neu"), (("Rita", "Neu"), ("Otto", "Neu"))), (("Udo", "Neu"), (("Rita", "Neu"), ("Otto", "Neu")))]:
+        assert neo4j_app.add_child_of_relationship_by_id(ids[child], ids[parents[0]], ids[parents[1]]) == "created"
+    assert neo4j_app.get_siblings("Ida", "Alt") == ["Tom Doe"]
+    assert neo4j_app.get_siblings("Udo", "Neu") == ["Tom Doe"]
+
+    neo4j_app.delete_person("Tom", "Doe")
+
+    assert neo4j_app.find_person_ids("Tom", "Doe") == []
+    assert neo4j_app.get_siblings("Ida", "Alt") == []
+    assert neo4j_app.get_siblings("Udo", "Neu") == []
+
+
+def test_add_reverse_married_edges_counts_created_edges(neo4j_app):
+    anna = neo4j_app.create_person("Anna", "Muster", date(1950, 4, 1), None)
+    ben = neo4j_app.create_person("Ben", "Muster", date(1949, 3, 1), None)
+    with neo4j_app.driver.session() as session:
+        session.run("MATCH (a:Person {person_id: $anna}), (b:Person {person_id: $ben}) CREATE (a)-[:MARRIED]->(b)",
+                    anna=anna, ben=ben).consume()
+
+    assert neo4j_app.add_reverse_married_edges([(anna, ben), (anna, ben)]) == 1
+    assert neo4j_app.add_reverse_married_edges([(anna, ben)]) == 0
+
+
+def _load_cousin_marriage(app, **options):
+    # Grandparents G1/G2 -> siblings A and B -> cousins C and D -> their child E (pedigree collapse).
+    names = ["G1", "G2", "A", "A2", "B", "B2", "C", "D", "E"]
+    ids = dict(zip(names, app.write_people_batch([{"first_name": name, "last_name": "Muster", "birthdate": None,
+                                                    "occupation": None} for name in names])))
+    rows = [("A", "G1", "G2"), ("B", "G1", "G2"), ("C", "A", "A2"), ("D", "B", "B2"), ("E", "C", "D")]
+    statuses = app.write_child_of_batch([{"child_id": ids[child], "parent1_id": ids[parent1], "parent2_id": ids[parent2]}
+                                         for child, parent1, parent2 in rows], **options)
+    assert statuses == ["created"] * len(rows)
+    return ids
+
+
+def test_child_of_batch_updates_derived_properties_once(neo4j_app):
+    ids = _load_cousin_marriage(neo4j_app)
+
+    grandparent = neo4j_app.get_person(ids["G1"])
+    assert (grandparent["generation"], grandparent["child_count"], grandparent["descendant_count"]) == (0, 2, 5)
+    assert neo4j_app.get_person(ids["E"])["generation"] == 3
+
+
+def test_child_of_batch_can_defer_derived_properties(neo4j_app):
+    ids = _load_cousin_marriage(neo4j_app, update_derived=False)
+    assert neo4j_app.get_person(ids["G1"])["child_count"] == 2
+    assert neo4j_app.get_person(ids["E"])["generation"] == 0
+
+    neo4j_app.rebuild_derived_properties()
+
+    assert neo4j_app.get_person(ids["E"])["generation"] == 3
+    assert neo4j_app.get_person(ids["G1"])["descendant_count"] == 5
+
+
+def test_add_child_of_keeps_derived_properties_with_pedigree_collapse(neo4j_app):
+    ids = _load_cousin_marriage(neo4j_app)
+    child = neo4j_app.create_person("F", "Muster", None, None)
+
+    assert neo4j_app.add_child_of_relationship_by_id(child, ids["C"], ids["D"]) == "created"
+
+    assert neo4j_app.get_person(ids["G1"])["descendant_count"] == 6
+    assert neo4j_app.get_person(ids["C"])["child_count"] == 2
+    assert neo4j_app.get_person(child)["generation"] == 3
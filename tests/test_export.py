@@ -0,0 +1,50 @@
+from collections import Counter
+
+import pytest
+
+from export import Exporter, import_export
+from memory_backend import InMemoryFamilyTreeApp
+
+PERSON_FIELDS = ("first_name", "last_name", "birthdate", "occupation", "deathdate", "description")
+
+
+def _people(app):
+    return sorted(tuple(row.values()) for row in app.iter_people(PERSON_FIELDS))
+
+
+def _relationships(app):
+    # iter_edges yields a marriage once; the graph stores it in both directions.
+    names = {row["person_id"]: (row["first_name"], row["last_name"]) for row in app.iter_people(("person_id", "first_name", "last_name"))}
+    return sorted((kind, names[a], names[b]) for kind, a, b in app.iter_edges())
+
+
+@pytest.mark.parametrize("file_name", ["tree.ged", "tree.jsonl", "tree.jsonl.gz"])
+def test_export_import_round_trip_keeps_people_and_relationships(tmp_path, file_name):
+    source = InMemoryFamilyTreeApp()
+    source.insert_example_data()
+    path = str(tmp_path / file_name)
+
+    stats = Exporter(source, report=lambda message: None).export(path)
+    target = InMemoryFamilyTreeApp()
+    new_ids = import_export(target, path, report=lambda message: None)
+
+    assert stats["people"] == len(new_ids) == target.count_people() == 16
+    assert Counter(kind for kind, _, _ in target.iter_edges()) == {"CHILD_OF": 16, "MARRIED": 7}
+    assert _people(target) == _people(source)
+    assert _relationships(target) == _relationships(source)
+
+
+def test_subtree_export_skips_relationships_outside_the_file(tmp_path):
+    source = InMemoryFamilyTreeApp()
+    source.insert_example_data()
+    root_id = source.find_person_ids("John", "Doe")[0]
+    path = str(tmp_path / "subtree.jsonl")
+
+    Exporter(source, report=lambda message: None).export(path, root_id=root_id)
+    target = InMemoryFamilyTreeApp()
+    import_export(target, path, report=lambda message: None)
+
+    names = sorted(f"{row['first_name']} {row['last_name']}" for row in target.iter_people(("first_name", "last_name")))
+    assert names == ["Emily Doe", "Jane Doe", "John Doe", "Mike Doe", "Olivia Williams", "Sarah Doe", "Thomas Miller"]
+    assert target.get_relationship("John", "Doe", "Karl", "Washington") is None
+    assert target.get_relationship("Mike", "Doe", "Sarah", "Doe")["relationship"] == "sibling"
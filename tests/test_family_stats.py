@@ -0,0 +1,52 @@
+from datetime import date
+
+from family_stats import PopulationStats
+from memory_backend import InMemoryFamilyTreeApp
+from snapshot import Snapshot, write_snapshot
+
+TODAY = date(2026, 1, 1)
+
+
+def _example_app():
+    app = InMemoryFamilyTreeApp()
+    app.insert_example_data()
+    return app
+
+
+def test_statistics_of_example_data():
+    stats = PopulationStats.from_app(_example_app())
+
+    assert len(stats) == 16
+    assert stats.children_distribution() == {0: 10, 2: 2, 3: 4}
+    assert sorted(stats.top_parents(1)) == [("Jane Doe", 3), ("John Doe", 3), ("Peter Jones", 3), ("Susan Jones", 3)]
+    assert stats.occupation_frequencies(1) == [("Lawyer", 2)]
+    histogram = stats.age_histogram(today=TODAY)
+    assert sum(count for _, _, count in histogram) == 16
+    assert stats.count_over_age(49, today=TODAY) == sum(count for lower, _, count in histogram if lower >= 50)
+    assert set(stats.lifespan_percentiles_by_decade()) == {1880, 1890}
+
+
+def test_results_are_plain_python_values():
+    stats = PopulationStats.from_app(_example_app())
+
+    for occupation, count in stats.occupation_frequencies():
+        assert type(occupation) is str and type(count) is int
+    for name, count in stats.top_parents(2):
+        assert type(name) is str and type(count) is int
+    assert all(type(key) is int and type(value) is int for key, value in stats.children_distribution().items())
+
+
+def test_snapshot_and_app_give_the_same_statistics(tmp_path):
+    app = _example_app()
+    path = str(tmp_path / "tree.snapshot")
+    write_snapshot(app, path, report=lambda message: None)
+    snapshot = Snapshot(path)
+    try:
+        from_app, from_snapshot = PopulationStats.from_app(app), PopulationStats.from_snapshot(snapshot)
+        assert from_snapshot.children_distribution() == from_app.children_distribution()
+        assert sorted(from_snapshot.top_parents(1)) == sorted(from_app.top_parents(1))
+        assert sorted(from_snapshot.occupation_frequencies()) == sorted(from_app.occupation_frequencies())
+        assert from_snapshot.count_over_age(50, today=TODAY) == from_app.count_over_age(50, today=TODAY)
+        assert from_snapshot.lifespan_percentiles_by_decade() == from_app.lifespan_percentiles_by_decade()
+    finally:
+        snapshot.close()
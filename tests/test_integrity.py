@@ -0,0 +1,56 @@
+from collections import Counter
+from datetime import date
+
+from integrity import IntegrityChecker
+from memory_backend import InMemoryFamilyTreeApp
+
+
+def _row(person_id, parents=(), spouses_out=(), spouses_in=(), birthdate=None, deathdate=None):
+    return {"person_id": person_id, "birthdate": birthdate, "deathdate": deathdate, "parents": list(parents),
+            "spouses_out": list(spouses_out), "spouses_in": list(spouses_in)}
+
+
+def test_example_data_is_consistent():
+    app = InMemoryFamilyTreeApp()
+    app.insert_example_data()
+    checker = IntegrityChecker(app, repair=True)
+
+    assert list(checker.check()) == []
+    assert checker.repaired == 0
+
+
+def test_violations_are_reported_and_counted():
+    checker = IntegrityChecker(InMemoryFamilyTreeApp())
+    rows = [
+        _row(1, birthdate=date(1950, 1, 1), deathdate=date(1940, 1, 1)),
+        _row(2, parents=[3, 4, 5]),
+        _row(3, parents=[6], birthdate=date(1960, 1, 1)),
+        _row(4, parents=[4]),
+        _row(5, parents=[6, 6]),
+        _row(6, parents=[3], birthdate=date(1970, 1, 1)),
+    ]
+
+    violations = list(checker.check_rows(rows))
+
+    assert Counter(violation["kind"] for violation in violations) == checker.counts == {
+        "died_before_born": 1, "too_many_parents": 1, "child_of_cycle": 2, "duplicate_child_of": 1,
+        "born_before_parent": 1,
+    }
+    cycles = [violation for violation in violations if violation["kind"] == "child_of_cycle"]
+    assert sorted(violation.get("person_ids") for violation in cycles) == [[3, 6], [4]]
+    assert [violation["person_id"] for violation in violations if violation["fixable"]] == [5]
+
+
+def test_repair_adds_missing_reverse_marriages_in_batches():
+    app = InMemoryFamilyTreeApp()
+    ids = [app.create_person(f"Person{index}", "Muster", date(1950, 1, 1), None) for index in range(4)]
+    checker = IntegrityChecker(app, repair=True, batch_size=1)
+    rows = [_row(ids[0], spouses_out=[ids[1]]), _row(ids[1], spouses_in=[ids[0]]),
+            _row(ids[2], spouses_out=[ids[3]]), _row(ids[3], spouses_in=[ids[2]])]
+
+    violations = list(checker.check_rows(rows))
+
+    assert [violation["kind"] for violation in violations] == ["one_directional_married"] * 2
+    assert checker.repaired == 2
+    assert app.get_relationship("Person1", "Muster", "Person0", "Muster")["relationship"] == "spouse"
+    assert app.add_reverse_married_edges([(ids[0], ids[1]), (ids[2], ids[3])]) == 0
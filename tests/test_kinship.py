@@ -0,0 +1,33 @@
+from kinship import kinship_label
+from memory_backend import InMemoryFamilyTreeApp
+
+
+def test_kinship_label_names_cousins_and_removals():
+    assert kinship_label(2, 2) == "first cousin"
+    assert kinship_label(3, 4) == "second cousin once removed"
+    assert kinship_label(2, 4) == "first cousin twice removed"
+    assert kinship_label(1, 3) == "great-niece/nephew"
+    assert kinship_label(4, 0) == "great-great-grandparent"
+
+
+def test_kinship_label_ordinal_suffixes():
+    assert kinship_label(11, 11) == "10th cousin"
+    assert kinship_label(12, 12) == "11th cousin"
+    assert kinship_label(14, 14) == "13th cousin"
+    assert kinship_label(22, 22) == "21st cousin"
+    assert kinship_label(23, 23) == "22nd cousin"
+    assert kinship_label(24, 24) == "23rd cousin"
+    assert kinship_label(112, 112) == "111th cousin"
+
+
+def test_get_relationship_on_example_data():
+    app = InMemoryFamilyTreeApp()
+    app.insert_example_data()
+
+    cousins = app.get_relationship("Jacob", "Brown", "Mike", "Doe")
+    assert cousins["relationship"] == "first cousin"
+    assert sorted(cousins["common_ancestors"]) == ["Karl Washington", "Linda Washington"]
+    assert cousins["path"][0] == "Jacob Brown" and cousins["path"][-1] == "Mike Doe"
+    assert app.get_relationship("Jacob", "Brown", "Mark", "Smith")["relationship"] == "sibling-in-law"
+    assert app.get_relationship("Emma", "Brown", "Mike", "Doe")["relationship"] == "first cousin by marriage"
+    assert app.get_relationship("Jacob", "Brown", "Nobody", "Known") is None
@@ -0,0 +1,64 @@
+from datetime import date
+
+from memory_backend import InMemoryFamilyTreeApp
+
+
+def _example_app():
+    app = InMemoryFamilyTreeApp()
+    app.insert_example_data()
+    return app
+
+
+def test_example_data_generations_and_counts():
+    app = _example_app()
+
+    assert app.count_people() == 16
+    assert app.get_people_of_generation(1) == ["John Doe", "Susan Jones"]
+    assert len(app.get_people_of_generation(2)) == 6
+    assert app.get_persons_with_most_descendants(2) == [("Karl Washington", 8), ("Linda Washington", 8)]
+    assert sorted(app.get_siblings("Mike", "Doe")) == ["Emily Doe", "Sarah Doe"]
+
+
+def test_generations_follow_new_parents():
+    app = _example_app()
+    child = app.create_person("Lena", "Doe", date(2010, 1, 1), None)
+    assert app.get_people_of_generation(3) == []
+
+    assert app.add_child_of_relationship_by_id(child, app.find_person_ids("Mike", "Doe")[0],
+                                               app.find_person_ids("Olivia", "Williams")[0]) == "created"
+
+    assert app.get_people_of_generation(3) == ["Lena Doe"]
+    assert "Lena Doe" not in app.get_people_of_generation(0)
+
+
+def test_people_on_a_child_of_cycle_have_no_generation():
+    app = InMemoryFamilyTreeApp()
+    a, b, c, d, e = (app.create_person(name, "Loop", None, None) for name in "ABCDE")
+    assert app.add_child_of_relationship_by_id(a, b, c) == "created"
+    assert app.add_child_of_relationship_by_id(b, a, d) == "created"
+    assert app.add_child_of_relationship_by_id(e, c, d) == "created"
+
+    assert app.get_people_of_generation(0) == ["C Loop", "D Loop"]
+    assert app.get_people_of_generation(1) == ["E Loop"]
+    assert app.get_people_of_generation(2) == []
+
+
+def test_get_person_of_unknown_id_is_none():
+    app = _example_app()
+
+    assert app.get_person(999) is None
+    app.delete_person_by_id(999)
+    assert app.count_people() == 16
+
+
+def test_update_and_delete_act_on_everyone_of_a_name():
+    app = InMemoryFamilyTreeApp()
+    first = app.create_person("Tom", "Doe", date(1965, 1, 1), None)
+    second = app.create_person("Tom", "Doe", date(1970, 1, 1), None)
+
+    app.update_person("Tom", "Doe", occupation="Baker")
+    assert [app.get_person(person_id)["occupation"] for person_id in (first, second)] == ["Baker", "Baker"]
+
+    app.delete_person("Tom", "Doe")
+    assert app.find_person_ids("Tom", "Doe") == []
+    assert app.count_people() == 0
@@ -0,0 +1,29 @@
+from datetime import date
+
+from memory_backend import InMemoryFamilyTreeApp
+from snapshot import Snapshot, write_snapshot
+
+
+def test_snapshot_of_example_data(tmp_path):
+    app = InMemoryFamilyTreeApp()
+    app.insert_example_data()
+    path = str(tmp_path / "tree.snapshot")
+
+    assert write_snapshot(app, path, report=lambda message: None) == 16
+    snapshot = Snapshot(path)
+    try:
+        john = snapshot.index_of("John", "Doe")
+        assert len(snapshot) == 16
+        assert snapshot.name(john) == "John Doe"
+        assert snapshot.birthdate(john) == date(1950, 7, 15)
+        assert snapshot.occupation(john) == "Retired Engineer"
+        assert sorted(snapshot.name(index) for index in snapshot.parents(john)) == ["Karl Washington", "Linda Washington"]
+        assert sorted(snapshot.name(index) for index in snapshot.children(john)) == ["Emily Doe", "Mike Doe", "Sarah Doe"]
+        assert [snapshot.name(index) for index in snapshot.spouses(john)] == ["Jane Doe"]
+        assert snapshot.index_of("Nobody", "Known") is None
+        ancestors = [(generation, sorted(snapshot.name(index) for index in found))
+                     for generation, found in snapshot.iter_ancestors(snapshot.index_of("Mike", "Doe"))]
+        assert ancestors == [(1, ["Jane Doe", "John Doe"]), (2, ["Karl Washington", "Linda Washington"])]
+        assert int(snapshot.child_counts().sum()) == 16
+    finally:
+        snapshot.close()
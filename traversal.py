@@ -0,0 +1,55 @@
+class GenerationWalk:
+    """State of a breadth-first walk along CHILD_OF in one direction, one generation at a time.
+
+    advance() takes the (from_key, to_key) pairs one step beyond the frontier and
+    returns the newly reached [(key, via_key), ...]. Every key is reported once,
+    at its shortest distance, so lineages that meet again (pedigree collapse)
+    are not walked twice. walk_generations and walk_generations_async only
+    differ in how they fetch the pairs.
+    """
+
+    def __init__(self, start_keys, max_generations=None):
+        self.visited = set(start_keys)
+        self.frontier = list(start_keys)
+        self.generation = 0
+        self.max_generations = max_generations
+
+    @property
+    def done(self):
+        return not self.frontier or (self.max_generations is not None and self.generation >= self.max_generations)
+
+    def advance(self, pairs):
+        self.generation += 1
+        found = []
+        for from_key, to_key in pairs:
+            if to_key not in self.visited:
+                self.visited.add(to_key)
+                found.append((to_key, from_key))
+        self.frontier = [key for key, _ in found]
+        return found
+
+
+def walk_generations(start_keys, expand, max_generations=None):
+    """Walks with expand(frontier) returning the pairs one step further away.
+
+    Yields (generation, [(key, via_key), ...]) starting with generation 1.
+    """
+    walk = GenerationWalk(start_keys, max_generations)
+    while not walk.done:
+        found = walk.advance(expand(walk.frontier))
+        if found:
+            yield walk.generation, found
+
+
+async def walk_generations_async(start_keys, expand, max_generations=None):
+    """walk_generations for a coroutine expand(frontier)."""
+    walk = GenerationWalk(start_keys, max_generations)
+    while not walk.done:
+        found = walk.advance(await expand(walk.frontier))
+        if found:
+            yield walk.generation, found
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]